@@ -1,39 +1,75 @@
-import openai
-import os
-from dotenv import load_dotenv
+import asyncio
 
-load_dotenv()
+from . import clients, deadlines, llm, metrics
+from .clients import get_clients
+from .limits import provider_slot
+from .scheduler import call_with_retries
+from .settings import get_settings
+from .tokens import count_tokens
+
+MAX_TOKENS = 1500
 
 class Agent:
     """Simple Agent class for company analysis"""
     
-    def __init__(self, name, instructions):
+    def __init__(self, name, instructions, tier=llm.STANDARD):
         self.name = name
         self.instructions = instructions
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        
-    def query(self, user_input):
-        """Query the agent with user input"""
+        self.tier = tier
+        self.api_key = get_settings().openai_api_key
+
+    def _client(self):
         if not self.api_key:
             raise Exception("OpenAI API key not configured")
-            
-        client = openai.OpenAI(api_key=self.api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
+        client = get_clients().openai
+        if client is None:
+            raise Exception("OpenAI client not initialized")
+        return client
+
+    def _token_estimate(self, user_input):
+        """Prompt tokens plus the completion ceiling, charged to the tokens-per-minute quota"""
+        return count_tokens(self.instructions) + count_tokens(user_input) + MAX_TOKENS
+
+    def _request(self, user_input):
+        return dict(
+            model=llm.model_for(self.tier),
             messages=[
                 {"role": "system", "content": self.instructions},
                 {"role": "user", "content": user_input}
             ],
-            max_tokens=1500,
+            max_tokens=MAX_TOKENS,
             temperature=0.3
         )
         
+    async def query(self, user_input):
+        """Query the agent with user input"""
+        client = self._client()
+        response = await llm.complete(client, self._request(user_input), tokens=self._token_estimate(user_input))
+        metrics.record_tokens(self.name, getattr(response, "usage", None))
+        
         return AgentResult(
             final_output=response.choices[0].message.content,
             usage=response.usage if hasattr(response, 'usage') else None
         )
 
+    async def stream(self, user_input):
+        """Query the agent, yielding content tokens as they arrive"""
+        client = self._client()
+        deadline = deadlines.stage_deadline("openai")
+        with deadlines.get_breaker("openai").guard():
+            async with deadlines.until("openai", deadline), provider_slot("openai", self._token_estimate(user_input)):
+                # Only opening the stream is retried; once tokens have reached
+                # the caller a failure is final
+                stream = await call_with_retries("openai", lambda: client.chat.completions.create(
+                    **self._request(user_input), stream=True, stream_options={"include_usage": True}
+                ), deadline=deadline)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    # The final chunk carries usage and no choices
+                    if getattr(chunk, "usage", None):
+                        metrics.record_tokens(self.name, chunk.usage)
+
 class AgentResult:
     """Simple result class to match expected interface"""
     
@@ -42,9 +78,25 @@ class AgentResult:
         self.usage = usage
 
 class Runner:
-    """Simple Runner class for synchronous agent execution"""
+    """Simple Runner class for agent execution"""
     
+    @staticmethod
+    async def run(agent, query):
+        """Run agent query on the running event loop"""
+        return await agent.query(query)
+
+    @staticmethod
+    def stream(agent, query):
+        """Stream agent output tokens on the running event loop"""
+        return agent.stream(query)
+
     @staticmethod
     def run_sync(agent, query):
-        """Run agent query synchronously"""
-        return agent.query(query)
\ No newline at end of file
+        """Run agent query synchronously (for scripts outside an event loop).
+        Each call gets a new event loop, so it uses and then closes its own clients."""
+        async def run():
+            try:
+                return await agent.query(query)
+            finally:
+                await clients.shutdown()
+        return asyncio.run(run())
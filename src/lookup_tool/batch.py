@@ -0,0 +1,80 @@
+import asyncio
+import contextvars
+import csv
+import io
+import time
+
+from .limits import ProviderLimits, use_limits
+from .records import dumps
+from .scheduler import BATCH, use_priority
+
+MAX_BATCH_SIZE = 10000
+
+
+def parse_identifiers(text: str):
+    """Identifiers from an uploaded file: one per line, or the first CSV column"""
+    identifiers = []
+    for row in csv.reader(io.StringIO(text)):
+        if row and row[0].strip():
+            identifiers.append(row[0].strip())
+    return identifiers
+
+
+async def run_batch(identifiers, lookup, concurrency=None):
+    """Run ``lookup(identifier)`` for every identifier under per-provider
+    limits, yielding NDJSON lines in completion order and then a summary line"""
+    limits = ProviderLimits(concurrency)
+    # Workers run in a copied context so the limits only apply to this batch
+    context = contextvars.copy_context()
+    context.run(use_limits, limits)
+    # Interactive lookups go ahead of batch items at every provider
+    context.run(use_priority, BATCH)
+
+    start = time.perf_counter()
+    pending = asyncio.Queue()
+    for index, identifier in enumerate(identifiers):
+        pending.put_nowait((index, identifier))
+    completed = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, identifier = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            item_start = time.perf_counter()
+            try:
+                record = {"index": index, "input": identifier, "status": "success", **await lookup(identifier)}
+            except Exception as e:
+                record = {"index": index, "input": identifier, "status": "error", "error": str(e)}
+            record["elapsed"] = round(time.perf_counter() - item_start, 3)
+            await completed.put(record)
+
+    # Enough workers to saturate the widest provider; the semaphores in
+    # ProviderLimits do the per-provider capping.
+    worker_count = min(len(identifiers), max(limits.concurrency.values()))
+    workers = [asyncio.create_task(worker(), context=context) for _ in range(worker_count)]
+
+    failures = []
+    try:
+        for _ in range(len(identifiers)):
+            record = await completed.get()
+            if record["status"] == "error":
+                failures.append({"index": record["index"], "input": record["input"], "error": record["error"]})
+            yield dumps(record) + b"\n"
+    finally:
+        for task in workers:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    yield dumps({
+        "summary": {
+            "total": len(identifiers),
+            "succeeded": len(identifiers) - len(failures),
+            "failed": len(failures),
+            "failures": failures,
+            "elapsed": round(elapsed, 3),
+            "items_per_sec": round(len(identifiers) / elapsed, 2) if elapsed > 0 else None,
+            "concurrency": limits.concurrency,
+        }
+    }) + b"\n"
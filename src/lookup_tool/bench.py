@@ -0,0 +1,422 @@
+"""Offline load test and benchmarks.
+
+Starts the OpenAI, Serper and NewsAPI stand-ins from ``lookup_tool.stubs``
+and the app itself as local processes, drives /submit, /submit/stream and
+/batch with a closed-loop load generator, times ``detect_query_type``
+and ``extract_person_info_from_search`` in-process, and reports p50, p95
+and p99 latency and requests per second. No real API quota is used.
+
+    python -m lookup_tool.bench
+    python -m lookup_tool.bench --save-baseline benchmarks/baseline.json
+    python -m lookup_tool.bench --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .stubs import free_port
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = Path("benchmarks") / "baseline.json"
+# A scenario regresses when p95 grows, or requests/sec drops, by more than this
+DEFAULT_TOLERANCE = 0.25
+
+WARM_INPUTS = ["AAPL", "MSFT", "NVDA", "Amazon", "Tesla", "JPMorgan Chase", "Jane Smith", "John Doe"]
+
+
+def unique_words(i, count=2):
+    """Distinct capitalized pseudo-words per index, so inputs miss every cache"""
+    letters = "bcdfghjklmnprstvz"
+    vowels = "aeiou"
+    words = []
+    for w in range(count):
+        n = i * count + w
+        word = ""
+        for _ in range(3):
+            word += letters[n % len(letters)] + vowels[(n // len(letters)) % len(vowels)]
+            n //= len(letters) * len(vowels)
+        words.append(word.capitalize())
+    return words
+
+
+def cold_input(i):
+    """Alternate person names and unlisted company names"""
+    first, last = unique_words(i)
+    return f"{first} {last}" if i % 2 else f"{first.lower()}{last.lower()} widgets"
+
+
+def percentiles(values):
+    """p50/p95/p99/mean/max of a list of seconds, in milliseconds"""
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))] * 1000
+
+    return {
+        "p50_ms": round(rank(0.50), 2),
+        "p95_ms": round(rank(0.95), 2),
+        "p99_ms": round(rank(0.99), 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+# -------------------------------
+# Processes
+# -------------------------------
+def _spawn(args, env, cwd, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, *args], env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+class Environment:
+    """Stub providers plus the app, each in its own process, in a scratch directory"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="lookup-bench-")
+        self.processes = []
+        self.urls = {}
+
+    def _start(self, name, module_args, ready_path, extra_env=None):
+        port = free_port()
+        # The scratch directory is the cwd, so make sure this package stays importable
+        package_root = str(Path(__file__).resolve().parents[1])
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [package_root, os.getenv("PYTHONPATH")]))}
+        env.update(extra_env or {})
+        process = _spawn([*module_args, "--host", "127.0.0.1", "--port", str(port)], env, self.workdir,
+                         os.path.join(self.workdir, f"{name}.log"))
+        self.processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(url + ready_path, process)
+        self.urls[name] = url
+        return url
+
+    def __enter__(self):
+        a = self.args
+        self._start("openai", ["-m", "lookup_tool.stubs.openai", "--latency-ms", str(a.openai_ms),
+                               "--jitter", str(a.jitter), "--error-rate", str(a.error_rate),
+                               "--rate-limit-rate", str(a.rate_limit_rate), "--token-ms", str(a.token_ms),
+                               "--slow-rate", str(a.slow_rate), "--slow-ms", str(a.slow_ms),
+                               *(arg for model in a.model_latency or () for arg in ("--model-latency", model))],
+                    "/docs")
+        self._start("serper", ["-m", "lookup_tool.stubs.serper", "--latency-ms", str(a.serper_ms),
+                               "--jitter", str(a.jitter), "--error-rate", str(a.error_rate)], "/docs")
+        self._start("newsapi", ["-m", "lookup_tool.stubs.newsapi", "--latency-ms", str(a.newsapi_ms),
+                                "--jitter", str(a.jitter), "--error-rate", str(a.error_rate)], "/docs")
+        app_env = {
+            "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": self.urls["openai"] + "/v1",
+            "SERPER_API_KEY": "stub", "SERPER_BASE_URL": self.urls["serper"],
+            "NEWSAPI_ORG_API_KEY": "stub", "NEWSAPI_BASE_URL": self.urls["newsapi"],
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(self.workdir, 'lookup.db')}",
+            "LOOKUP_CACHE_PATH": os.path.join(self.workdir, "lookup_cache.db"),
+            "NEWS_STORE_PATH": os.path.join(self.workdir, "news.db"),
+            "PREFETCH_STORE_PATH": os.path.join(self.workdir, "popularity.db"),
+            # Yahoo Finance has no stub; market data would be a live dependency
+            "MARKET_DATA_ENABLED": "0",
+            "LOG_DIR": os.path.join(self.workdir, "logs"),
+            "LOG_LEVEL": "WARNING",
+            "WEB_CONCURRENCY": str(a.workers),
+        }
+        if not a.respect_rate_limits:
+            # Measure the app, not the default provider quotas
+            app_env.update({
+                "RATE_LIMIT_OPENAI_RPM": "0", "RATE_LIMIT_OPENAI_TPM": "0",
+                "RATE_LIMIT_SERPER_RPM": "0", "RATE_LIMIT_NEWSAPI_RPM": "0",
+            })
+        self._start("app", ["-m", "lookup_tool.main", "--workers", str(a.workers)], "/health", app_env)
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# -------------------------------
+# Load generation
+# -------------------------------
+async def closed_loop(send, total, concurrency):
+    """``concurrency`` workers issue ``send(i)`` until ``total`` requests are done"""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await send(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                logger.debug(f"Request {i} failed: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def scenario_result(latencies, errors, elapsed, **extra):
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        **percentiles(latencies),
+        **extra,
+    }
+
+
+async def submit_scenario(client, inputs, total, concurrency):
+    async def send(i):
+        response = await client.post("/submit", data={"input_value": inputs(i)})
+        response.raise_for_status()
+        if response.json().get("status") != "success":
+            raise Exception(response.json().get("message"))
+
+    return scenario_result(*await closed_loop(send, total, concurrency))
+
+
+async def stream_scenario(client, inputs, total, concurrency):
+    first_tokens = []
+
+    async def send(i):
+        start = time.perf_counter()
+        async with client.stream("POST", "/submit/stream", data={"input_value": inputs(i)}) as response:
+            response.raise_for_status()
+            seen_token = False
+            async for line in response.aiter_lines():
+                if not seen_token and line.startswith(("event: token", "event: summary")):
+                    first_tokens.append(time.perf_counter() - start)
+                    seen_token = True
+
+    result = scenario_result(*await closed_loop(send, total, concurrency))
+    result["first_token"] = percentiles(first_tokens)
+    return result
+
+
+async def batch_scenario(client, size, offset):
+    identifiers = [cold_input(offset + i) for i in range(size)]
+    start = time.perf_counter()
+    item_latencies, summary = [], {}
+    async with client.stream("POST", "/batch", json=identifiers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if "summary" in record:
+                summary = record["summary"]
+            else:
+                item_latencies.append(record["elapsed"])
+    elapsed = time.perf_counter() - start
+    return {
+        "items": size,
+        "failed": summary.get("failed"),
+        "items_per_sec": round(size / elapsed, 2),
+        "item": percentiles(item_latencies),
+    }
+
+
+def micro_benchmarks(iterations):
+    """Per-call timings of the CPU-bound helpers on the request path"""
+    from . import main as app_module
+    from .records import NewsItem, SearchResult, dumps
+    from .stubs.serper import organic_results
+
+    quiet = logging.getLogger("lookup_tool.bench.micro")
+    quiet.disabled = True
+    app_module.symbols.get_index()
+    inputs = WARM_INPUTS + [cold_input(i) for i in range(32)]
+    search_results = [
+        SearchResult(r["title"], r["link"], r["snippet"], r["displayLink"]) for r in organic_results("Jane Smith")
+    ]
+    person_info = app_module.extract_person_info_from_search(search_results, "Jane Smith", quiet)
+    # A /submit body: a long markdown summary and five news items
+    response = {
+        "status": "success", "input": "Jane Smith", "query_type": "person_name", "ticker": None,
+        "result": app_module.format_person_sections(person_info) * 8,
+        "news": [NewsItem(r["title"], r["link"], "2024-01-01", r["displayLink"], r["snippet"]) for r in organic_results("Jane Smith")[:5]],
+    }
+
+    def timeit(fn):
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            fn(i)
+            samples.append(time.perf_counter() - start)
+        total = sum(samples)
+        return {"calls_per_sec": round(iterations / total, 1), **percentiles(samples)}
+
+    return {
+        "detect_query_type": timeit(lambda i: app_module.detect_query_type(inputs[i % len(inputs)], quiet)),
+        "extract_person_info_from_search": timeit(
+            lambda i: app_module.extract_person_info_from_search(search_results, "Jane Smith", quiet)
+        ),
+        "submit_response_json": timeit(lambda i: dumps(response)),
+    }
+
+
+async def run_scenarios(env, args):
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=env.urls["app"], timeout=120, limits=limits) as client:
+        health = (await client.get("/health")).json()
+        results = {"startup_ms": health.get("startup_ms")}
+
+        def warm(i):
+            return WARM_INPUTS[i % len(WARM_INPUTS)]
+
+        results["submit_cold"] = await submit_scenario(client, cold_input, args.requests, args.concurrency)
+        results["submit_warm"] = await submit_scenario(client, warm, args.requests, args.concurrency)
+        results["stream_cold"] = await stream_scenario(
+            client, lambda i: cold_input(args.requests + i), args.requests, args.concurrency
+        )
+        results["batch"] = await batch_scenario(client, args.batch_size, args.requests * 2)
+    return results
+
+
+# -------------------------------
+# Reporting and baselines
+# -------------------------------
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of ``report`` against ``baseline`` as readable strings"""
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not isinstance(current, dict) or not isinstance(previous, dict):
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if current.get(key) and previous.get(key) and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {previous[key]} -> {current[key]}")
+        for key in ("requests_per_sec", "items_per_sec", "calls_per_sec"):
+            if current.get(key) and previous.get(key) and current[key] < previous[key] * (1 - tolerance):
+                regressions.append(f"{name}.{key}: {previous[key]} -> {current[key]}")
+    budget = report.get("startup_budget_ms")
+    total = (report["results"].get("startup_ms") or {}).get("total")
+    if budget and total and total > budget:
+        regressions.append(f"startup_ms.total: {total} over the {budget} ms budget")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'scenario':<36}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in report["results"].items():
+        if name == "startup_ms":
+            continue
+        rows = [(name, result)]
+        if name == "micro":
+            rows = [(f"micro.{key}", value) for key, value in result.items()]
+        if name == "batch":
+            rows = [("batch (per item)", {**result["item"], "requests_per_sec": result["items_per_sec"],
+                                          "errors": result["failed"]})]
+        for label, row in rows:
+            rate = row.get("requests_per_sec") or row.get("calls_per_sec")
+            print(f"{label:<36}{rate or '-':>10}{row.get('p50_ms') or '-':>10}{row.get('p95_ms') or '-':>10}"
+                  f"{row.get('p99_ms') or '-':>10}{row.get('errors', '-') if row.get('errors') is not None else '-':>8}")
+        if "first_token" in result:
+            ft = result["first_token"]
+            print(f"{'  first token':<36}{'':>10}{ft['p50_ms'] or '-':>10}{ft['p95_ms'] or '-':>10}{ft['p99_ms'] or '-':>10}")
+    print(f"startup: {report['results'].get('startup_ms')} (budget {report.get('startup_budget_ms')} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against local provider stand-ins")
+    parser.add_argument("--requests", type=int, default=200, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="app worker processes")
+    parser.add_argument("--micro-iterations", type=int, default=20000)
+    parser.add_argument("--openai-ms", type=float, default=200, help="median OpenAI stub latency")
+    parser.add_argument("--token-ms", type=float, default=2, help="delay between streamed words")
+    parser.add_argument("--serper-ms", type=float, default=50)
+    parser.add_argument("--newsapi-ms", type=float, default=50)
+    parser.add_argument("--jitter", type=float, default=0.3, help="log-normal sigma of stub latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of OpenAI calls answered 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of OpenAI calls that straggle")
+    parser.add_argument("--slow-ms", type=float, default=3000, help="extra latency of a straggling OpenAI call")
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=MS",
+                        help="median OpenAI stub latency for one model (repeatable)")
+    parser.add_argument("--respect-rate-limits", action="store_true",
+                        help="keep the app's default per-provider quotas instead of lifting them")
+    parser.add_argument("--only-micro", action="store_true")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH", nargs="?", const=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    from .settings import get_settings
+
+    results = {}
+    if not args.only_micro:
+        with Environment(args) as env:
+            results.update(asyncio.run(run_scenarios(env, args)))
+    results["micro"] = micro_benchmarks(args.micro_iterations)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("save_baseline", "compare", "json", "tolerance")},
+        "startup_budget_ms": get_settings().startup_budget_ms,
+        "results": results,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from . import deadlines, scheduler
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# (fresh seconds, extra seconds a stale value may still be served while
+# it is refreshed in the background), per data kind.
+CACHE_TTLS = {
+    "stock_ticker": (6 * 3600, 24 * 3600),
+    "company_name": (6 * 3600, 24 * 3600),
+    "person_name": (6 * 3600, 24 * 3600),
+    # Keyed by content hash, so entries never go stale, they just age out
+    "chunk_summary": (30 * 24 * 3600, 0),
+}
+
+DEFAULT_CACHE_PATH = os.path.join("data", "lookup_cache.db")
+DEFAULT_MAX_ENTRIES = 2048
+
+# Cross-process compute leases: how long one process may hold a key before
+# others assume it died, and how often waiters check for its result
+LEASE_SECONDS = float(os.getenv("LOOKUP_CACHE_LEASE_SECONDS", 120))
+LEASE_POLL_SECONDS = 0.2
+
+_RESULT_STATS = {"hit": "hits", "stale": "stale_hits", "miss": "misses"}
+
+_refresh_within = contextvars.ContextVar("cache_refresh_within", default=0)
+_refreshing = contextvars.ContextVar("cache_refreshing", default=False)
+
+
+def normalize_identifier(identifier: str):
+    """Collapse whitespace and case so equivalent inputs share a key"""
+    return " ".join(identifier.split()).lower()
+
+
+def cache_key(kind: str, identifier: str):
+    return f"{kind}:{normalize_identifier(identifier)}"
+
+
+def refresh_within(seconds):
+    """From the current context, recompute entries that would go stale within
+    ``seconds`` instead of serving them (used by the prefetcher)"""
+    return _refresh_within.set(seconds)
+
+
+def refreshing():
+    """True inside a compute that replaces an existing entry (a background or
+    refresh-ahead recompute), where a stored copy of the old value won't do"""
+    return _refreshing.get()
+
+
+async def _as_refresh(compute):
+    token = _refreshing.set(True)
+    try:
+        return await compute()
+    finally:
+        _refreshing.reset(token)
+
+
+class PersistentTier:
+    """SQLite-backed second tier that survives restarts and is shared by
+    every worker process pointed at the same file"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # Workers write concurrently; wait on a locked database instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, kind, value, stored_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, kind, value, stored_at) VALUES (?, ?, ?, ?)",
+                (key, kind, json.dumps(value), stored_at),
+            )
+            self._conn.commit()
+
+    def acquire_lease(self, key, owner, seconds):
+        """Claim the right to compute ``key``; False while another live owner holds it"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (key, owner, now + seconds, now),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def lease_held(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """In-process LRU in front of a persistent tier, with per-kind TTLs and
+    stale-while-revalidate.
+
+    A miss is computed once across all worker processes sharing the
+    persistent tier: the first process takes a lease on the key, the
+    others poll the persistent tier for its result until the lease is
+    released or expires.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttls=None,
+                 lease_seconds=LEASE_SECONDS):
+        self.ttls = dict(ttls or CACHE_TTLS)
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lru = OrderedDict()
+        self._persistent = PersistentTier(path)
+        self._refreshing = {}
+        self._computing = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "shared_waits": 0, "shared_hits": 0}
+
+    def _count(self, kind, result):
+        self.stats[_RESULT_STATS[result]] += 1
+        CACHE_REQUESTS.inc(kind=kind, result=result)
+
+    def _lru_get(self, key):
+        entry = self._lru.get(key)
+        if entry is not None:
+            self._lru.move_to_end(key)
+        return entry
+
+    def _lru_set(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def _lookup(self, key):
+        entry = self._lru_get(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._persistent.get, key)
+            if entry is not None:
+                self._lru_set(key, entry)
+        return entry
+
+    async def _store(self, key, kind, value):
+        entry = (value, time.time())
+        self._lru_set(key, entry)
+        await asyncio.to_thread(self._persistent.set, key, kind, value, entry[1])
+
+    async def _compute_and_store(self, key, kind, compute, should_cache):
+        value = await compute()
+        if should_cache(value):
+            await self._store(key, kind, value)
+        return value
+
+    async def _wait_for_other_worker(self, key, since):
+        """Poll for a value another process is computing; None if it gives up"""
+        self.stats["shared_waits"] += 1
+        while True:
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+            entry = await asyncio.to_thread(self._persistent.get, key)
+            if entry is not None and entry[1] >= since:
+                self.stats["shared_hits"] += 1
+                self._lru_set(key, entry)
+                return entry[0]
+            if not await asyncio.to_thread(self._persistent.lease_held, key):
+                return None
+
+    async def _compute_once(self, key, kind, compute, should_cache):
+        """Compute under a cross-process lease, or wait for the process holding it"""
+        since = time.time()
+        while not await asyncio.to_thread(self._persistent.acquire_lease, key, self._owner, self.lease_seconds):
+            value = await self._wait_for_other_worker(key, since)
+            if value is not None:
+                return value
+        try:
+            return await self._compute_and_store(key, kind, compute, should_cache)
+        finally:
+            await asyncio.to_thread(self._persistent.release_lease, key, self._owner)
+
+    async def _compute_shared(self, key, kind, compute, should_cache):
+        """One computation per key per process, and one across processes"""
+        task = self._computing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute_once(key, kind, compute, should_cache))
+            self._computing[key] = task
+            task.add_done_callback(lambda t: self._computing.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _refresh_in_background(self, key, kind, compute, should_cache):
+        if key in self._refreshing:
+            return
+        self.stats["refreshes"] += 1
+
+        async def refresh():
+            # Refreshes yield to interactive and batch traffic, and aren't
+            # bound by the deadline of the request that noticed the stale entry
+            scheduler.use_priority(scheduler.BACKGROUND)
+            deadlines.start(None)
+            try:
+                # Only one worker refreshes a key; the rest keep serving stale
+                if await asyncio.to_thread(self._persistent.acquire_lease, key, self._owner, self.lease_seconds):
+                    try:
+                        await self._compute_and_store(key, kind, lambda: _as_refresh(compute), should_cache)
+                    finally:
+                        await asyncio.to_thread(self._persistent.release_lease, key, self._owner)
+            except Exception as e:
+                logger.error(f"Background refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def get(self, kind, identifier):
+        """Return a fresh or still-servable stale value, or None (no refresh)"""
+        entry = await self._lookup(cache_key(kind, identifier))
+        if entry is None:
+            self._count(kind, "miss")
+            return None
+        value, stored_at = entry
+        fresh_for, stale_for = self.ttls[kind]
+        age = time.time() - stored_at
+        if age < fresh_for:
+            self._count(kind, "hit")
+            return value
+        if age < fresh_for + stale_for:
+            self._count(kind, "stale")
+            return value
+        self._count(kind, "miss")
+        return None
+
+    async def set(self, kind, identifier, value):
+        await self._store(cache_key(kind, identifier), kind, value)
+
+    async def get_or_compute(self, kind, identifier, compute, should_cache=bool):
+        """Return the cached value for (kind, identifier), calling the
+        zero-argument coroutine function ``compute`` on a miss"""
+        key = cache_key(kind, identifier)
+        fresh_for, stale_for = self.ttls[kind]
+        ahead = _refresh_within.get()
+        entry = await self._lookup(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < fresh_for - ahead:
+                self._count(kind, "hit")
+                return value
+            if ahead:
+                # Refresh-ahead: recompute now, while the old value still serves everyone else
+                self.stats["refreshes"] += 1
+                return await self._compute_shared(key, kind, lambda: _as_refresh(compute), should_cache)
+            if age < fresh_for + stale_for:
+                self._count(kind, "stale")
+                self._refresh_in_background(key, kind, compute, should_cache)
+                return value
+
+        self._count(kind, "miss")
+        return await self._compute_shared(key, kind, compute, should_cache)
+
+    async def aclose(self):
+        tasks = list(self._refreshing.values()) + list(self._computing.values())
+        for task in tasks:
+            task.cancel()
+        # Let cancelled work release its leases before the connection closes
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._persistent.close()
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the process-wide cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        path = os.getenv("LOOKUP_CACHE_PATH", DEFAULT_CACHE_PATH)
+        max_entries = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        _cache = TieredCache(path=path, max_entries=max_entries)
+    return _cache
+
+
+async def shutdown():
+    global _cache
+    if _cache is not None:
+        await _cache.aclose()
+        _cache = None
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+import httpx
+
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+SERPER_BASE_URL = "https://google.serper.dev"
+NEWSAPI_BASE_URL = "https://newsapi.org"
+
+# Per-host pool sizes. Each provider gets its own client so one slow
+# upstream can't starve the connection pool of the others.
+POOL_LIMITS = {
+    "serper": httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+    "newsapi": httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+    "openai": httpx.Limits(max_connections=100, max_keepalive_connections=40, keepalive_expiry=60),
+    "web": httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+}
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+
+class ClientRegistry:
+    """Long-lived, pooled clients shared by every module that calls out.
+    httpx pools are tied to the event loop they first run on, so a registry
+    belongs to one loop."""
+
+    def __init__(self):
+        settings = get_settings()
+        self.loop = _running_loop()
+        self.serper = httpx.AsyncClient(
+            base_url=settings.serper_base_url or SERPER_BASE_URL, limits=POOL_LIMITS["serper"], timeout=DEFAULT_TIMEOUT
+        )
+        self.newsapi = httpx.AsyncClient(
+            base_url=settings.newsapi_base_url or NEWSAPI_BASE_URL, limits=POOL_LIMITS["newsapi"], timeout=DEFAULT_TIMEOUT
+        )
+        self.web = httpx.AsyncClient(
+            limits=POOL_LIMITS["web"], timeout=httpx.Timeout(10.0), follow_redirects=True
+        )
+        self._openai_http = httpx.AsyncClient(limits=POOL_LIMITS["openai"], timeout=DEFAULT_TIMEOUT)
+
+        api_key = settings.openai_api_key
+        # AsyncOpenAI refuses to build without a key; callers check for None.
+        # The SDK is imported here rather than at module level: it is the
+        # slowest import in the app and nothing needs it before this point.
+        self.openai = None
+        if api_key:
+            import openai
+            # Retries are handled by scheduler.call_with_retries, with the
+            # same backoff and Retry-After handling as the other providers
+            self.openai = openai.AsyncOpenAI(
+                api_key=api_key, base_url=settings.openai_base_url, http_client=self._openai_http, max_retries=0
+            )
+
+    async def aclose(self):
+        """Close every pooled connection"""
+        if self.openai is not None:
+            await self.openai.close()
+        for client in (self.serper, self.newsapi, self.web, self._openai_http):
+            await client.aclose()
+
+
+_registry = None
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _current():
+    """The registry if it belongs to the running loop. One left behind by an
+    earlier loop (a previous asyncio.run) can't be used or closed any more."""
+    if _registry is not None and _registry.loop is not None and _registry.loop is not _running_loop():
+        logger.info("Replacing the HTTP/OpenAI client registry of a finished event loop")
+        return None
+    return _registry
+
+
+def get_clients():
+    """Return the shared registry, creating it on first use outside the app"""
+    global _registry
+    if _current() is None:
+        _registry = ClientRegistry()
+    return _registry
+
+
+async def startup():
+    """Create the registry (called from the FastAPI lifespan)"""
+    global _registry
+    if _current() is None:
+        _registry = ClientRegistry()
+        logger.info("HTTP/OpenAI client registry started")
+    return _registry
+
+
+async def shutdown():
+    """Close the registry (called from the FastAPI lifespan)"""
+    global _registry
+    if _current() is not None:
+        await _registry.aclose()
+        logger.info("HTTP/OpenAI client registry closed")
+    _registry = None
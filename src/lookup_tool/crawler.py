@@ -0,0 +1,244 @@
+import asyncio
+import codecs
+import logging
+import os
+import sqlite3
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from .clients import get_clients
+
+logger = logging.getLogger(__name__)
+
+# Pages worth reading for a company profile, relative to its home page
+DEFAULT_PATHS = ["/", "/about", "/about-us", "/leadership", "/investor-relations", "/investors"]
+
+MAX_BODY_BYTES = int(os.getenv("CRAWL_MAX_BODY_BYTES", 2 * 1024 * 1024))
+# Politeness: concurrent requests and minimum spacing per domain
+PER_DOMAIN_CONCURRENCY = int(os.getenv("CRAWL_PER_DOMAIN_CONCURRENCY", 2))
+PER_DOMAIN_DELAY = float(os.getenv("CRAWL_PER_DOMAIN_DELAY", 0.25))
+DEFAULT_CRAWL_DB = os.path.join("data", "crawl.db")
+
+USER_AGENT = "lookup-tool/0.1 (+company profile crawler)"
+
+
+# -------------------------------
+# Incremental text extraction
+# -------------------------------
+class TextExtractor(HTMLParser):
+    """Collects visible text as HTML is fed in chunks"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._skip_depth = 0
+        self.title = None
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title and self.title is None:
+            self.title = data.strip()
+        if self._skip_depth == 0 and data.strip():
+            self._parts.append(data.strip())
+
+    def text(self):
+        lines = (" ".join(line.split()) for line in " ".join(self._parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+# -------------------------------
+# Conditional GET validators
+# -------------------------------
+class CrawlStore:
+    """ETag/Last-Modified and the extracted text for every crawled URL"""
+
+    def __init__(self, path=DEFAULT_CRAWL_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, title TEXT,"
+            " text TEXT, truncated INTEGER, fetched_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, title, text, truncated FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "title": row[2], "text": row[3], "truncated": bool(row[4])}
+
+    def put(self, url, page):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, title, text, truncated, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, page["etag"], page["last_modified"], page["title"], page["text"],
+                 int(page["truncated"]), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = CrawlStore(os.getenv("CRAWL_DB_PATH", DEFAULT_CRAWL_DB))
+    return _store
+
+
+# -------------------------------
+# Per-domain politeness
+# -------------------------------
+class DomainThrottle:
+    """Caps concurrent requests per domain and spaces them out"""
+
+    def __init__(self, concurrency=PER_DOMAIN_CONCURRENCY, delay=PER_DOMAIN_DELAY):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._semaphores = {}
+        self._next_slot = {}
+
+    async def acquire(self, domain):
+        semaphore = self._semaphores.setdefault(domain, asyncio.Semaphore(self.concurrency))
+        await semaphore.acquire()
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(domain, now))
+        self._next_slot[domain] = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def release(self, domain):
+        self._semaphores[domain].release()
+
+
+# (loop, throttle): semaphores can't be used from another event loop, and
+# enrich or Runner.run_sync may call asyncio.run more than once
+_throttle = None
+
+
+def get_throttle():
+    """The running loop's throttle, shared by every crawl on that loop"""
+    global _throttle
+    loop = asyncio.get_running_loop()
+    if _throttle is None or _throttle[0] is not loop:
+        _throttle = (loop, DomainThrottle())
+    return _throttle[1]
+
+
+# -------------------------------
+# Fetching
+# -------------------------------
+async def fetch_page(url: str, max_bytes=MAX_BODY_BYTES, client=None, store=None, throttle=None):
+    """Conditionally GET one page, streaming at most ``max_bytes`` of body
+    through the text extractor. Returns a dict with url, status, title,
+    text, truncated and not_modified, or None on failure."""
+    client = client or get_clients().web
+    store = store or get_store()
+    throttle = throttle or get_throttle()
+
+    previous = await asyncio.to_thread(store.get, url)
+    headers = {"User-Agent": USER_AGENT}
+    if previous:
+        if previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    domain = urlsplit(url).netloc
+    await throttle.acquire(domain)
+    try:
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and previous:
+                return {"url": url, "status": 304, "title": previous["title"], "text": previous["text"],
+                        "truncated": previous["truncated"], "not_modified": True}
+            if response.status_code in (404, 410):
+                # Not every site has every profile page
+                logger.info(f"No page at {url}")
+                return None
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "")
+            if "html" not in content_type and "text" not in content_type:
+                logger.info(f"Skipping non-text page {url} ({content_type})")
+                return None
+
+            extractor = TextExtractor()
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            received, truncated = 0, False
+            async for chunk in response.aiter_bytes():
+                if received + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - received]
+                    truncated = True
+                received += len(chunk)
+                extractor.feed(decoder.decode(chunk))
+                if truncated:
+                    break
+            extractor.feed(decoder.decode(b"", final=True))
+            extractor.close()
+
+            page = {
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "title": extractor.title,
+                "text": extractor.text(),
+                "truncated": truncated,
+            }
+            status = response.status_code
+    except Exception as e:
+        logger.error(f"Error crawling {url}: {e}")
+        return None
+    finally:
+        throttle.release(domain)
+
+    await asyncio.to_thread(store.put, url, page)
+    return {"url": url, "status": status, "title": page["title"], "text": page["text"],
+            "truncated": page["truncated"], "not_modified": False}
+
+
+def company_home_url(company_name: str):
+    """Best guess at a company's home page"""
+    if company_name.lower() == "msft":
+        return "https://www.microsoft.com"
+    return f"https://www.{company_name.lower().replace(' ', '')}.com"
+
+
+async def crawl_company(base_url: str, paths=DEFAULT_PATHS, max_bytes=MAX_BODY_BYTES):
+    """Crawl the profile pages of one site concurrently (within the
+    per-domain limit), returning the pages that could be fetched"""
+    urls = list(dict.fromkeys(urljoin(base_url.rstrip("/") + "/", path.lstrip("/")) for path in paths))
+    pages = await asyncio.gather(*(fetch_page(url, max_bytes) for url in urls))
+    return [page for page in pages if page]
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .cache import normalize_identifier
+from .models import Base, Company, Document, Person
+from .records import dumps_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///data/lookup.db"
+
+# How old a stored summary may be and still be served without calling OpenAI
+DEFAULT_MAX_AGE = timedelta(hours=int(os.getenv("DB_SUMMARY_MAX_AGE_HOURS", 24)))
+
+# create_all passes tolerated while several workers create the schema at once
+SCHEMA_ATTEMPTS = 5
+
+_engine = None
+_sessionmaker = None
+_pending_writes = set()
+
+
+def database_url():
+    url = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+    # Accept plain driver-less URLs from the environment
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+asyncpg://" + url[len("postgresql://"):]
+    elif url.startswith("sqlite:///"):
+        url = "sqlite+aiosqlite:///" + url[len("sqlite:///"):]
+    return url
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+async def init_db():
+    """Create the engine and any missing tables/indexes"""
+    global _engine, _sessionmaker
+    if _engine is not None:
+        return _engine
+
+    url = database_url()
+    if url.startswith("sqlite"):
+        path = url.split(":///", 1)[1]
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        _engine = create_async_engine(url, json_serializer=dumps_text)
+        event.listen(_engine.sync_engine, "connect", _enable_sqlite_wal)
+    else:
+        _engine = create_async_engine(
+            url, pool_size=10, max_overflow=20, pool_pre_ping=True, json_serializer=dumps_text
+        )
+
+    for attempt in range(SCHEMA_ATTEMPTS):
+        try:
+            async with _engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            break
+        except DBAPIError as e:
+            # Workers start together; another one created a table between our
+            # existence check and CREATE. Each pass skips what already exists.
+            if attempt == SCHEMA_ATTEMPTS - 1:
+                raise
+            logger.info(f"Schema creation raced another worker, retrying: {e.orig}")
+            await asyncio.sleep(0.1 * (attempt + 1))
+
+    _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+    logger.info(f"Database ready: {_engine.url.render_as_string(hide_password=True)}")
+    return _engine
+
+
+async def close_db():
+    global _engine, _sessionmaker
+    if _pending_writes:
+        await asyncio.gather(*_pending_writes, return_exceptions=True)
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _sessionmaker = None
+
+
+async def _session():
+    if _sessionmaker is None:
+        await init_db()
+    return _sessionmaker()
+
+
+def write_behind(coro, description="database write"):
+    """Run a write off the request path, logging instead of raising on failure"""
+    async def run():
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"{description} failed: {e}")
+
+    task = asyncio.create_task(run())
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+    return task
+
+
+def _dedupe(values, key="normalized_name"):
+    """Last row wins; Postgres rejects an upsert that touches a row twice"""
+    return list({value[key]: value for value in values}.values())
+
+
+def _insert(table):
+    """Dialect-specific INSERT that supports ON CONFLICT upserts"""
+    if _engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _upsert(table, rows, conflict_columns, update_columns):
+    stmt = _insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+
+
+# -------------------------------
+# Companies
+# -------------------------------
+async def get_company_summary(identifier: str, query_type: str, max_age=DEFAULT_MAX_AGE):
+    """Stored summary for a company if it is fresh enough, else None"""
+    if query_type == "stock_ticker":
+        condition = Company.ticker == identifier.strip().upper()
+    else:
+        condition = Company.normalized_name == normalize_identifier(identifier)
+    async with await _session() as session:
+        row = (await session.execute(
+            # Several names can share a ticker; the latest lookup wins
+            select(Company.summary, Company.updated_at).where(condition)
+            .order_by(Company.updated_at.desc()).limit(1)
+        )).first()
+    if row is None or not row.summary or row.updated_at is None:
+        return None
+    if datetime.now() - row.updated_at > max_age:
+        return None
+    return row.summary
+
+
+async def upsert_companies(rows: list):
+    """Bulk upsert lookup results (records.CompanyResult)"""
+    if not rows:
+        return
+    now = datetime.now()
+    values = []
+    for row in rows:
+        ticker = row.ticker
+        if ticker is None and row.query_type == "stock_ticker":
+            ticker = row.name.strip().upper()
+        values.append({
+            "name": row.name,
+            "normalized_name": normalize_identifier(row.name),
+            "ticker": ticker,
+            "query_type": row.query_type,
+            "employee_count": row.employee_count,
+            "officers": row.officers,
+            "business_description": row.business_description,
+            "fast_facts": row.fast_facts,
+            "summary": row.summary,
+            "created_at": now,
+            "updated_at": now,
+        })
+    stmt = _upsert(
+        Company.__table__, _dedupe(values), ["normalized_name"],
+        ["ticker", "query_type", "summary", "employee_count", "officers",
+         "business_description", "fast_facts", "updated_at"],
+    )
+    async with await _session() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+async def _company_id(session, name: str):
+    """Id for a company, inserting a bare row if it has never been looked up"""
+    normalized = normalize_identifier(name)
+    now = datetime.now()
+    await session.execute(
+        _insert(Company.__table__)
+        .values(name=name, normalized_name=normalized, created_at=now, updated_at=now)
+        .on_conflict_do_nothing()
+    )
+    return (await session.execute(
+        select(Company.id).where(Company.normalized_name == normalized)
+    )).scalar_one()
+
+
+# -------------------------------
+# People
+# -------------------------------
+async def get_person_summary(name: str, max_age=DEFAULT_MAX_AGE):
+    """Stored summary for a person if it is fresh enough, else None"""
+    async with await _session() as session:
+        row = (await session.execute(
+            select(Person.summary, Person.updated_at)
+            .where(Person.normalized_name == normalize_identifier(name))
+            .limit(1)
+        )).first()
+    if row is None or not row.summary or row.updated_at is None:
+        return None
+    if datetime.now() - row.updated_at > max_age:
+        return None
+    return row.summary
+
+
+async def upsert_people(rows: list):
+    """Bulk upsert person lookups: dicts with name, summary and optional
+    profile (a records.PersonProfile, stored as JSON)"""
+    if not rows:
+        return
+    now = datetime.now()
+    values = [
+        {
+            "name": row["name"],
+            "normalized_name": normalize_identifier(row["name"]),
+            "profile": row.get("profile"),
+            "summary": row.get("summary"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for row in rows
+    ]
+    stmt = _upsert(Person.__table__, _dedupe(values), ["normalized_name"], ["name", "profile", "summary", "updated_at"])
+    async with await _session() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+async def lookup_names():
+    """(name, ticker) of every stored company and the name of every stored person"""
+    async with await _session() as session:
+        companies = (await session.execute(select(Company.name, Company.ticker))).all()
+        people = (await session.execute(select(Person.name))).scalars().all()
+    return [tuple(row) for row in companies], list(people)
+
+
+# -------------------------------
+# Documents
+# -------------------------------
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+async def upsert_news_documents(company_name: str, news_items: list):
+    """Bulk upsert NewsItems as 'news' documents for a company"""
+    if not news_items:
+        return
+    now = datetime.now()
+    async with await _session() as session:
+        company_id = await _company_id(session, company_name)
+        values = _dedupe([
+            {
+                "company_id": company_id,
+                "type": "news",
+                "title": item.title,
+                "source": item.source,
+                "content": item.summary,
+                "source_url": item.url,
+                "published_at": _parse_date(item.date),
+                "created_at": now,
+            }
+            for item in news_items if item.url
+        ], key="source_url")
+        if values:
+            await session.execute(_upsert(
+                Document.__table__, values, ["company_id", "source_url"],
+                ["title", "source", "content", "published_at"],
+            ))
+        await session.commit()
@@ -0,0 +1,179 @@
+"""Request deadlines, per-call time budgets and per-provider circuit breakers.
+
+A request starts a deadline with ``start``; it travels with the request's
+context into every task the request spawns. Each upstream call gets
+``stage_deadline(provider)``: the time that remains, capped by the
+provider's share of the whole budget and by its own ceiling, so a slow
+search can't eat the time the LLM summary needs. Calls made outside a
+request (background refreshes, scripts) only get the provider ceiling.
+
+A ``CircuitBreaker`` per provider opens after repeated transient failures
+and fails calls immediately with ``CircuitOpen`` until a cool-down passes,
+then lets one trial call through. Callers treat it like any other
+upstream failure and serve their degraded result.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+
+from . import metrics
+from .scheduler import is_retryable
+
+logger = logging.getLogger(__name__)
+
+# Whole-request budget for /submit, /submit/stream and each batch item
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE_SECONDS", 25))
+# Longest any single upstream call (including retries and queueing) may take
+PROVIDER_TIMEOUTS = {
+    "openai": float(os.getenv("UPSTREAM_TIMEOUT_OPENAI", 60)),
+    "serper": float(os.getenv("UPSTREAM_TIMEOUT_SERPER", 8)),
+    "newsapi": float(os.getenv("UPSTREAM_TIMEOUT_NEWSAPI", 8)),
+    "yahoo": float(os.getenv("UPSTREAM_TIMEOUT_YAHOO", 15)),
+}
+# Fraction of the request budget a provider may use; search and news run
+# before or beside the LLM call, which gets whatever is left
+PROVIDER_SHARES = {"openai": 1.0, "serper": 0.3, "newsapi": 0.3, "yahoo": 0.3}
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# (absolute loop-clock deadline, total budget) of the current request
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class CircuitOpen(Exception):
+    """The provider's breaker is open; the call was not attempted"""
+
+    def __init__(self, provider, retry_in):
+        super().__init__(f"{provider} circuit is open, retrying in {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def _now():
+    return time.monotonic()
+
+
+def start(seconds=REQUEST_DEADLINE):
+    """Give the current context ``seconds`` to finish (None clears the deadline)"""
+    return _deadline.set(None if seconds is None else (_now() + seconds, seconds))
+
+
+def remaining():
+    """Seconds left in the current request, or None outside a request"""
+    current = _deadline.get()
+    return None if current is None else max(0.0, current[0] - _now())
+
+
+def stage_deadline(provider):
+    """Absolute (monotonic) time by which a call to ``provider`` must finish"""
+    budget = PROVIDER_TIMEOUTS.get(provider, max(PROVIDER_TIMEOUTS.values()))
+    current = _deadline.get()
+    if current is not None:
+        at, total = current
+        budget = min(budget, total * PROVIDER_SHARES.get(provider, 1.0), max(0.0, at - _now()))
+    return _now() + budget
+
+
+def time_left(deadline):
+    return max(0.0, deadline - _now())
+
+
+@contextlib.asynccontextmanager
+async def until(provider, deadline):
+    """Cancel the block at ``deadline``, raising TimeoutError"""
+    try:
+        # time.monotonic is the event loop's clock
+        async with asyncio.timeout_at(deadline):
+            yield
+    except TimeoutError:
+        metrics.DEADLINE_EXCEEDED_TOTAL.inc(provider=provider)
+        raise
+
+
+# -------------------------------
+# Circuit breakers
+# -------------------------------
+def _is_failure(error):
+    """Errors that say the provider is unhealthy, as opposed to a bad request"""
+    return isinstance(error, TimeoutError) or is_retryable(error)
+
+
+class CircuitBreaker:
+    def __init__(self, provider, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        if self.state == CLOSED:
+            return
+        waited = _now() - self.opened_at
+        if self.state == OPEN and waited >= self.reset_seconds:
+            self.state = HALF_OPEN
+            logger.info(f"{self.provider} circuit half-open, sending a trial call")
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return
+        raise CircuitOpen(self.provider, max(0.0, self.reset_seconds - waited))
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"{self.provider} circuit closed")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                metrics.CIRCUIT_OPENED_TOTAL.inc(provider=self.provider)
+                logger.warning(f"{self.provider} circuit opened after {self.failures} failures")
+            self.state = OPEN
+            self.opened_at = _now()
+
+    @contextlib.contextmanager
+    def guard(self):
+        """Check the breaker, then count the block's outcome. Bad requests
+        (4xx other than 408/409/429) and cancellations don't count either way."""
+        self.check()
+        try:
+            yield
+        except Exception as e:
+            if _is_failure(e):
+                self.record_failure()
+            elif self.state == HALF_OPEN:
+                self._trial_running = False
+            raise
+        except BaseException:
+            self._trial_running = False
+            raise
+        else:
+            self.record_success()
+
+
+_breakers = {}
+
+
+def get_breaker(provider):
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(provider)
+    return breaker
+
+
+def circuit_states():
+    """Breaker state per provider that has been called, for /health"""
+    return {provider: breaker.state for provider, breaker in _breakers.items()}
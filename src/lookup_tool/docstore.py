@@ -0,0 +1,253 @@
+"""Content-addressed, append-only document store.
+
+Payloads are appended to packed segment files and addressed by their
+SHA-256, so identical payloads are stored once. A SQLite index maps each
+(company, key) to the hash of its current version and each hash to its
+location in a segment. Reads are zero-copy slices of memory-mapped
+segments. Superseded versions stay in the segments until ``compact()``
+rewrites the live payloads into a fresh segment.
+
+    python -m lookup_tool.docstore stats
+    python -m lookup_tool.docstore compact
+"""
+import argparse
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.path.join("data", "docstore")
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Each record: magic, payload length, SHA-256 digest, payload
+RECORD_MAGIC = b"LTD1"
+RECORD_HEADER = struct.Struct(">4sQ32s")
+
+
+class DocumentStore:
+    def __init__(self, root=DEFAULT_ROOT, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._maps = {}
+        self._index = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.executescript(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY, segment INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_blobs_segment ON blobs (segment);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " company TEXT NOT NULL, key TEXT NOT NULL, hash TEXT NOT NULL, version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (company, key));"
+        )
+        self._index.commit()
+        self._active = self._latest_segment() or 1
+
+    # -------------------------------
+    # Segments
+    # -------------------------------
+    def _segment_path(self, segment):
+        return os.path.join(self.root, f"seg-{segment:06d}.pack")
+
+    def _segments(self):
+        return sorted(
+            int(name[4:10]) for name in os.listdir(self.root)
+            if name.startswith("seg-") and name.endswith(".pack")
+        )
+
+    def _latest_segment(self):
+        segments = self._segments()
+        return segments[-1] if segments else None
+
+    def _append(self, digest, payload):
+        """Append one record durably, returning (segment, payload offset)"""
+        path = self._segment_path(self._active)
+        if os.path.exists(path) and os.path.getsize(path) + RECORD_HEADER.size + len(payload) > self.segment_max_bytes:
+            self._active += 1
+            path = self._segment_path(self._active)
+        with open(path, "ab") as f:
+            offset = f.tell() + RECORD_HEADER.size
+            f.write(RECORD_HEADER.pack(RECORD_MAGIC, len(payload), digest) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # The segment grew; drop any stale mapping of it
+        self._unmap(self._active)
+        return self._active, offset
+
+    def _map(self, segment):
+        mapped = self._maps.get(segment)
+        if mapped is None:
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def _unmap(self, segment):
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a view; the mapping is freed with it
+                pass
+
+    # -------------------------------
+    # Public API
+    # -------------------------------
+    def put(self, company, key, payload):
+        """Store ``payload`` (bytes or str) as the current version of
+        (company, key). Returns its content hash."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        digest = hashlib.sha256(payload).digest()
+        content_hash = digest.hex()
+
+        with self._lock:
+            exists = self._index.execute("SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+            if not exists:
+                segment, offset = self._append(digest, payload)
+            # Blob row and document pointer change in one transaction, after
+            # the payload is on disk, so readers never see a dangling hash
+            with self._index:
+                if not exists:
+                    self._index.execute(
+                        "INSERT INTO blobs (hash, segment, offset, length) VALUES (?, ?, ?, ?)",
+                        (content_hash, segment, offset, len(payload)),
+                    )
+                self._index.execute(
+                    "INSERT INTO documents (company, key, hash, version, updated_at) VALUES (?, ?, ?, 1, ?)"
+                    " ON CONFLICT (company, key) DO UPDATE SET"
+                    "  version = CASE WHEN hash = excluded.hash THEN version ELSE version + 1 END,"
+                    "  hash = excluded.hash, updated_at = excluded.updated_at",
+                    (company, key, content_hash, time.time()),
+                )
+        return content_hash
+
+    def put_many(self, company, documents):
+        """Store several {key: payload} documents for one company"""
+        return {key: self.put(company, key, payload) for key, payload in documents.items()}
+
+    def get_blob(self, content_hash):
+        """Zero-copy memoryview of a stored payload, or None"""
+        with self._lock:
+            row = self._index.execute(
+                "SELECT segment, offset, length FROM blobs WHERE hash = ?", (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            segment, offset, length = row
+            return memoryview(self._map(segment))[offset:offset + length]
+
+    def get(self, company, key):
+        """Zero-copy memoryview of the current version of (company, key), or None"""
+        # One lock for both lookups, so compact can't move the blob in between
+        with self._lock:
+            row = self._index.execute(
+                "SELECT hash FROM documents WHERE company = ? AND key = ?", (company, key)
+            ).fetchone()
+            return self.get_blob(row[0]) if row else None
+
+    def get_text(self, company, key):
+        view = self.get(company, key)
+        if view is None:
+            return None
+        try:
+            return str(view, "utf-8")
+        finally:
+            view.release()
+
+    def keys(self, company):
+        with self._lock:
+            return [row[0] for row in self._index.execute(
+                "SELECT key FROM documents WHERE company = ? ORDER BY key", (company,)
+            )]
+
+    def stats(self):
+        with self._lock:
+            segments = self._segments()
+            total = sum(os.path.getsize(self._segment_path(s)) for s in segments)
+            live = self._index.execute(
+                "SELECT COALESCE(SUM(length), 0), COUNT(*) FROM blobs WHERE hash IN (SELECT hash FROM documents)"
+            ).fetchone()
+            documents = self._index.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {
+            "segments": len(segments),
+            "segment_bytes": total,
+            "live_payload_bytes": live[0],
+            "live_blobs": live[1],
+            "documents": documents,
+        }
+
+    def compact(self):
+        """Rewrite every live payload into new segments and delete the old
+        ones, reclaiming superseded versions and orphaned records"""
+        with self._lock:
+            old_segments = self._segments()
+            live = self._index.execute(
+                "SELECT hash, segment, offset, length FROM blobs"
+                " WHERE hash IN (SELECT hash FROM documents) ORDER BY segment, offset"
+            ).fetchall()
+
+            self._active = (old_segments[-1] + 1) if old_segments else 1
+            moved = []
+            for content_hash, segment, offset, length in live:
+                payload = self._map(segment)[offset:offset + length]
+                new_segment, new_offset = self._append(bytes.fromhex(content_hash), payload)
+                moved.append((new_segment, new_offset, content_hash))
+
+            with self._index:
+                self._index.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM documents)")
+                self._index.executemany("UPDATE blobs SET segment = ?, offset = ? WHERE hash = ?", moved)
+
+            reclaimed = 0
+            for segment in old_segments:
+                self._unmap(segment)
+                path = self._segment_path(segment)
+                reclaimed += os.path.getsize(path)
+                os.remove(path)
+            reclaimed -= sum(os.path.getsize(self._segment_path(s)) for s in self._segments())
+        logger.info(f"Compacted document store: {len(live)} live blobs, {reclaimed} bytes reclaimed")
+        return {"live_blobs": len(live), "bytes_reclaimed": reclaimed}
+
+    def close(self):
+        with self._lock:
+            for segment in list(self._maps):
+                self._unmap(segment)
+            self._index.close()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = DocumentStore(os.getenv("DOCSTORE_ROOT", DEFAULT_ROOT))
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document store maintenance")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--root", default=os.getenv("DOCSTORE_ROOT", DEFAULT_ROOT))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = DocumentStore(args.root)
+    try:
+        if args.command == "compact":
+            print(store.compact())
+        print(store.stats())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Offline bulk enrichment of CSV files, resumable after a crash.
+
+    enrich companies.csv --column name --output companies.db
+    enrich people.csv --processes 4 --openai 32
+
+The input is read a row at a time. Each identifier is classified and
+looked up the way a /batch item is: company or person summary and news.
+Lookups run through the same per-provider concurrency caps and rate
+limits, at batch priority. Results go to a SQLite file, committed every
+``--chunk-size`` rows. That file is also the checkpoint: a rerun skips
+rows that are already in it, so a crashed or interrupted run picks up
+where it stopped, and ``--retry-failed`` gives failed rows another try.
+
+With ``--processes N`` the rows are dealt out round-robin to N worker
+processes, each with 1/N of every provider quota and concurrency cap.
+Rows per second are reported on stderr while the run goes.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+from . import main as app
+from . import records, scheduler
+from .limits import DEFAULT_CONCURRENCY, PROVIDERS, ProviderLimits, use_limits
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+# Commit a partial chunk after this long, so slow runs still checkpoint
+FLUSH_SECONDS = 10.0
+REPORT_SECONDS = 5.0
+
+RESULT_COLUMNS = ("row", "input", "status", "query_type", "ticker", "result", "news", "error", "elapsed", "finished_at")
+
+
+def read_identifiers(path, column=None):
+    """(row, identifier) for every non-blank data row, streamed from the CSV.
+    Rows are numbered from 0 after the header, blank ones included, so the
+    numbers stay stable between runs."""
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.reader(handle)
+        index = 0
+        if column is not None:
+            header = next(reader, [])
+            if column not in header:
+                raise SystemExit(f"{path} has no column {column!r} (columns: {', '.join(header)})")
+            index = header.index(column)
+        for row, fields in enumerate(reader):
+            identifier = fields[index].strip() if len(fields) > index else ""
+            if identifier:
+                yield row, identifier
+
+
+class ResultWriter:
+    """Enrichment results in SQLite; the rows already written are the checkpoint"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " row INTEGER PRIMARY KEY, input TEXT NOT NULL, status TEXT NOT NULL, query_type TEXT, ticker TEXT,"
+            " result TEXT, news TEXT, error TEXT, elapsed REAL, finished_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+
+    def claim(self, source, column):
+        """Tie the output to one input file and column; resuming with another is an error"""
+        expected = {"input": os.path.abspath(source), "column": column or ""}
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO run VALUES (?, ?)", expected.items())
+            self._conn.commit()
+            stored = dict(self._conn.execute("SELECT key, value FROM run").fetchall())
+        if stored != expected:
+            raise SystemExit(
+                f"Output was written for {stored['input']} (column {stored['column'] or 'first'}); "
+                "choose another --output to enrich a different file"
+            )
+
+    def finished_rows(self, retry_failed=False):
+        query = "SELECT row FROM results" + (" WHERE status = 'success'" if retry_failed else "")
+        with self._lock:
+            return {row for (row,) in self._conn.execute(query)}
+
+    def write(self, records):
+        """Store one chunk of records in a single transaction"""
+        rows = [tuple(record.get(column) for column in RESULT_COLUMNS) for record in records]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO results ({', '.join(RESULT_COLUMNS)})"
+                f" VALUES ({', '.join('?' for _ in RESULT_COLUMNS)})",
+                rows,
+            )
+            self._conn.commit()
+
+    def progress(self):
+        """(rows written, rows that failed)"""
+        with self._lock:
+            done, failed = self._conn.execute(
+                "SELECT count(*), coalesce(sum(status = 'error'), 0) FROM results"
+            ).fetchone()
+        return done, failed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _record(row, identifier, started, outcome=None, error=None):
+    outcome = outcome or {}
+    return {
+        "row": row,
+        "input": identifier,
+        "status": "error" if error else "success",
+        "query_type": outcome.get("query_type"),
+        "ticker": outcome.get("ticker"),
+        "result": outcome.get("result"),
+        "news": records.dumps_text(outcome["news"]) if outcome.get("news") is not None else None,
+        "error": error,
+        "elapsed": round(time.perf_counter() - started, 3),
+        "finished_at": time.time(),
+    }
+
+
+async def enrich(args, shard=0, shards=1):
+    """Look up this shard's unfinished rows, checkpointing every chunk"""
+    if shards > 1:
+        scheduler.share_quotas(1 / shards)
+    concurrency = {**DEFAULT_CONCURRENCY, **args.concurrency}
+    # This shard's part of each cap; the parts add up to the cap
+    limits = ProviderLimits({
+        p: max(1, limit // shards + (shard < limit % shards)) for p, limit in concurrency.items()
+    })
+    # Worker tasks inherit both from this context
+    use_limits(limits)
+    scheduler.use_priority(scheduler.BATCH)
+
+    writer = ResultWriter(args.output)
+    finished = await asyncio.to_thread(writer.finished_rows, args.retry_failed)
+    worker_count = max(limits.concurrency.values())
+    queue = asyncio.Queue(maxsize=worker_count * 2)
+    pending = []
+    last_flush = time.monotonic()
+
+    async def flush():
+        nonlocal pending, last_flush
+        records, pending = pending, []
+        last_flush = time.monotonic()
+        if records:
+            await asyncio.to_thread(writer.write, records)
+
+    async def feed():
+        for row, identifier in read_identifiers(args.input, args.column):
+            if row % shards == shard and row not in finished:
+                await queue.put((row, identifier))
+        for _ in range(worker_count):
+            await queue.put(None)
+
+    async def worker():
+        while (item := await queue.get()) is not None:
+            row, identifier = item
+            started = time.perf_counter()
+            try:
+                record = _record(row, identifier, started, await app.lookup_for_batch(identifier))
+            except Exception as e:
+                record = _record(row, identifier, started, error=str(e) or type(e).__name__)
+            # After the await: a flush may have swapped the list meanwhile
+            pending.append(record)
+            if len(pending) >= args.chunk_size or time.monotonic() - last_flush > FLUSH_SECONDS:
+                await flush()
+
+    await app.start_services()
+    try:
+        await asyncio.gather(feed(), *(worker() for _ in range(worker_count)))
+    finally:
+        # Keep whatever finished before an interrupt
+        records, pending = pending, []
+        if records:
+            writer.write(records)
+        await app.stop_services()
+        writer.close()
+
+
+def _configure_logging(level):
+    logging.basicConfig(level=level, format='%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+
+
+def run_shard(args, shard, shards):
+    """Worker process entry point"""
+    _configure_logging(args.log_level)
+    try:
+        asyncio.run(enrich(args, shard, shards))
+    except KeyboardInterrupt:
+        pass  # finished rows were written on the way out
+
+
+class ProgressReporter(threading.Thread):
+    """Print rows written, failures and rows/sec to stderr every few seconds"""
+
+    def __init__(self, writer, interval=REPORT_SECONDS):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.started = time.perf_counter()
+        self.baseline = writer.progress()[0]
+
+    def line(self):
+        done, failed = self.writer.progress()
+        elapsed = time.perf_counter() - self.started
+        rate = (done - self.baseline) / elapsed if elapsed > 0 else 0.0
+        return f"{done:,} rows written ({failed:,} failed), {done - self.baseline:,} this run at {rate:,.1f} rows/s"
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            print(self.line(), file=sys.stderr, flush=True)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        print(self.line(), file=sys.stderr, flush=True)
+
+
+def run_processes(args):
+    """Run one shard per process; an interrupt is passed on so each checkpoints"""
+    # Spawned, so each worker starts with fresh event loops, pools and quotas
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_shard, args=(args, shard, args.processes)) for shard in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in processes:
+            process.join()
+        raise
+    failed = [shard for shard, process in enumerate(processes) if process.exitcode]
+    if failed:
+        raise SystemExit(f"Worker processes for shards {failed} failed; rerun to resume")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich a CSV of companies, tickers and people")
+    parser.add_argument("input", help="CSV file, one identifier per row")
+    parser.add_argument("--column", help="header of the identifier column (default: first column, no header)")
+    parser.add_argument("--output", help="SQLite results file (default: <input>.enriched.db)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes sharing the provider quotas; worth it once one process is CPU-bound")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per committed chunk")
+    parser.add_argument("--retry-failed", action="store_true", help="look up rows that failed last time again")
+    parser.add_argument("--log-level", default="WARNING")
+    for provider in PROVIDERS:
+        parser.add_argument(f"--{provider}", type=int, help=f"concurrent {provider} calls across all processes")
+    args = parser.parse_args()
+    args.output = args.output or os.path.splitext(args.input)[0] + ".enriched.db"
+    args.concurrency = {p: getattr(args, p) for p in PROVIDERS if getattr(args, p) is not None}
+    args.log_level = args.log_level.upper()
+
+    _configure_logging(args.log_level)
+    writer = ResultWriter(args.output)
+    writer.claim(args.input, args.column)
+    reporter = ProgressReporter(writer)
+    reporter.start()
+    try:
+        if args.processes <= 1:
+            asyncio.run(enrich(args))
+        else:
+            run_processes(args)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+    finally:
+        reporter.stop()
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+
+from . import deadlines, metrics, scheduler
+
+PROVIDERS = ("openai", "serper", "newsapi", "yahoo")
+
+DEFAULT_CONCURRENCY = {
+    "openai": int(os.getenv("BATCH_CONCURRENCY_OPENAI", 8)),
+    "serper": int(os.getenv("BATCH_CONCURRENCY_SERPER", 16)),
+    "newsapi": int(os.getenv("BATCH_CONCURRENCY_NEWSAPI", 8)),
+    "yahoo": int(os.getenv("BATCH_CONCURRENCY_YAHOO", 4)),
+}
+
+
+class ProviderLimits:
+    """Per-provider concurrency caps for one batch of lookups"""
+
+    def __init__(self, concurrency=None):
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self._semaphores = {
+            provider: asyncio.Semaphore(max(1, limit)) for provider, limit in self.concurrency.items()
+        }
+
+    def semaphore(self, provider):
+        return self._semaphores[provider]
+
+
+_current_limits = contextvars.ContextVar("provider_limits", default=None)
+
+
+def use_limits(limits):
+    """Apply ``limits`` to upstream calls made from the current context"""
+    return _current_limits.set(limits)
+
+
+@contextlib.asynccontextmanager
+async def provider_slot(provider, tokens=0):
+    """Wait for ``provider``'s rate limit (and a concurrency slot if the
+    caller runs under batch limits), then time the call, excluding the wait.
+    ``tokens`` is the LLM token estimate charged to the tokens-per-minute bucket."""
+    limits = _current_limits.get()
+    semaphore = limits.semaphore(provider) if limits is not None else contextlib.nullcontext()
+    async with semaphore:
+        await scheduler.get_scheduler(provider).acquire(scheduler.current_priority(), tokens)
+        with metrics.timed(provider):
+            yield
+
+
+async def call_upstream(provider, fn, tokens=0):
+    """Await ``fn()`` inside a provider slot, retrying transient failures
+    (each attempt waits for its own slot). The whole call, queueing and
+    retries included, must finish within the provider's share of the
+    request deadline, and fails fast with CircuitOpen while the provider's
+    breaker is open."""
+    with deadlines.get_breaker(provider).guard():
+        deadline = deadlines.stage_deadline(provider)
+
+        async def attempt():
+            async with deadlines.until(provider, deadline):
+                async with provider_slot(provider, tokens):
+                    return await fn()
+        return await scheduler.call_with_retries(provider, attempt, deadline=deadline)
@@ -0,0 +1,135 @@
+"""LLM execution: model tiers and hedged requests.
+
+Two model tiers. Calls use the standard tier unless the caller asks for
+the fast one, as the reduce step of document summaries does: it only
+combines already-distilled chunk summaries. A short prompt is not a
+light one (a company summary starts from a one-line prompt), so the tier
+is never picked by prompt size.
+
+``complete`` hedges: when the first request hasn't answered after the
+model's observed p95 latency, it sends one more identical request and
+returns whichever finishes first, cancelling the other. A first request
+that loses is recorded with the time it had taken when it was cancelled,
+so stragglers keep counting toward the p95. Hedges are not
+sent while requests are queueing for the OpenAI rate limit, when extra
+load would only make things worse. Streams are never hedged; their first
+token is already on its way to the client.
+"""
+import asyncio
+import collections
+import logging
+import os
+import time
+
+from . import metrics, scheduler
+from .limits import call_upstream
+
+logger = logging.getLogger(__name__)
+
+STANDARD, FAST = "standard", "fast"
+MODELS = {
+    STANDARD: os.getenv("OPENAI_MODEL", "gpt-4"),
+    # Empty disables the fast tier
+    FAST: os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini"),
+}
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+# Hedge delay until a model has HEDGE_MIN_SAMPLES latencies, then a floor
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", 8))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 0.5))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+def model_for(tier):
+    return MODELS.get(tier) or MODELS[STANDARD]
+
+
+class ModelStats:
+    """Recent latencies and hedge counts for one model"""
+
+    def __init__(self):
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging: the recent p95 latency"""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        ordered = sorted(self.latencies)
+        p = ordered[min(len(ordered) - 1, int(HEDGE_PERCENTILE * len(ordered)))]
+        return max(HEDGE_MIN_DELAY, p)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000),
+        }
+
+
+_models = collections.defaultdict(ModelStats)
+
+
+def stats():
+    """Per-model call and hedge counters for /stats"""
+    return {model: entry.as_dict() for model, entry in _models.items()}
+
+
+def _may_hedge():
+    return HEDGE_ENABLED and scheduler.get_scheduler("openai").queued == 0
+
+
+async def hedged(model, call):
+    """Await ``call()``, racing a second ``call()`` against it once the
+    model's hedge delay passes; the loser is cancelled"""
+    entry = _models[model]
+    entry.calls += 1
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(call())]
+    outcome = "not_fired"
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=entry.hedge_delay())
+        if not done and _may_hedge():
+            entry.hedges_fired += 1
+            outcome = "primary_won"
+            logger.info(f"Hedging {model} request after {entry.hedge_delay():.2f}s")
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        entry.hedges_won += 1
+                        outcome = "hedge_won"
+                        logger.info(f"Hedged {model} request won")
+                        if not tasks[0].done():
+                            # The primary took at least this long; leaving it
+                            # out would pull the p95, and the hedge delay, down
+                            entry.latencies.append(time.perf_counter() - started)
+                    return task.result()
+        # Every request failed; report the primary's error
+        raise tasks[0].exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        metrics.LLM_CALLS_TOTAL.inc(model=model, hedge=outcome)
+
+
+async def complete(client, request, tokens=0):
+    """One hedged chat completion through the rate limiter"""
+    model = request["model"]
+
+    async def attempt():
+        start = time.perf_counter()
+        response = await client.chat.completions.create(**request)
+        _models[model].latencies.append(time.perf_counter() - start)
+        return response
+
+    return await hedged(model, lambda: call_upstream("openai", attempt, tokens=tokens))
@@ -0,0 +1,180 @@
+"""Queue-based logging: handlers run on a listener thread, never on the event loop.
+
+Records are queued by the calling thread and formatted and written by a
+``QueueListener``. Every record carries the request ID of the request
+that emitted it. Long fields are capped, and verbose response bodies are
+only logged for a sampled fraction of requests.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# uvicorn installs its own synchronous handlers on these
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener = None
+_queue_handler = None
+_max_field_chars = 2000
+_body_sample_rate = 0.0
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def cap(value, limit=None):
+    """Truncate long strings, noting how much was dropped"""
+    limit = limit or _max_field_chars
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current request ID as it is created"""
+
+    def filter(self, record):
+        record.request_id = request_id.get() or "-"
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message now (its args may change later), but leave
+        # formatting, exc_info and fields to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured ``fields`` passed via extra= are merged in"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": cap(record.getMessage()),
+        }
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            entry[key] = cap(value)
+        if record.exc_info:
+            entry["exc"] = cap(self.formatException(record.exc_info), _max_field_chars * 4)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class CappedTextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={cap(value)!r}" for key, value in fields.items())
+        return cap(text, _max_field_chars * 2)
+
+
+def setup_logging(settings):
+    """Route all logging through a queue to stdout and a rotating file.
+    Safe to call more than once; only the first call installs handlers."""
+    global _listener, _queue_handler, _max_field_chars, _body_sample_rate
+    if _listener is not None:
+        return _listener
+    _max_field_chars = settings.log_field_max_chars
+    _body_sample_rate = settings.log_body_sample_rate
+
+    os.makedirs(settings.log_dir, exist_ok=True)
+    # Rotation isn't safe across processes, so each worker gets its own file
+    filename = f"agent_queries.{os.getpid()}.log" if settings.log_per_process else "agent_queries.log"
+    formatter = JsonFormatter() if settings.log_format == "json" else CappedTextFormatter(TEXT_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(settings.log_dir, filename),
+        maxBytes=settings.log_max_bytes,
+        backupCount=settings.log_backups,
+        encoding="utf-8",
+    )
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(settings.log_level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def log_body(logger, message, body, **fields):
+    """Log a verbose response body for a sampled fraction of calls; the
+    rest get its size only"""
+    if body and random.random() < _body_sample_rate:
+        logger.info(message, extra={"fields": {**fields, "body": body}})
+    else:
+        logger.info(message, extra={"fields": {**fields, "body_chars": len(body or "")}})
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: take X-Request-ID from the client or make one, keep it
+    in a contextvar for the request's log records and echo it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode())
+        current = incoming.decode("latin-1")[:64] if incoming else new_request_id()
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER.encode(), current.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -1,154 +1,91 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 import logging
 import os
 import sys
 import platform
-from datetime import datetime
-from pathlib import Path
-import requests
+from datetime import datetime, timedelta
+from importlib import metadata
 import re
 
-from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-import uvicorn
+from fastapi import APIRouter, FastAPI, Request, Form
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
+from . import batch, cache, clients, db, deadlines, llm, market, metrics, news, prefetch, prompts, records, scheduler, singleflight, suggest, symbols
+from .limits import PROVIDERS, call_upstream
 from .agents import realtime_summary_agent
 from .agent_runner import Agent, Runner
+from .logging_setup import RequestIdMiddleware, log_body, setup_logging, stop_logging
+from .settings import PACKAGE_DIR, configured, get_settings
+
+logger = logging.getLogger(__name__)
 
 # -------------------------------
 # Logging setup
 # -------------------------------
-def setup_logging():
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    log_filename = os.path.join(log_dir, "agent_queries.log")
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filename),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    return logging.getLogger(__name__)
-
-def log_system_info(logger):
+def log_system_info(settings, logger):
     logger.info("=" * 50)
     logger.info("SYSTEM INFORMATION")
     logger.info(f"Python Version: {sys.version}")
     logger.info(f"Platform: {platform.platform()}")
     try:
-        import openai
-        OPENAI_VERSION = openai.__version__
-    except ImportError:
+        # Read from package metadata; importing the SDK just for this is slow
+        OPENAI_VERSION = metadata.version("openai")
+    except metadata.PackageNotFoundError:
         OPENAI_VERSION = "Not installed"
     logger.info(f"OpenAI SDK Version: {OPENAI_VERSION}")
     logger.info(f"Session Started: {datetime.now()}")
+    logger.info(f".env file: {settings.env_file or 'not found, using the process environment'}")
+    for provider, has_key in configured(settings).items():
+        logger.info(f"{provider} API key loaded: {'Yes' if has_key else 'No'}")
     logger.info("=" * 50)
 
-# -------------------------------
-# Load environment variables with better debugging
-# -------------------------------
-logger = setup_logging()
-
-# Debug: Show current file path
-current_file = Path(__file__).resolve()
-logger.info(f"Current file: {current_file}")
-
-# Try multiple possible locations for .env file
-possible_env_paths = [
-    # Project root (2 levels up from main.py)
-    current_file.parents[2] / ".env",
-    # One level up (in case structure is different)
-    current_file.parents[1] / ".env", 
-    # Same directory as main.py
-    current_file.parent / ".env",
-    # Current working directory
-    Path.cwd() / ".env"
-]
-
-env_loaded = False
-for env_path in possible_env_paths:
-    logger.info(f"Checking for .env at: {env_path}")
-    if env_path.exists():
-        logger.info(f"Found .env file at: {env_path}")
-        load_dotenv(dotenv_path=env_path)
-        env_loaded = True
-        break
-    else:
-        logger.info(f".env file not found at: {env_path}")
-
-if not env_loaded:
-    logger.warning("No .env file found in any of the expected locations")
-    logger.info("Will try to load environment variables from system environment")
-    # Try loading from system environment anyway
-    load_dotenv()
-
-# Load API keys
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-NEWSAPI_ORG_API_KEY = os.getenv("NEWSAPI_ORG_API_KEY")
-SERPER_API_KEY = os.getenv("SERPER_API_KEY")  # For Google Search API
-CLEARBIT_API_KEY = os.getenv("CLEARBIT_API_KEY")  # For person enrichment
-
-# Debug: Show which keys were loaded (without revealing the actual keys)
-logger.info(f"ALPHA_VANTAGE_API_KEY loaded: {'Yes' if ALPHA_VANTAGE_API_KEY else 'No'}")
-logger.info(f"OPENAI_API_KEY loaded: {'Yes' if OPENAI_API_KEY else 'No'}")
-logger.info(f"NEWSAPI_ORG_API_KEY loaded: {'Yes' if NEWSAPI_ORG_API_KEY else 'No'}")
-logger.info(f"SERPER_API_KEY loaded: {'Yes' if SERPER_API_KEY else 'No'}")
-logger.info(f"CLEARBIT_API_KEY loaded: {'Yes' if CLEARBIT_API_KEY else 'No'}")
-
-if NEWSAPI_ORG_API_KEY:
-    logger.info(f"NEWSAPI_ORG_API_KEY (first 8 chars): {NEWSAPI_ORG_API_KEY[:8]}...")
-
-log_system_info(logger)
-
-# -------------------------------
-# FastAPI setup
-# -------------------------------
-app = FastAPI(
-    title="Lookup Tool",
-    description="Customer/Stock/Person Lookup API",
-    version="0.1.0"
-)
-
-BASE_DIR = Path(__file__).resolve().parent
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
-logger.info(f"Using Templates Directory: {templates.env.loader.searchpath[0]}")
-
 # -------------------------------
 # Person Search Functions
 # -------------------------------
-def search_person_with_google(person_name: str, logger):
+async def search_person_with_google(person_name: str, logger):
+    """Search for person information, sharing in-flight searches for the same name"""
+    return await singleflight.person_searches.do(
+        cache.normalize_identifier(person_name),
+        lambda: _search_person_with_google(person_name, logger)
+    )
+
+async def _search_person_with_google(person_name: str, logger):
     """Search for person information using Google Search API (Serper)"""
-    if not SERPER_API_KEY:
+    api_key = get_settings().serper_api_key
+    if not api_key:
         logger.warning("Serper API key not configured for Google search")
         return []
 
     try:
-        url = "https://google.serper.dev/search"
         payload = {
             "q": f'"{person_name}" LinkedIn OR professional OR biography OR company',
             "num": 10
         }
         headers = {
-            "X-API-KEY": SERPER_API_KEY,
+            "X-API-KEY": api_key,
             "Content-Type": "application/json"
         }
         
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
+        async def search():
+            response = await clients.get_clients().serper.post("/search", json=payload, headers=headers)
+            response.raise_for_status()
+            return response
+
+        response = await call_upstream("serper", search)
         results = response.json()
         
-        search_results = []
-        for result in results.get("organic", []):
-            search_results.append({
-                "title": result.get("title", ""),
-                "url": result.get("link", ""),
-                "snippet": result.get("snippet", ""),
-                "source": result.get("displayLink", "")
-            })
+        search_results = [
+            records.SearchResult(
+                result.get("title", ""), result.get("link", ""), result.get("snippet", ""), result.get("displayLink", "")
+            )
+            for result in results.get("organic", [])
+        ]
         
         logger.info(f"Found {len(search_results)} search results for: {person_name}")
         return search_results
@@ -159,7 +96,7 @@ def search_person_with_google(person_name: str, logger):
 
 def search_person_with_clearbit(person_name: str, logger):
     """Search for person information using Clearbit Enrichment API"""
-    if not CLEARBIT_API_KEY:
+    if not get_settings().clearbit_api_key:
         logger.warning("Clearbit API key not configured")
         return None
 
@@ -174,141 +111,172 @@ def search_person_with_clearbit(person_name: str, logger):
         return None
 
 def extract_person_info_from_search(search_results: list, person_name: str, logger):
-    """Extract and structure person information from search results"""
-    person_info = {
-        "name": person_name,
-        "linkedin_profiles": [],
-        "professional_info": [],
-        "company_affiliations": [],
-        "other_profiles": []
-    }
-    
+    """Sort search results into a PersonProfile's sections (the results are shared, not copied)"""
+    person_info = records.PersonProfile(person_name)
+
     for result in search_results:
-        title = result.get("title", "").lower()
-        url = result.get("url", "")
-        snippet = result.get("snippet", "")
-        
+        title = result.title.lower()
+
         # Check for LinkedIn profiles
-        if "linkedin.com/in/" in url:
-            person_info["linkedin_profiles"].append({
-                "title": result.get("title", ""),
-                "url": url,
-                "snippet": snippet
-            })
-        
+        if "linkedin.com/in/" in result.url:
+            person_info.linkedin_profiles.append(result)
+
         # Check for company websites or professional info
         elif any(keyword in title for keyword in ["ceo", "founder", "director", "manager", "executive", "president"]):
-            person_info["professional_info"].append({
-                "title": result.get("title", ""),
-                "url": url,
-                "snippet": snippet,
-                "source": result.get("source", "")
-            })
-        
+            person_info.professional_info.append(result)
+
         # Check for company affiliations
-        elif any(keyword in snippet.lower() for keyword in ["works at", "employed at", "ceo of", "founder of"]):
-            person_info["company_affiliations"].append({
-                "title": result.get("title", ""),
-                "url": url,
-                "snippet": snippet,
-                "source": result.get("source", "")
-            })
-        
+        elif any(keyword in result.snippet.lower() for keyword in ["works at", "employed at", "ceo of", "founder of"]):
+            person_info.company_affiliations.append(result)
+
         # Other relevant profiles
         else:
-            person_info["other_profiles"].append({
-                "title": result.get("title", ""),
-                "url": url,
-                "snippet": snippet,
-                "source": result.get("source", "")
-            })
-    
+            person_info.other_profiles.append(result)
+
     return person_info
 
 # -------------------------------
 # NewsAPI integration
 # -------------------------------
-def get_recent_news(company_name: str, logger, max_articles=5):
-    if not NEWSAPI_ORG_API_KEY:
+async def get_recent_news(company_name: str, logger, max_articles=5):
+    """Recent news for a company or person from the local news store, which
+    is filled on first lookup and kept current by the news poller"""
+    if not get_settings().newsapi_api_key:
         logger.warning("NewsAPI API key not configured")
         return []
-
     try:
-        url = "https://newsapi.org/v2/everything"
-        params = {
-            "q": company_name,
-            "language": "en",
-            "sortBy": "publishedAt",
-            "pageSize": max_articles,
-            "apiKey": NEWSAPI_ORG_API_KEY
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        articles = response.json().get("articles", [])
-        logger.info(f"Found {len(articles)} news articles for: {company_name}")
-        return [
-            {
-                "title": a["title"],
-                "url": a["url"],
-                "date": a["publishedAt"][:10],
-                "source": a["source"]["name"],
-                "summary": a.get("description") or a.get("content") or "No summary available."
-            }
-            for a in articles
-        ]
+        news_items = await news.get_store().latest(company_name, max_articles)
+        logger.info(f"Found {len(news_items)} news articles for: {company_name}")
+        return news_items
     except Exception as e:
+        # The lookup goes on without news (a locked store, NewsAPI down)
         logger.error(f"Error retrieving news from NewsAPI: {e}")
         return []
 
 # -------------------------------
 # Query Type Detection
 # -------------------------------
+def classify(identifier: str):
+    """symbols.classify, timed as the classification stage"""
+    with metrics.timed("classification"):
+        return symbols.classify(identifier)
+
 def detect_query_type(identifier: str, logger):
     """Detect if the input is a stock ticker, company name, or person name"""
-    identifier = identifier.strip()
-    
-    # Stock ticker detection
-    if identifier.isupper() and len(identifier) <= 5 and identifier.isalpha():
-        return "stock_ticker"
-    
-    # Person name detection (has typical name patterns)
-    name_patterns = [
-        r'^[A-Z][a-z]+ [A-Z][a-z]+$',  # First Last
-        r'^[A-Z][a-z]+ [A-Z]\. [A-Z][a-z]+$',  # First M. Last
-        r'^[A-Z][a-z]+ [A-Z][a-z]+ [A-Z][a-z]+$',  # First Middle Last
-        r'^Dr\. [A-Z][a-z]+ [A-Z][a-z]+$',  # Dr. First Last
-        r'^Mr\. [A-Z][a-z]+ [A-Z][a-z]+$',  # Mr. First Last
-        r'^Ms\. [A-Z][a-z]+ [A-Z][a-z]+$',  # Ms. First Last
-    ]
-    
-    for pattern in name_patterns:
-        if re.match(pattern, identifier):
-            return "person_name"
-    
-    # Check if it contains typical person name indicators
-    person_indicators = ["Dr.", "Mr.", "Ms.", "Mrs.", "Prof."]
-    if any(indicator in identifier for indicator in person_indicators):
-        return "person_name"
-    
-    # If it has 2-3 capitalized words, likely a person
-    words = identifier.split()
-    if 2 <= len(words) <= 3 and all(word[0].isupper() for word in words if word):
-        return "person_name"
-    
-    # Default to company name
-    return "company_name"
+    return classify(identifier).query_type
 
 # -------------------------------
 # Enhanced Query Logic
 # -------------------------------
-def query_person_info(person_name: str, logger):
+PERSON_ANALYST_INSTRUCTIONS = """You are a professional researcher that provides comprehensive and respectful summaries about individuals based on publicly available information.
+
+When summarizing a person's profile, include:
+- Full name and current professional title
+- Current company/organization and role
+- Professional background and experience
+- Education (if available)
+- Notable achievements or recognition
+- Industry expertise
+- Contact information (only if publicly available)
+
+Be respectful, factual, and focus on professional information. Use markdown formatting with clear headings.
+
+Each request gives the person's name and numbered search results, one per line, as "[n] title | snippet | site". Base the summary on those results: their current role, company, background, and any notable achievements."""
+
+COMPANY_ANALYST_INSTRUCTIONS = """You are a helpful financial assistant that provides concise and accurate responses about companies.
+
+When answering about companies, include:
+- Overview and business model
+- Key products or services
+- Market position and competitors
+- Top strategic and AI priorities
+- Notable developments or news
+Use markdown headings and bullet points. Don't quote share prices, valuation
+ratios or other market figures; current market data is added after your answer."""
+
+def format_person_sections(person_info: records.PersonProfile):
+    """Markdown sections appended after the AI summary of a person"""
+    sections = ""
+
+    # Add LinkedIn profiles if found
+    if person_info.linkedin_profiles:
+        sections += "## 🔗 LinkedIn Profiles\n"
+        for profile in person_info.linkedin_profiles[:3]:
+            sections += f"- [{profile.title}]({profile.url})\n"
+            if profile.snippet:
+                sections += f"  *{profile.snippet[:200]}...*\n"
+        sections += "\n"
+
+    # Add professional information
+    if person_info.professional_info:
+        sections += "## 💼 Professional Information\n"
+        for info in person_info.professional_info[:3]:
+            sections += f"- [{info.title}]({info.url})\n"
+            if info.snippet:
+                sections += f"  *{info.snippet[:200]}...*\n"
+        sections += "\n"
+
+    return sections
+
+# Marks the structured fallback so it isn't cached in place of a real summary
+PERSON_FALLBACK_NOTE = "_AI summary unavailable right now; showing search results only._"
+
+def format_person_fallback(person_name: str, person_info: records.PersonProfile):
+    """Basic structured summary used when the AI summary is unavailable"""
+    fallback_result = f"# {person_name}\n\n{PERSON_FALLBACK_NOTE}\n\n"
+
+    if person_info.linkedin_profiles:
+        fallback_result += "## LinkedIn Profiles\n"
+        for profile in person_info.linkedin_profiles[:2]:
+            fallback_result += f"- [{profile.title}]({profile.url})\n"
+
+    if person_info.professional_info:
+        fallback_result += "\n## Professional Information\n"
+        for info in person_info.professional_info[:3]:
+            fallback_result += f"- {info.title}\n"
+            if info.snippet:
+                fallback_result += f"  {info.snippet[:150]}...\n"
+
+    return fallback_result
+
+async def stored_summary(kind, read, *args):
+    """Database read-through on a cache miss: a stored summary no older than
+    the cache keeps one fresh, or None. A cache refresh skips it, because
+    the stored row is the summary being replaced. Database errors are a miss."""
+    if cache.refreshing():
+        return None
+    try:
+        return await read(*args, max_age=timedelta(seconds=cache.get_cache().ttls[kind][0]))
+    except Exception as e:
+        logger.error(f"Database read failed: {str(e)}")
+        return None
+
+def cacheable_person_result(result):
+    return bool(result) and not result.startswith("No information found") and PERSON_FALLBACK_NOTE not in result
+
+async def query_person_info(person_name: str, logger):
+    """Query information about a person, served from the result cache"""
+    return await cache.get_cache().get_or_compute(
+        "person_name",
+        person_name,
+        lambda: _query_person_info(person_name, logger),
+        should_cache=cacheable_person_result
+    )
+
+async def _query_person_info(person_name: str, logger):
     """Query information about a person"""
     start_time = datetime.now()
     
     logger.info(f"Querying person information for: {person_name}")
+
+    # Read through to the database before spending Serper/OpenAI quota
+    stored = await stored_summary("person_name", db.get_person_summary, person_name)
+    if stored:
+        logger.info(f"Serving stored summary for person: {person_name}")
+        return stored
     
     # Search for the person using Google Search
-    search_results = search_person_with_google(person_name, logger)
+    search_results = await search_person_with_google(person_name, logger)
     
     if not search_results:
         logger.warning(f"No search results found for person: {person_name}")
@@ -318,152 +286,191 @@ def query_person_info(person_name: str, logger):
     person_info = extract_person_info_from_search(search_results, person_name, logger)
     
     # Use AI agent to create a comprehensive summary
-    query = f"Based on the following search results, provide a comprehensive professional summary for {person_name}. Include their current role, company, background, and any notable achievements. Search results: {search_results[:5]}"
-    
-    agent = Agent(
-        name="PersonAnalyst",
-        instructions="""You are a professional researcher that provides comprehensive and respectful summaries about individuals based on publicly available information.
-
-When summarizing a person's profile, include:
-- Full name and current professional title
-- Current company/organization and role
-- Professional background and experience
-- Education (if available)
-- Notable achievements or recognition
-- Industry expertise
-- Contact information (only if publicly available)
-
-Be respectful, factual, and focus on professional information. Use markdown formatting with clear headings."""
-    )
+    query = prompts.person_prompt(person_name, search_results)
+    agent = Agent(name="PersonAnalyst", instructions=PERSON_ANALYST_INSTRUCTIONS)
 
     try:
-        result = Runner.run_sync(agent, query)
+        result = await singleflight.agent_calls.do(
+            cache.cache_key("person_name", person_name),
+            lambda: Runner.run(agent, query)
+        )
         duration = (datetime.now() - start_time).total_seconds()
         logger.info(f"Person query completed in {duration:.2f} seconds")
         
         # Enhance the AI result with structured data
-        enhanced_result = result.final_output + "\n\n"
-        
-        # Add LinkedIn profiles if found
-        if person_info["linkedin_profiles"]:
-            enhanced_result += "## 🔗 LinkedIn Profiles\n"
-            for profile in person_info["linkedin_profiles"][:3]:
-                enhanced_result += f"- [{profile['title']}]({profile['url']})\n"
-                if profile['snippet']:
-                    enhanced_result += f"  *{profile['snippet'][:200]}...*\n"
-            enhanced_result += "\n"
-        
-        # Add professional information
-        if person_info["professional_info"]:
-            enhanced_result += "## 💼 Professional Information\n"
-            for info in person_info["professional_info"][:3]:
-                enhanced_result += f"- [{info['title']}]({info['url']})\n"
-                if info['snippet']:
-                    enhanced_result += f"  *{info['snippet'][:200]}...*\n"
-            enhanced_result += "\n"
-        
+        enhanced_result = result.final_output + "\n\n" + format_person_sections(person_info)
+        suggest.record_lookup(person_name, "person")
+        db.write_behind(
+            db.upsert_people([{"name": person_name, "profile": person_info, "summary": enhanced_result}]),
+            "Person upsert"
+        )
         return enhanced_result
         
     except Exception as e:
         logger.error(f"Person query failed: {str(e)}")
-        # Fallback to basic structured information
-        fallback_result = f"# {person_name}\n\n"
-        
-        if person_info["linkedin_profiles"]:
-            fallback_result += "## LinkedIn Profiles\n"
-            for profile in person_info["linkedin_profiles"][:2]:
-                fallback_result += f"- [{profile['title']}]({profile['url']})\n"
-        
-        if person_info["professional_info"]:
-            fallback_result += "\n## Professional Information\n"
-            for info in person_info["professional_info"][:3]:
-                fallback_result += f"- {info['title']}\n"
-                if info['snippet']:
-                    fallback_result += f"  {info['snippet'][:150]}...\n"
-        
-        return fallback_result
+        return format_person_fallback(person_name, person_info)
+
+FALLBACK_SUMMARY_PREFIX = "**Company Overview:"
+
+def company_cache_kind(classification):
+    """Companies with a known ticker share one entry however they were typed"""
+    return "stock_ticker" if classification.ticker else "company_name"
+
+def build_company_query(identifier, classification):
+    if classification.ticker and classification.name:
+        return f"Tell me about {classification.name} (stock ticker {classification.ticker})."
+    if classification.ticker:
+        return f"Tell me about the company with stock ticker {classification.ticker}."
+    return f"Tell me about {identifier}."
+
+def company_record(identifier, classification, summary):
+    """Record for db.upsert_companies, keyed on the canonical entity"""
+    return records.CompanyResult(
+        name=classification.name or identifier,
+        query_type=company_cache_kind(classification),
+        summary=summary,
+        ticker=classification.ticker
+    )
 
-def query_company_info(identifier, logger):
+def format_company_fallback(identifier, logger):
+    """Summary from realtime_summary_agent, used when the AI summary is unavailable"""
+    logger.info("Falling back to realtime_summary_agent...")
+    try:
+        company_data = realtime_summary_agent(identifier)
+        summary_parts = [f"{FALLBACK_SUMMARY_PREFIX} {identifier}**"]
+
+        if company_data.get("business_description"):
+            summary_parts.append(f"**Business Description:**\n{company_data['business_description']}")
+        if company_data.get("employee_count"):
+            summary_parts.append(f"**Employee Count:** {company_data['employee_count']:,}")
+        if company_data.get("officers"):
+            summary_parts.append("**Key Officers:**")
+            summary_parts.extend([f"- {officer}" for officer in company_data["officers"]])
+        if company_data.get("latest_news"):
+            summary_parts.append(f"**Latest News:**\n{company_data['latest_news']}")
+
+        summary_parts.append("**AI Adoption Status:** Unknown\n")
+        summary_parts.append("**Strategic Priorities:** Unknown\n")
+
+        return "\n".join(summary_parts)
+
+    except Exception as fallback_error:
+        logger.error(f"Fallback also failed: {str(fallback_error)}")
+        return None
+
+async def company_market_section(classification):
+    """Market data markdown for a listed company, or None"""
+    return await market.market_section(classification.ticker) if classification.ticker else None
+
+def with_market_data(summary, section):
+    """The summary with computed market figures appended (never cached, so they stay current)"""
+    return f"{summary}\n\n{section}" if summary and section else summary
+
+def cacheable_company_result(result):
+    # Don't pin the canned fallback summary in the cache for hours
+    return bool(result) and not result.startswith(FALLBACK_SUMMARY_PREFIX)
+
+async def query_company_info(identifier, logger, classification=None):
+    """Query information about a company, served from the result cache,
+    with current market data appended"""
+    classification = classification or classify(identifier)
+    summary, section = await asyncio.gather(
+        cache.get_cache().get_or_compute(
+            company_cache_kind(classification),
+            classification.canonical,
+            lambda: _query_company_info(identifier, logger, classification),
+            should_cache=cacheable_company_result
+        ),
+        company_market_section(classification)
+    )
+    return with_market_data(summary, section)
+
+async def _query_company_info(identifier, logger, classification):
     start_time = datetime.now()
 
-    if identifier.isupper() and len(identifier) <= 5 and identifier.isalpha():
-        query_type = "stock_ticker"
-        query = f"Tell me about the company with stock ticker {identifier}."
-    else:
-        query_type = "company_name"
-        query = f"Tell me about {identifier}."
+    query_type = company_cache_kind(classification)
+    query = build_company_query(identifier, classification)
 
     logger.info(f"Query Type: {query_type}")
     logger.info(f"Input: {identifier}")
-    logger.info(f"Generated Query: {query}")
 
-    agent = Agent(
-        name="CompanyAnalyst",
-        instructions="""You are a helpful financial assistant that provides concise and accurate responses about companies.
+    # Read through to the database before spending OpenAI quota
+    stored = await stored_summary(query_type, db.get_company_summary, classification.ticker or identifier, query_type)
+    if stored:
+        logger.info(f"Serving stored summary for: {identifier}")
+        return stored
 
-When answering about companies, include:
-- Overview and business model
-- Key products or services
-- Market position and competitors
-- Top strategic and AI priorities
-- Notable developments or news
-- Financial highlights (PE, earnings, revenue, etc.)
-Use markdown headings and bullet points."""
-    )
+    logger.info(f"Generated Query: {query}")
+
+    agent = Agent(name="CompanyAnalyst", instructions=COMPANY_ANALYST_INSTRUCTIONS)
 
     try:
-        result = Runner.run_sync(agent, query)
+        result = await singleflight.agent_calls.do(
+            cache.cache_key(query_type, classification.canonical),
+            lambda: Runner.run(agent, query)
+        )
         duration = (datetime.now() - start_time).total_seconds()
         logger.info(f"Query completed in {duration:.2f} seconds")
-        logger.info("RESPONSE:")
-        logger.info(result.final_output)
+        log_body(logger, "Company analyst response", result.final_output, agent=agent.name, input=identifier)
+        suggest.record_lookup(classification.name or identifier, "company", classification.ticker)
+        db.write_behind(
+            db.upsert_companies([company_record(identifier, classification, result.final_output)]),
+            "Company upsert"
+        )
         return result.final_output
 
     except Exception as e:
         logger.error(f"Agent query failed: {str(e)}")
-        logger.info("Falling back to realtime_summary_agent...")
-        try:
-            company_data = realtime_summary_agent(identifier)
-            summary_parts = [f"**Company Overview: {identifier}**"]
-
-            if company_data.get("business_description"):
-                summary_parts.append(f"**Business Description:**\n{company_data['business_description']}")
-            if company_data.get("employee_count"):
-                summary_parts.append(f"**Employee Count:** {company_data['employee_count']:,}")
-            if company_data.get("officers"):
-                summary_parts.append("**Key Officers:**")
-                summary_parts.extend([f"- {officer}" for officer in company_data["officers"]])
-            if company_data.get("latest_news"):
-                summary_parts.append(f"**Latest News:**\n{company_data['latest_news']}")
-
-            summary_parts.append("**AI Adoption Status:** Unknown\n")
-            summary_parts.append("**Strategic Priorities:** Unknown\n")
-
-            return "\n".join(summary_parts)
-
-        except Exception as fallback_error:
-            logger.error(f"Fallback also failed: {str(fallback_error)}")
-            return None
+        return format_company_fallback(identifier, logger)
 
 # -------------------------------
 # Shared fetch logic
 # -------------------------------
-async def fetch(input_value: str):
+def news_query(input_value: str, classification):
+    """Search NewsAPI for the company's name rather than its ticker"""
+    if classification.name:
+        return re.sub(r"\s+Class [A-Z]$", "", classification.name)
+    return input_value
+
+def store_news(input_value: str, classification, news_items: list):
+    """Persist company news as documents without delaying the response"""
+    if news_items and classification.query_type != "person_name":
+        db.write_behind(
+            db.upsert_news_documents(classification.name or input_value, news_items),
+            "News upsert"
+        )
+
+async def run_lookup(input_value: str, classification):
+    """Summary and news for one classified identifier"""
+    # The summary pipeline (search + LLM for people, LLM for companies)
+    # and the news lookup are independent, so run them concurrently.
+    if classification.query_type == "person_name":
+        summary = query_person_info(input_value, logger)
+    else:
+        summary = query_company_info(input_value, logger, classification)
+    result, news_items = await asyncio.gather(
+        summary, get_recent_news(news_query(input_value, classification), logger)
+    )
+    store_news(input_value, classification, news_items)
+    return result, news_items
+
+def record_popularity(input_value: str, classification):
+    """Count an interactive lookup of the canonical entity toward prefetching"""
+    if classification.query_type == "person_name":
+        key = cache.cache_key("person_name", input_value)
+    else:
+        key = cache.cache_key(company_cache_kind(classification), classification.canonical)
+    prefetch.record(key, input_value)
+
+async def fetch(input_value: str, classification=None):
     try:
         logger.info(f"Processing fetch for: {input_value}")
         
         # Detect query type
-        query_type = detect_query_type(input_value, logger)
-        logger.info(f"Detected query type: {query_type}")
+        classification = classification or classify(input_value)
+        logger.info(f"Detected query type: {classification.query_type}")
         
-        if query_type == "person_name":
-            result = query_person_info(input_value, logger)
-            # For person queries, search for news about the person
-            news_items = get_recent_news(input_value, logger)
-        else:
-            result = query_company_info(input_value, logger)
-            # For company queries, search for company news
-            news_items = get_recent_news(input_value, logger)
+        result, news_items = await run_lookup(input_value, classification)
         
         return result if result else f"No information found for: {input_value}", news_items
         
@@ -471,50 +478,524 @@ async def fetch(input_value: str):
         logger.error(f"Fetch failed: {str(e)}")
         return f"Error: {str(e)}", []
 
+# -------------------------------
+# Streaming fetch logic
+# -------------------------------
+def sse_event(event: str, data):
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {records.dumps_text(data)}\n\n"
+
+async def _stream_agent(agent, query, emit, timings, start):
+    """Forward LLM tokens to the client as they arrive, returning the full text"""
+    chunks = []
+    async for token in Runner.stream(agent, query):
+        if not chunks:
+            timings["llm_first_token"] = round(time.perf_counter() - start, 3)
+        chunks.append(token)
+        await emit("token", {"text": token})
+    timings["llm"] = round(time.perf_counter() - start, 3)
+    return "".join(chunks)
+
+async def _stream_through_cache(kind, identifier, stream_compute, compute, should_cache):
+    """The cache path fetch() takes (read-through, cross-worker lease, result
+    filter), for a streamed summary. Returns the summary and a state dict:
+    ``streamed`` when ``stream_compute`` sent it to the client as it was
+    generated, ``generated`` when it was made for this request rather than
+    found in the cache or database or shared by another request."""
+    state = {"answered": False, "generated": False, "streamed": False}
+
+    async def compute_for_request():
+        if state["answered"]:
+            # Background refresh of a stale entry, after this request was answered
+            return await compute()
+        return await stream_compute(state)
+
+    try:
+        value = await cache.get_cache().get_or_compute(kind, identifier, compute_for_request, should_cache)
+    finally:
+        state["answered"] = True
+    return value, state
+
+async def _stream_person_summary(person_name: str, emit, timings, start):
+    async def stream_compute(state):
+        stored = await stored_summary("person_name", db.get_person_summary, person_name)
+        if stored:
+            logger.info(f"Serving stored summary for person: {person_name}")
+            return stored
+
+        state["generated"] = True
+        search_results = await search_person_with_google(person_name, logger)
+        timings["search"] = round(time.perf_counter() - start, 3)
+        if not search_results:
+            return f"No information found for person: {person_name}"
+
+        person_info = extract_person_info_from_search(search_results, person_name, logger)
+        await emit("person_info", person_info)
+
+        agent = Agent(name="PersonAnalyst", instructions=PERSON_ANALYST_INSTRUCTIONS)
+        try:
+            text = await _stream_agent(agent, prompts.person_prompt(person_name, search_results), emit, timings, start)
+        except Exception as e:
+            logger.error(f"Person stream failed: {str(e)}")
+            return format_person_fallback(person_name, person_info)
+
+        state["streamed"] = True
+        sections = "\n\n" + format_person_sections(person_info)
+        await emit("token", {"text": sections})
+        suggest.record_lookup(person_name, "person")
+        db.write_behind(
+            db.upsert_people([{"name": person_name, "profile": person_info, "summary": text + sections}]),
+            "Person upsert"
+        )
+        return text + sections
+
+    summary, state = await _stream_through_cache(
+        "person_name", person_name, stream_compute,
+        lambda: _query_person_info(person_name, logger), cacheable_person_result
+    )
+    if not state["streamed"]:
+        # Cached, stored or shared, or the fallback sent in place of a failed stream
+        await emit("summary", {"text": summary, "cached": not state["generated"]})
+
+async def _stream_company_summary(identifier: str, classification, emit, timings, start):
+    # Market data loads while the summary streams, and follows it
+    market_data = asyncio.create_task(company_market_section(classification))
+    try:
+        await _stream_company_text(identifier, classification, emit, timings, start, market_data)
+    finally:
+        market_data.cancel()
+
+async def _stream_company_text(identifier: str, classification, emit, timings, start, market_data):
+    query_type = company_cache_kind(classification)
+
+    async def stream_compute(state):
+        stored = await stored_summary(query_type, db.get_company_summary, classification.ticker or identifier, query_type)
+        if stored:
+            logger.info(f"Serving stored summary for: {identifier}")
+            return stored
+
+        state["generated"] = True
+        agent = Agent(name="CompanyAnalyst", instructions=COMPANY_ANALYST_INSTRUCTIONS)
+        try:
+            text = await _stream_agent(agent, build_company_query(identifier, classification), emit, timings, start)
+        except Exception as e:
+            logger.error(f"Company stream failed: {str(e)}")
+            return format_company_fallback(identifier, logger)
+
+        state["streamed"] = True
+        suggest.record_lookup(classification.name or identifier, "company", classification.ticker)
+        db.write_behind(db.upsert_companies([company_record(identifier, classification, text)]), "Company upsert")
+        return text
+
+    summary, state = await _stream_through_cache(
+        query_type, classification.canonical, stream_compute,
+        lambda: _query_company_info(identifier, logger, classification), cacheable_company_result
+    )
+    section = await market_data
+    if section:
+        timings["market"] = round(time.perf_counter() - start, 3)
+    if state["streamed"]:
+        if section:
+            await emit("token", {"text": "\n\n" + section})
+    else:
+        summary = with_market_data(summary, section) or f"No information found for: {identifier}"
+        await emit("summary", {"text": summary, "cached": not state["generated"]})
+
+async def fetch_stream(input_value: str):
+    """Same pipeline as fetch(), yielding SSE frames as each stage finishes"""
+    deadlines.start()
+    start = time.perf_counter()
+    timings = {}
+    classification = classify(input_value)
+    record_popularity(input_value, classification)
+    yield sse_event("meta", {
+        "input": input_value,
+        "query_type": classification.query_type,
+        "ticker": classification.ticker,
+        "name": classification.name
+    })
+
+    events = asyncio.Queue()
+
+    async def emit(event, data):
+        await events.put((event, data))
+
+    async def news_stage():
+        news_items = await get_recent_news(news_query(input_value, classification), logger)
+        timings["news"] = round(time.perf_counter() - start, 3)
+        store_news(input_value, classification, news_items)
+        await emit("news", news_items)
+
+    if classification.query_type == "person_name":
+        summary_stage = _stream_person_summary(input_value, emit, timings, start)
+    else:
+        summary_stage = _stream_company_summary(input_value, classification, emit, timings, start)
+
+    async def run_stages():
+        results = await asyncio.gather(summary_stage, news_stage(), return_exceptions=True)
+        for error in results:
+            if isinstance(error, Exception):
+                logger.error(f"Stream stage failed: {str(error)}")
+                await emit("error", {"message": f"Error: {str(error)}"})
+        await events.put(None)
+
+    stages = asyncio.create_task(run_stages())
+    try:
+        while (item := await events.get()) is not None:
+            yield sse_event(*item)
+    finally:
+        # Client went away: stop the upstream work for this request
+        if not stages.done():
+            stages.cancel()
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    yield sse_event("done", {"timings": timings})
+
+# -------------------------------
+# Batch lookup logic
+# -------------------------------
+async def lookup_for_batch(identifier: str):
+    """One batch item: classify, then run the summary and news pipelines"""
+    # Each item gets a full budget; time queued behind interactive traffic counts against it
+    deadlines.start()
+    classification = classify(identifier)
+    result, news_items = await run_lookup(identifier, classification)
+    if not result:
+        raise Exception(f"No information found for: {identifier}")
+    return {
+        "query_type": classification.query_type,
+        "ticker": classification.ticker,
+        "result": result,
+        "news": news_items
+    }
+
+# -------------------------------
+# Prefetch
+# -------------------------------
+async def lookup_for_prefetch(identifier: str):
+    """Warm one popular entity's summary and news (see prefetch.prefetch_loop)"""
+    await run_lookup(identifier, classify(identifier))
+
+# -------------------------------
+# Responses
+# -------------------------------
+# Bodies at least this large (summaries, the index page) are gzipped for
+# clients that accept it; the /batch and SSE streams are left alone
+GZIP_MINIMUM_BYTES = int(os.getenv("GZIP_MINIMUM_BYTES", 1024))
+GZIP_LEVEL = 6
+STREAMED_MEDIA_TYPES = {b"application/x-ndjson", b"text/event-stream"}
+# Starlette's gzip passes on any response that already has an encoding
+_PASS_THROUGH = (b"content-encoding", b"identity")
+
+class StreamingGZipMiddleware:
+    """GZipMiddleware, except for streamed responses (STREAMED_MEDIA_TYPES).
+    Starlette's gzip holds small chunks back in the compressor, so /batch
+    lines would arrive in bursts or all at the end. Streams are marked on
+    the way into it so it passes them on as they are, and the mark is taken
+    off again before they go out."""
+
+    def __init__(self, app, **options):
+        self.app = app
+        self.gzip = GZipMiddleware(self.mark_streams, **options)
+
+    async def mark_streams(self, scope, receive, send):
+        async def send_marked(message):
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if headers.get(b"content-type", b"").partition(b";")[0].strip().lower() in STREAMED_MEDIA_TYPES:
+                    message["headers"] = list(message.get("headers", [])) + [_PASS_THROUGH]
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_unmarked(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [h for h in message.get("headers", []) if tuple(h) != _PASS_THROUGH]
+            await send(message)
+
+        await self.gzip(scope, receive, send_unmarked)
+
+class FastJSONResponse(JSONResponse):
+    """JSON from records.dumps: orjson when installed, records encoded as they are"""
+    def render(self, content):
+        return records.dumps(content)
+
 # -------------------------------
 # Routes
 # -------------------------------
-@app.get("/", response_class=HTMLResponse)
+router = APIRouter()
+
+@router.get("/", response_class=HTMLResponse)
 async def read_form(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return request.app.state.templates.TemplateResponse(request, "index.html")
 
-@app.get("/health")
-async def health_check():
+@router.get("/health")
+async def health_check(request: Request):
     return {
         "status": "healthy",
-        "alpha_vantage_configured": bool(ALPHA_VANTAGE_API_KEY),
-        "newsapi_configured": bool(NEWSAPI_ORG_API_KEY),
-        "openai_configured": bool(OPENAI_API_KEY),
-        "serper_configured": bool(SERPER_API_KEY),
-        "clearbit_configured": bool(CLEARBIT_API_KEY)
+        **{f"{provider}_configured": has_key for provider, has_key in configured(get_settings()).items()},
+        "circuits": deadlines.circuit_states(),
+        "startup_ms": request.app.state.startup
+    }
+
+@router.get("/stats")
+async def stats():
+    """Cache, coalescing, LLM hedging, news, prefetch and market data counters for the worker that answered"""
+    return {
+        "worker": os.getpid(),
+        "cache": cache.get_cache().stats,
+        "coalescing": singleflight.stats(),
+        "llm": llm.stats(),
+        "news": news.get_store().stats,
+        "prefetch": prefetch.get_popularity().stats,
+        "market": market.stats()
     }
 
-@app.post("/submit")
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of latency, cache, token and error metrics"""
+    # Merging the other workers' snapshot files is blocking file I/O
+    body = await asyncio.to_thread(metrics.render, metrics.snapshot())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/suggest")
+async def suggest_inputs(q: str = "", limit: int = suggest.DEFAULT_LIMIT):
+    """Typeahead: companies, tickers and people matching a partial input"""
+    return {"query": q, "suggestions": suggest.get_index().search(q, max(1, min(limit, 50)))}
+
+@router.post("/submit")
 async def submit_form(input_value: str = Form(...)):
+    # Turn new work away fast (503) while upstream queues are full
+    scheduler.admit(scheduler.INTERACTIVE)
     try:
         input_cleaned = input_value.strip()
         if not input_cleaned:
             return {"status": "error", "message": "Input cannot be empty"}
 
-        result, news_items = await fetch(input_cleaned)
+        # Every upstream call below gets a slice of what's left of this
+        deadlines.start()
 
-        return {
+        # Classify once; fetch and the response share the result
+        classification = classify(input_cleaned)
+        record_popularity(input_cleaned, classification)
+        result, news_items = await fetch(input_cleaned, classification)
+
+        # Returned as a response so FastAPI doesn't convert the records first
+        return FastJSONResponse({
             "status": "success",
             "input": input_cleaned,
             "result": result,
             "news": news_items,
-            "query_type": detect_query_type(input_cleaned, logger)
-        }
+            "query_type": classification.query_type,
+            "ticker": classification.ticker
+        })
 
     except Exception as e:
         logger.error(f"Submit failed: {str(e)}")
         return {"status": "error", "message": f"Error: {str(e)}"}
 
+@router.post("/submit/stream")
+async def submit_stream(input_value: str = Form(...)):
+    """Server-Sent Events version of /submit: meta, person_info, news, token,
+    summary and error events as each stage finishes, then a done event with timings"""
+    input_cleaned = input_value.strip()
+    if not input_cleaned:
+        return {"status": "error", "message": "Input cannot be empty"}
+    scheduler.admit(scheduler.INTERACTIVE)
+
+    return StreamingResponse(
+        fetch_stream(input_cleaned),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch")
+async def submit_batch(request: Request):
+    """Look up a JSON array (or uploaded file) of identifiers, streaming one
+    NDJSON line per result as it completes and a summary line at the end.
+    Per-provider concurrency can be set with ?openai=&serper=&newsapi=&yahoo="""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            return JSONResponse({"status": "error", "message": "Missing 'file' upload"}, status_code=400)
+        identifiers = batch.parse_identifiers((await upload.read()).decode("utf-8-sig"))
+    else:
+        try:
+            identifiers = await request.json()
+        except ValueError:
+            return JSONResponse({"status": "error", "message": "Body must be a JSON array"}, status_code=400)
+        if not isinstance(identifiers, list):
+            return JSONResponse({"status": "error", "message": "Body must be a JSON array"}, status_code=400)
+        identifiers = [str(item).strip() for item in identifiers if str(item).strip()]
+
+    if not identifiers:
+        return JSONResponse({"status": "error", "message": "No identifiers provided"}, status_code=400)
+    if len(identifiers) > batch.MAX_BATCH_SIZE:
+        return JSONResponse(
+            {"status": "error", "message": f"Batch is limited to {batch.MAX_BATCH_SIZE} identifiers"},
+            status_code=413
+        )
+
+    try:
+        concurrency = {p: int(request.query_params[p]) for p in PROVIDERS if p in request.query_params}
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "Concurrency limits must be integers"}, status_code=400)
+
+    scheduler.admit(scheduler.BATCH)
+    logger.info(f"Starting batch of {len(identifiers)} identifiers")
+    # Fetch every listed company's market data in a few large downloads up front
+    market.warm_in_background({c.ticker for c in map(classify, identifiers) if c.ticker})
+    return StreamingResponse(
+        batch.run_batch(identifiers, lookup_for_batch, concurrency),
+        media_type="application/x-ndjson"
+    )
+
+# -------------------------------
+# App factory
+# -------------------------------
+# Module import time, measured once; counts toward the startup budget
+IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
+async def start_services():
+    """Pooled upstream clients, symbol and suggestion indexes, result cache,
+    database engine and news store (the app's lifespan and the enrich CLI)"""
+    await clients.startup()
+    symbols.load_index()
+    cache.get_cache()
+    await db.init_db()
+    await suggest.build_index(symbols.get_index())
+    news.get_store()
+
+async def stop_services():
+    """Drain pending writes and close everything start_services opened"""
+    await db.close_db()
+    await cache.shutdown()
+    news.shutdown()
+    prefetch.shutdown()
+    market.shutdown()
+    await clients.shutdown()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up before the first request
+    warmup_started = time.perf_counter()
+    await start_services()
+    snapshots = asyncio.create_task(metrics.snapshot_loop())
+    news_poller = asyncio.create_task(news.poll_loop())
+    prefetcher = asyncio.create_task(prefetch.prefetch_loop(lookup_for_prefetch))
+
+    startup = app.state.startup
+    startup["warmup"] = round((time.perf_counter() - warmup_started) * 1000, 1)
+    startup["total"] = round(startup["import"] + startup["create"] + startup["warmup"], 1)
+    budget = get_settings().startup_budget_ms
+    if startup["total"] > budget:
+        logger.warning(f"Startup took {startup['total']} ms, over the {budget} ms budget: {startup}")
+    else:
+        logger.info(f"Startup took {startup['total']} ms (budget {budget} ms): {startup}")
+    try:
+        yield
+    finally:
+        snapshots.cancel()
+        news_poller.cancel()
+        prefetcher.cancel()
+        await asyncio.gather(snapshots, news_poller, prefetcher, return_exceptions=True)
+        await stop_services()
+        stop_logging()
+
+async def overloaded_response(request: Request, exc: scheduler.Overloaded):
+    return JSONResponse(
+        {"status": "error", "message": "Server is busy, please retry shortly", "retry_after": exc.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+def create_app(settings=None):
+    """Build the FastAPI app. Nothing is configured, loaded or connected at
+    import time; settings and logging are set up here and the rest in the lifespan."""
+    created = time.perf_counter()
+    settings = settings or get_settings()
+    setup_logging(settings)
+    log_system_info(settings, logger)
+    if settings.quota_workers > 1:
+        # Every worker calls out with the same API keys
+        scheduler.share_quotas(1 / settings.quota_workers)
+        logger.info(f"Using 1/{settings.quota_workers} of each provider rate limit: {scheduler.DEFAULT_RATES}")
+
+    app = FastAPI(
+        title="Lookup Tool",
+        description="Customer/Stock/Person Lookup API",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse
+    )
+    app.include_router(router)
+    app.add_exception_handler(scheduler.Overloaded, overloaded_response)
+    app.add_middleware(StreamingGZipMiddleware, minimum_size=GZIP_MINIMUM_BYTES, compresslevel=GZIP_LEVEL)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(RequestIdMiddleware)
+
+    from fastapi.templating import Jinja2Templates
+    app.state.templates = Jinja2Templates(directory=PACKAGE_DIR / "templates")
+    logger.info(f"Using Templates Directory: {PACKAGE_DIR / 'templates'}")
+
+    app.state.startup = {"import": IMPORT_MS, "create": round((time.perf_counter() - created) * 1000, 1)}
+    return app
+
+def __getattr__(name):
+    # `lookup_tool.main:app` keeps working for uvicorn and scripts; the app
+    # is only built when something asks for it
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # -------------------------------
 # Entry point
 # -------------------------------
 def main():
-    uvicorn.run("src.lookup_tool.main:app", host="0.0.0.0", port=8000, reload=True)
+    """Serve the app: N worker processes by default, or one reloading process with --reload"""
+    import argparse
+    import uvicorn
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Lookup Tool server")
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.workers,
+                        help="worker processes (default: WEB_CONCURRENCY or the CPU count)")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.graceful_timeout,
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--reload", action="store_true", help="development mode: one process, reload on changes")
+    args = parser.parse_args()
+
+    if args.workers > 1 and not args.reload:
+        # Workers inherit these: one rotating log file each, an equal share
+        # of every provider rate limit, and metric snapshots in a shared
+        # directory so /metrics covers every worker
+        os.environ["LOG_PER_PROCESS"] = "1"
+        os.environ["UPSTREAM_QUOTA_WORKERS"] = str(args.workers)
+        metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join("data", "metrics"))
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+    # Every worker builds its own app (and warms its own pools and indexes)
+    # through the factory; they share the SQLite result cache and database.
+    uvicorn.run(
+        "lookup_tool.main:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else max(1, args.workers),
+        reload=args.reload,
+        timeout_graceful_shutdown=args.graceful_timeout
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
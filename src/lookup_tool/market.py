@@ -0,0 +1,592 @@
+"""Market data from Yahoo Finance, stored as columns and summarized with NumPy.
+
+Daily bars are stored per ticker under MARKET_DATA_DIR, one flat binary
+file per column: ``day`` is int32 days since the epoch, and ``close`` and
+``volume`` are float64. Files are only appended to and are read back as
+memory maps, so loading a ticker's history costs an mmap, not a parse.
+
+A refresh downloads only the days after the newest stored bar, plus that
+bar itself. If Yahoo's adjusted close for the overlapping day has moved,
+a split or dividend has re-adjusted the history, and the ticker is
+rewritten from a full download.
+
+Lookups of tickers that are due a refresh are collected for
+MARKET_BATCH_WINDOW_SECONDS and fetched together in one multi-ticker
+``yf.download``. Fundamentals (EPS, revenue, book value, shares,
+dividend) come from ``Ticker.info``, one call per ticker, and are kept
+for a day.
+
+``indicators`` aligns any number of tickers on a shared calendar and
+computes returns, volatility, moving averages, the 52-week range and
+valuation ratios for all of them with array operations. ``market_section``
+renders one ticker's figures as the markdown appended to a company
+summary, so those numbers come from data rather than from the LLM.
+"""
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import math
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from . import deadlines, scheduler
+from .limits import call_upstream
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; appends are then only serialized per process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("MARKET_DATA_ENABLED", "1").lower() in ("1", "true", "yes")
+DEFAULT_MARKET_DIR = os.path.join("data", "market")
+# Calendar days of history downloaded for a ticker seen for the first time
+HISTORY_DAYS = int(os.getenv("MARKET_HISTORY_DAYS", 400))
+REFRESH_SECONDS = float(os.getenv("MARKET_REFRESH_SECONDS", 3600))
+FUNDAMENTALS_SECONDS = float(os.getenv("MARKET_FUNDAMENTALS_SECONDS", 24 * 3600))
+BATCH_WINDOW = float(os.getenv("MARKET_BATCH_WINDOW_SECONDS", 0.05))
+MAX_BATCH = 100
+INFO_CONCURRENCY = 4
+# Relative change in a stored close that means history was re-adjusted
+READJUST_TOLERANCE = 0.005
+
+TRADING_DAYS = 252
+RETURN_PERIODS = {"1d": 1, "1m": 21, "3m": 63, "1y": TRADING_DAYS}
+VOLATILITY_DAYS = 63
+MOVING_AVERAGES = (50, 200)
+
+COLUMNS = {"day": np.int32, "close": np.float64, "volume": np.float64}
+FUNDAMENTALS = {
+    "eps": "trailingEps",
+    "revenue": "totalRevenue",
+    "book_value": "bookValue",
+    "shares": "sharesOutstanding",
+    "dividend": "dividendRate",
+}
+
+
+def yahoo_symbol(ticker):
+    """Yahoo writes share classes with a dash (BRK-B), the symbol index with a dot"""
+    return ticker.replace(".", "-")
+
+
+def _today():
+    return datetime.date.today().toordinal() - datetime.date(1970, 1, 1).toordinal()
+
+
+def _iso(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+# -------------------------------
+# Vectorized indicators
+# -------------------------------
+def align(histories, days=TRADING_DAYS + 1):
+    """Closes of several tickers on their shared calendar of the last ``days``
+    trading days, as a (tickers, days) array with NaN where a ticker has no bar"""
+    recent = [h["day"][-days:] for h in histories]
+    calendar = np.unique(np.concatenate(recent))[-days:] if recent else np.empty(0, np.int32)
+    closes = np.full((len(histories), len(calendar)), np.nan)
+    for row, (day, history) in enumerate(zip(recent, histories)):
+        inside = day >= calendar[0] if len(calendar) else day < 0
+        closes[row, np.searchsorted(calendar, day[inside])] = history["close"][-days:][inside]
+    return calendar, closes
+
+
+def forward_fill(values):
+    """Carry each row's last known value over NaN gaps (leading NaNs stay)"""
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def moving_average(values, window):
+    """Trailing ``window``-bar mean of every row; column i ends at bar i + window - 1"""
+    sums = np.cumsum(values, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    return sums[:, window - 1:] / window
+
+
+def trailing_returns(closes, periods=RETURN_PERIODS):
+    """Return over each period, per row, from the last column"""
+    last = closes[:, -1]
+    width = closes.shape[1]
+    return {
+        name: last / closes[:, -1 - bars] - 1 if bars < width else np.full(len(closes), np.nan)
+        for name, bars in periods.items()
+    }
+
+
+def volatility(closes, days=VOLATILITY_DAYS):
+    """Annualized standard deviation of daily log returns over the last ``days``"""
+    log_returns = np.diff(np.log(closes), axis=1)[:, -days:]
+    return np.nanstd(log_returns, axis=1, ddof=1) * math.sqrt(TRADING_DAYS)
+
+
+def valuation(price, fundamentals):
+    """Market cap and P/E, P/S, P/B and dividend yield from per-row arrays"""
+    eps, revenue, book = fundamentals["eps"], fundamentals["revenue"], fundamentals["book_value"]
+    market_cap = price * fundamentals["shares"]
+    return {
+        "market_cap": market_cap,
+        "pe": np.where(eps > 0, price / eps, np.nan),
+        "ps": np.where(revenue > 0, market_cap / revenue, np.nan),
+        "pb": np.where(book > 0, price / book, np.nan),
+        "dividend_yield": fundamentals["dividend"] / price,
+    }
+
+
+def compute(histories, fundamentals):
+    """Every indicator for every ticker at once; one array per indicator"""
+    calendar, closes = align(histories)
+    closes = forward_fill(closes)
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        # All-NaN rows (tickers with too little history) are expected
+        warnings.simplefilter("ignore", RuntimeWarning)
+        price = closes[:, -1]
+        year = closes[:, -TRADING_DAYS:]
+        columns = {
+            "price": price,
+            **{f"return_{name}": values for name, values in trailing_returns(closes).items()},
+            "volatility": volatility(closes),
+            **{
+                f"sma_{window}": moving_average(closes, window)[:, -1] if closes.shape[1] >= window
+                else np.full(len(closes), np.nan)
+                for window in MOVING_AVERAGES
+            },
+            "high_52w": np.nanmax(year, axis=1),
+            "low_52w": np.nanmin(year, axis=1),
+            **valuation(price, fundamentals),
+        }
+    as_of = np.array([h["day"][-1] if len(h["day"]) else -1 for h in histories])
+    return as_of, columns
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, 4)
+
+
+# -------------------------------
+# Columnar store
+# -------------------------------
+class MarketStore:
+    """Append-only column files per ticker, memory-mapped for reading"""
+
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        # yfinance keeps per-download state in module globals, so downloads
+        # can't overlap; batching keeps that from costing anything
+        self._download_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # ticker -> (rows mapped, {column: memmap})
+        self._maps = {}
+        self.stats = {
+            "downloads": 0, "tickers_downloaded": 0, "bars_appended": 0, "rewrites": 0,
+            "fundamentals_fetches": 0, "refresh_failures": 0,
+        }
+
+    def _path(self, ticker, name):
+        return os.path.join(self.root, ticker, name)
+
+    @contextlib.contextmanager
+    def _locked(self, ticker):
+        """Serialize writers to ``ticker`` across threads and worker processes"""
+        os.makedirs(os.path.join(self.root, ticker), exist_ok=True)
+        with self._lock, open(self._path(ticker, ".lock"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _rows(self, ticker):
+        """Complete rows on disk: a write torn by a crash leaves one column longer"""
+        rows = []
+        for column, dtype in COLUMNS.items():
+            path = self._path(ticker, column)
+            rows.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+        return min(rows)
+
+    def history(self, ticker):
+        """{column: array} of the stored bars, oldest first"""
+        rows = self._rows(ticker)
+        if rows == 0:
+            return {column: np.empty(0, dtype) for column, dtype in COLUMNS.items()}
+        mapped = self._maps.get(ticker)
+        if mapped is None or mapped[0] != rows:
+            mapped = self._maps[ticker] = (rows, {
+                column: np.memmap(self._path(ticker, column), dtype=dtype, mode="r", shape=(rows,))
+                for column, dtype in COLUMNS.items()
+            })
+        return mapped[1]
+
+    def last_day(self, ticker):
+        day = self.history(ticker)["day"]
+        return int(day[-1]) if len(day) else None
+
+    def _write(self, ticker, bars, replace=False):
+        """Append bars newer than the stored ones, or replace the whole history.
+        Returns how many bars were written."""
+        with self._locked(ticker):
+            if replace:
+                # Write aside and rename, so readers' maps keep the old file
+                for column, dtype in COLUMNS.items():
+                    path = self._path(ticker, column)
+                    np.asarray(bars[column], dtype).tofile(path + ".new")
+                    os.replace(path + ".new", path)
+                self._maps.pop(ticker, None)
+                return len(bars["day"])
+
+            rows = self._rows(ticker)
+            last = self.last_day(ticker)
+            newer = bars["day"] > last if last is not None else slice(None)
+            for column, dtype in COLUMNS.items():
+                path = self._path(ticker, column)
+                with open(path, "ab") as handle:
+                    handle.truncate(rows * np.dtype(dtype).itemsize)
+                    handle.write(np.asarray(bars[column][newer], dtype).tobytes())
+            return int(np.count_nonzero(newer)) if last is not None else len(bars["day"])
+
+    def _readjusted(self, ticker, bars):
+        """Whether the downloaded close for the newest stored day disagrees with ours"""
+        history = self.history(ticker)
+        overlap = np.flatnonzero(bars["day"] == history["day"][-1])
+        if not len(overlap):
+            return False
+        stored = float(history["close"][-1])
+        return abs(float(bars["close"][overlap[0]]) / stored - 1) > READJUST_TOLERANCE
+
+    def due(self, ticker):
+        """Whether ``ticker`` hasn't been refreshed within REFRESH_SECONDS"""
+        try:
+            return time.time() - os.path.getmtime(self._path(ticker, "checked")) > REFRESH_SECONDS
+        except OSError:
+            return True
+
+    def _checked(self, ticker):
+        os.makedirs(os.path.join(self.root, ticker), exist_ok=True)
+        with open(self._path(ticker, "checked"), "a"):
+            pass
+        os.utime(self._path(ticker, "checked"))
+
+    def fundamentals(self, ticker):
+        try:
+            with open(self._path(ticker, "fundamentals.json")) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def _save_fundamentals(self, ticker, values):
+        path = self._path(ticker, "fundamentals.json")
+        with self._locked(ticker):
+            with open(path + ".new", "w") as handle:
+                json.dump({**values, "fetched_at": time.time()}, handle)
+            os.replace(path + ".new", path)
+
+    # -- Yahoo Finance (blocking; run in worker threads) --
+    def _download(self, tickers, start_day):
+        """{ticker: bars} for ``tickers`` from ``start_day`` on, in one request"""
+        # Imported on first use: it pulls in pandas, which the rest of the app doesn't need
+        import yfinance as yf
+
+        symbols = {yahoo_symbol(ticker): ticker for ticker in tickers}
+        with self._download_lock:
+            frame = yf.download(
+                list(symbols), start=_iso(start_day), interval="1d", group_by="column",
+                auto_adjust=True, progress=False, threads=True, multi_level_index=True,
+            )
+        self.stats["downloads"] += 1
+        self.stats["tickers_downloaded"] += len(symbols)
+        if frame is None or frame.empty:
+            return {}
+        days = np.asarray(frame.index.date, dtype="datetime64[D]").astype(np.int32)
+        bars = {}
+        for symbol, ticker in symbols.items():
+            try:
+                close = frame["Close"][symbol].to_numpy(dtype=np.float64)
+                volume = frame["Volume"][symbol].to_numpy(dtype=np.float64)
+            except KeyError:
+                continue
+            keep = ~np.isnan(close)
+            if keep.any():
+                bars[ticker] = {"day": days[keep], "close": close[keep], "volume": np.nan_to_num(volume[keep])}
+        return bars
+
+    @staticmethod
+    def _info(ticker):
+        import yfinance as yf
+
+        info = yf.Ticker(yahoo_symbol(ticker)).info or {}
+        values = {name: info.get(field) for name, field in FUNDAMENTALS.items()}
+        values["currency"] = info.get("currency")
+        return values
+
+    # -- async API --
+    async def _fetch(self, tickers, start_day):
+        return await call_upstream("yahoo", lambda: asyncio.to_thread(self._download, tickers, start_day))
+
+    async def refresh(self, tickers):
+        """Bring stale tickers' bars and fundamentals up to date: one download
+        for new tickers, one for the rest starting at the oldest newest bar"""
+        tickers = [ticker for ticker in dict.fromkeys(tickers) if self.due(ticker)]
+        if not tickers:
+            return
+        last = {ticker: self.last_day(ticker) for ticker in tickers}
+        new = [ticker for ticker in tickers if last[ticker] is None]
+        known = [ticker for ticker in tickers if last[ticker] is not None]
+        full_start = _today() - HISTORY_DAYS
+
+        rewrite = list(new)
+        if known:
+            bars = await self._fetch(known, min(last[ticker] for ticker in known))
+            for ticker, ticker_bars in bars.items():
+                if await asyncio.to_thread(self._readjusted, ticker, ticker_bars):
+                    logger.info(f"{ticker} history was re-adjusted, downloading it again")
+                    rewrite.append(ticker)
+                else:
+                    self.stats["bars_appended"] += await asyncio.to_thread(self._write, ticker, ticker_bars)
+        if rewrite:
+            bars = await self._fetch(rewrite, full_start)
+            for ticker, ticker_bars in bars.items():
+                if last[ticker] is not None:
+                    self.stats["rewrites"] += 1
+                self.stats["bars_appended"] += await asyncio.to_thread(self._write, ticker, ticker_bars, True)
+
+        await self._refresh_fundamentals(tickers)
+        for ticker in tickers:
+            await asyncio.to_thread(self._checked, ticker)
+
+    async def _refresh_fundamentals(self, tickers):
+        semaphore = asyncio.Semaphore(INFO_CONCURRENCY)
+
+        async def refresh_one(ticker):
+            stored = self.fundamentals(ticker)
+            if stored and time.time() - stored.get("fetched_at", 0) < FUNDAMENTALS_SECONDS:
+                return
+            async with semaphore:
+                try:
+                    values = await call_upstream("yahoo", lambda: asyncio.to_thread(self._info, ticker))
+                except Exception as e:
+                    logger.warning(f"Fundamentals for {ticker} unavailable: {e}")
+                    return
+            self.stats["fundamentals_fetches"] += 1
+            await asyncio.to_thread(self._save_fundamentals, ticker, values)
+
+        await asyncio.gather(*(refresh_one(ticker) for ticker in tickers))
+
+    def indicators(self, tickers):
+        """{ticker: figures} for every stored ticker, computed together"""
+        tickers = [ticker for ticker in tickers if self._rows(ticker)]
+        if not tickers:
+            return {}
+        stored = [self.fundamentals(ticker) or {} for ticker in tickers]
+        fundamentals = {
+            name: np.array([s.get(name) if s.get(name) is not None else np.nan for s in stored], dtype=np.float64)
+            for name in FUNDAMENTALS
+        }
+        as_of, columns = compute([self.history(ticker) for ticker in tickers], fundamentals)
+        return {
+            ticker: {
+                "as_of": _iso(as_of[row]),
+                "currency": stored[row].get("currency"),
+                **{name: _number(values[row]) for name, values in columns.items()},
+            }
+            for row, ticker in enumerate(tickers)
+        }
+
+
+# -------------------------------
+# Request batching
+# -------------------------------
+class RefreshBatcher:
+    """Collect tickers that need a refresh for a short window, then refresh
+    them together; callers asking for a ticker already on its way wait for it"""
+
+    def __init__(self, refresh, window=BATCH_WINDOW, max_size=MAX_BATCH):
+        self.refresh = refresh
+        self.window = window
+        self.max_size = max_size
+        self._waiting = {}
+        self._pending = []
+        self._timer = None
+        self._running = set()
+        self.requests = 0
+        self.batches = 0
+
+    async def get(self, ticker):
+        self.requests += 1
+        future = self._waiting.get(ticker)
+        if future is None:
+            future = self._waiting[ticker] = asyncio.get_running_loop().create_future()
+            self._pending.append(ticker)
+            if len(self._pending) >= self.max_size:
+                self._flush()
+            elif self._timer is None:
+                # The batch runs in the context of the caller that opened it
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        tickers, self._pending = self._pending, []
+        if tickers:
+            self.batches += 1
+            task = asyncio.ensure_future(self._run(tickers))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, tickers):
+        error = None
+        try:
+            await self.refresh(tickers)
+        except BaseException as e:
+            error = e
+        for ticker in tickers:
+            future = self._waiting.pop(ticker)
+            if error is None:
+                future.set_result(None)
+            elif isinstance(error, Exception):
+                future.set_exception(error)
+                # Mark it retrieved even if every waiter went away
+                future.exception()
+            else:
+                future.cancel()
+        if error is not None and not isinstance(error, Exception):
+            raise error
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._running:
+            task.cancel()
+
+    def stats(self):
+        return {"requests": self.requests, "batches": self.batches, "waiting": len(self._waiting)}
+
+
+_store = None
+_batcher = None
+_background = set()
+
+
+def get_store():
+    """Return the process-wide market store, creating it on first use"""
+    global _store
+    if _store is None:
+        _store = MarketStore(os.getenv("MARKET_DATA_DIR", DEFAULT_MARKET_DIR))
+    return _store
+
+
+def _get_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = RefreshBatcher(get_store().refresh)
+    return _batcher
+
+
+async def snapshots(tickers):
+    """Figures for each ticker, refreshing stale ones first in shared downloads"""
+    store = get_store()
+    stale = [ticker for ticker in tickers if store.due(ticker)]
+    if stale:
+        results = await asyncio.gather(*(_get_batcher().get(ticker) for ticker in stale), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            store.stats["refresh_failures"] += 1
+            # Serve whatever history is already stored
+            logger.warning(f"Market data refresh failed: {failed[0]}")
+    return await asyncio.to_thread(store.indicators, tickers)
+
+
+async def snapshot(ticker):
+    return (await snapshots([ticker])).get(ticker)
+
+
+async def _warm(tickers, priority):
+    scheduler.use_priority(priority)
+    deadlines.start(None)
+    await snapshots(tickers)
+
+
+def warm_in_background(tickers, priority=scheduler.BATCH):
+    """Start refreshing many tickers (e.g. a batch's companies) in a few
+    large downloads, rather than one small one per item as it comes up"""
+    if not ENABLED or not tickers:
+        return
+    task = asyncio.create_task(_warm(list(tickers), priority))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _money(value, currency):
+    if value is None:
+        return "n/a"
+    for size, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= size:
+            return f"{value / size:,.2f}{suffix} {currency}"
+    return f"{value:,.2f} {currency}"
+
+
+def _percent(value):
+    return "n/a" if value is None else f"{value * 100:+.1f}%"
+
+
+def _ratio(value):
+    return "n/a" if value is None else f"{value:.1f}"
+
+
+def format_section(ticker, figures):
+    """Markdown for a company summary: price, returns, trend and valuation"""
+    currency = figures.get("currency") or "USD"
+    returns = ", ".join(f"{name} {_percent(figures[f'return_{name}'])}" for name in RETURN_PERIODS)
+    trend = ", ".join(f"{window}-day {_money(figures[f'sma_{window}'], currency)}" for window in MOVING_AVERAGES)
+    dividend_yield = figures["dividend_yield"]
+    lines = [
+        f"## 📈 Market Data ({ticker}, close of {figures['as_of']})",
+        f"- **Price:** {_money(figures['price'], currency)}",
+        f"- **Returns:** {returns}",
+        f"- **Volatility (3m, annualized):** {_percent(figures['volatility']).lstrip('+')}",
+        f"- **Moving averages:** {trend}",
+        f"- **52-week range:** {_money(figures['low_52w'], currency)} – {_money(figures['high_52w'], currency)}",
+        f"- **Market cap:** {_money(figures['market_cap'], currency)}",
+        f"- **P/E:** {_ratio(figures['pe'])} · **P/S:** {_ratio(figures['ps'])} · **P/B:** {_ratio(figures['pb'])}"
+        f" · **Dividend yield:** {'n/a' if dividend_yield is None else f'{dividend_yield * 100:.2f}%'}",
+    ]
+    return "\n".join(lines)
+
+
+async def market_section(ticker):
+    """Markdown market data for ``ticker``, or None when it's unavailable"""
+    if not ENABLED or not ticker:
+        return None
+    try:
+        figures = await snapshot(ticker)
+    except Exception as e:
+        logger.error(f"Market data for {ticker} failed: {e}")
+        return None
+    return format_section(ticker, figures) if figures else None
+
+
+def stats():
+    """Store and batching counters for /stats"""
+    return {**get_store().stats, "batching": _get_batcher().stats()} if ENABLED else {"enabled": False}
+
+
+def shutdown():
+    global _store, _batcher
+    for task in _background:
+        task.cancel()
+    if _batcher is not None:
+        _batcher.cancel()
+    _store = None
+    _batcher = None
@@ -0,0 +1,256 @@
+"""Counters and histograms exposed in the Prometheus text format on /metrics.
+
+Deliberately small: the app needs a handful of labelled counters and
+histograms and nothing else. With several worker processes (METRICS_DIR
+set), each worker periodically writes a snapshot to the directory and
+/metrics serves the sum of all of them, so a scrape that lands on any
+worker sees the whole server.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; upstream LLM calls run into the tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SNAPSHOT_INTERVAL = 5.0
+
+
+def _label_text(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (non-cumulative), then sum, then count
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        entry[-2] += value
+        entry[-1] += 1
+
+    def merge(self, values):
+        for key, entry in values.items():
+            mine = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, value in enumerate(entry):
+                mine[i] += value
+
+    def render(self, values):
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', '+Inf')])} {entry[-1]}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {round(entry[-2], 6)}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {entry[-1]}"
+
+
+# -------------------------------
+# The app's metrics
+# -------------------------------
+REQUEST_SECONDS = Histogram(
+    "lookup_request_duration_seconds", "Total HTTP request time, including streamed bodies", ["route", "method"]
+)
+STAGE_SECONDS = Histogram(
+    "lookup_stage_duration_seconds", "Time spent in one pipeline stage or upstream call", ["stage"]
+)
+STAGE_TOTAL = Counter(
+    "lookup_stage_total", "Pipeline stage and upstream calls by outcome (ok, error or cancelled)", ["stage", "outcome"]
+)
+CACHE_REQUESTS = Counter(
+    "lookup_cache_requests_total", "Result cache lookups by kind and result (hit, stale, miss)", ["kind", "result"]
+)
+LLM_TOKENS = Counter(
+    "lookup_llm_tokens_total", "OpenAI tokens used, by agent and token type (prompt or completion)", ["agent", "type"]
+)
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "lookup_scheduler_wait_seconds", "Time queued for a provider's rate limit", ["provider", "priority"]
+)
+RETRIES_TOTAL = Counter(
+    "lookup_upstream_retries_total", "Upstream calls retried, by provider and status or error", ["provider", "status"]
+)
+REJECTED_TOTAL = Counter(
+    "lookup_rejected_total", "Requests turned away with 503 because a provider queue was full", ["provider", "priority"]
+)
+DEADLINE_EXCEEDED_TOTAL = Counter(
+    "lookup_deadline_exceeded_total", "Upstream calls cut off by the request deadline or provider timeout", ["provider"]
+)
+CIRCUIT_OPENED_TOTAL = Counter(
+    "lookup_circuit_opened_total", "Times a provider's circuit breaker opened", ["provider"]
+)
+LLM_CALLS_TOTAL = Counter(
+    "lookup_llm_calls_total", "Chat completions by model and hedge outcome (not_fired, primary_won, hedge_won)",
+    ["model", "hedge"]
+)
+
+ALL_METRICS = (
+    REQUEST_SECONDS, STAGE_SECONDS, STAGE_TOTAL, CACHE_REQUESTS, LLM_TOKENS,
+    SCHEDULER_WAIT_SECONDS, RETRIES_TOTAL, REJECTED_TOTAL, DEADLINE_EXCEEDED_TOTAL, CIRCUIT_OPENED_TOTAL,
+    LLM_CALLS_TOTAL,
+)
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """Time a block (sync or containing awaits) as one ``stage`` observation,
+    counting it as an error if it raises"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        # A hedged request that lost, or a client that went away
+        outcome = "cancelled"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_TOTAL.inc(stage=stage, outcome=outcome)
+
+
+def record_tokens(agent, usage):
+    """Count prompt and completion tokens from an OpenAI ``usage`` object"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, agent=agent, type="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, agent=agent, type="completion")
+
+
+# -------------------------------
+# Exposition and cross-process aggregation
+# -------------------------------
+def snapshot():
+    """This worker's values, copied; take it on the event loop that updates them"""
+    return {
+        metric.name: [[list(key), list(value) if isinstance(value, list) else value]
+                      for key, value in metric.values.items()]
+        for metric in ALL_METRICS
+    }
+
+
+def _metrics_dir():
+    return os.getenv("METRICS_DIR")
+
+
+def write_snapshot(directory, values=None):
+    """Atomically replace this worker's snapshot file"""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(values if values is not None else snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _combined_values(own):
+    """Every metric's values summed over all workers' snapshots (or just ours)"""
+    directory = _metrics_dir()
+    if not directory:
+        return {name: {tuple(key): value for key, value in entries} for name, entries in own.items()}
+
+    write_snapshot(directory, own)
+    combined = {metric.name: type(metric)(metric.name, metric.help, metric.labelnames) for metric in ALL_METRICS}
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric_name, entries in data.items():
+            if metric_name in combined:
+                combined[metric_name].merge({tuple(key): value for key, value in entries})
+    return {name: metric.values for name, metric in combined.items()}
+
+
+def render(own=None):
+    """All metrics in the Prometheus text exposition format. With ``own`` (a
+    snapshot) it only reads files, so it can run in a thread."""
+    values = _combined_values(own if own is not None else snapshot())
+    lines = []
+    for metric in ALL_METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(values[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+async def snapshot_loop():
+    """Keep this worker's snapshot current so other workers can report it"""
+    directory = _metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    try:
+        while True:
+            await asyncio.to_thread(write_snapshot, directory, snapshot())
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+    finally:
+        # Final counts survive the worker
+        write_snapshot(directory)
+
+
+def _route_of(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing total request time per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=_route_of(scope), method=scope["method"])
@@ -1,6 +1,6 @@
 # ========== app/models.py ==========
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -9,18 +9,40 @@ class Company(Base):
     __tablename__ = 'companies'
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
+    normalized_name = Column(String, unique=True, nullable=False)
+    ticker = Column(String, index=True)
+    query_type = Column(String)
     employee_count = Column(Integer, nullable=True)
     officers = Column(JSON)
     business_description = Column(Text)
     fast_facts = Column(JSON)
-    created_at = Column(DateTime)
+    summary = Column(Text)
+    created_at = Column(DateTime, index=True)
+    updated_at = Column(DateTime)
+
+class Person(Base):
+    __tablename__ = 'people'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    normalized_name = Column(String, unique=True, nullable=False)
+    profile = Column(JSON)
+    summary = Column(Text)
+    created_at = Column(DateTime, index=True)
+    updated_at = Column(DateTime)
 
 class Document(Base):
     __tablename__ = 'documents'
+    __table_args__ = (
+        UniqueConstraint('company_id', 'source_url', name='uq_documents_company_source_url'),
+        Index('ix_documents_company_id_type', 'company_id', 'type'),
+    )
     id = Column(Integer, primary_key=True)
-    company_id = Column(Integer, ForeignKey('companies.id'))
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
     type = Column(String)
+    title = Column(String)
+    source = Column(String)
     content = Column(Text)
     summary = Column(Text)
     source_url = Column(String)
-    created_at = Column(DateTime)
\ No newline at end of file
+    published_at = Column(DateTime)
+    created_at = Column(DateTime, index=True)
@@ -0,0 +1,337 @@
+"""Per-entity news store, fed incrementally from NewsAPI.
+
+Every company or person looked up becomes a tracked entity. The first
+lookup fetches its news once. After that a background poller asks
+NewsAPI only for articles published since the newest one already
+stored, and requests read the latest articles from memory.
+
+Articles are deduplicated per entity by a hash of the normalized URL
+(no scheme, ``www.``, tracking parameters or fragment) and by a hash of
+the normalized title, which catches syndicated copies. The store is a
+SQLite file shared by every worker. A worker claims an entity before
+polling it, so each entity is polled once per interval across the whole
+server. A lookup that finds another worker fetching a new entity's first
+articles waits for them rather than answering with no news.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from . import clients, deadlines, scheduler, singleflight
+from .cache import normalize_identifier
+from .limits import call_upstream
+from .records import NewsItem, dumps_text, loads
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEWS_PATH = os.path.join("data", "news.db")
+POLL_INTERVAL = float(os.getenv("NEWS_POLL_SECONDS", 600))
+# Entities nobody has looked up for this long stop being polled
+TRACK_SECONDS = float(os.getenv("NEWS_TRACK_SECONDS", 7 * 24 * 3600))
+PAGE_SIZE = int(os.getenv("NEWS_PAGE_SIZE", 20))
+POLL_CONCURRENCY = 4
+# Newest articles per entity kept in memory for requests
+KEEP_PER_ENTITY = 50
+# How long a worker serves its in-memory view before rereading the store,
+# which picks up articles other workers' pollers added
+MEMORY_SECONDS = 30.0
+# How often a lookup checks whether another worker's first fetch has finished
+FIRST_FETCH_POLL_SECONDS = 0.1
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src|cmpid|ocid)$")
+_TITLE_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_url(url):
+    """Scheme-less, lowercased host without ``www.``, no trailing slash,
+    tracking parameters or fragment; remaining parameters sorted"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k))
+    normalized = host + (parts.path.rstrip("/") or "")
+    return normalized + ("?" + urlencode(query) if query else "")
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def url_hash(url):
+    return _digest(normalize_url(url))
+
+
+def title_hash(title):
+    return _digest(" ".join(_TITLE_RE.findall(title.lower())))
+
+
+def to_item(article):
+    """A NewsAPI article as the app's news item"""
+    return NewsItem(
+        title=article["title"],
+        url=article["url"],
+        date=article["publishedAt"][:10],
+        source=article["source"]["name"],
+        summary=article.get("description") or article.get("content") or "No summary available.",
+    )
+
+
+async def fetch_articles(query, since=None, page_size=PAGE_SIZE):
+    """NewsAPI ``everything`` for ``query``, newest first, optionally only
+    articles published at or after ``since`` (ISO 8601)"""
+    params = {
+        "q": query,
+        "language": "en",
+        "sortBy": "publishedAt",
+        "pageSize": page_size,
+        "apiKey": get_settings().newsapi_api_key,
+    }
+    if since:
+        params["from"] = since
+
+    async def everything():
+        response = await clients.get_clients().newsapi.get("/v2/everything", params=params)
+        response.raise_for_status()
+        return response
+
+    response = await call_upstream("newsapi", everything)
+    return [a for a in response.json().get("articles", []) if a.get("url") and a.get("title")]
+
+
+class NewsStore:
+    """Articles per entity in SQLite, with a per-worker in-memory view of the newest"""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " entity TEXT NOT NULL, url_hash TEXT NOT NULL, title_hash TEXT NOT NULL,"
+            " published_at TEXT NOT NULL, item TEXT NOT NULL, fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (entity, url_hash), UNIQUE (entity, title_hash));"
+            "CREATE INDEX IF NOT EXISTS ix_articles_entity_published ON articles (entity, published_at DESC);"
+            "CREATE TABLE IF NOT EXISTS entities ("
+            " entity TEXT PRIMARY KEY, query TEXT NOT NULL, last_published TEXT,"
+            " polled_at REAL, requested_at REAL NOT NULL, fetched_at REAL);"
+        )
+        # polled_at is set when a poll is claimed, fetched_at when one finishes
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entities)")}
+        if "fetched_at" not in columns:
+            self._conn.execute("ALTER TABLE entities ADD COLUMN fetched_at REAL")
+            self._conn.execute("UPDATE entities SET fetched_at = polled_at")
+        self._conn.commit()
+        # entity -> (monotonic load time, newest items first)
+        self._memory = {}
+        self.stats = {
+            "memory_hits": 0, "store_reads": 0, "initial_fetches": 0, "first_fetch_waits": 0,
+            "polls": 0, "new_articles": 0,
+        }
+
+    # -- SQLite (called from worker threads) --
+    def _read(self, entity, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item FROM articles WHERE entity = ? ORDER BY published_at DESC LIMIT ?", (entity, limit)
+            ).fetchall()
+        return [NewsItem(**loads(row[0])) for row in rows]
+
+    def _track(self, entity, query):
+        """Record a lookup; returns when a fetch for the entity last finished (None if never)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entities (entity, query, requested_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (entity) DO UPDATE SET requested_at = excluded.requested_at",
+                (entity, query, now),
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT fetched_at FROM entities WHERE entity = ?", (entity,)).fetchone()
+        return row[0]
+
+    def _fetch_state(self, entity):
+        """(polled_at, fetched_at): whether a poll is claimed, and whether one has finished"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT polled_at, fetched_at FROM entities WHERE entity = ?", (entity,)
+            ).fetchone()
+
+    def _claim(self, entity, interval):
+        """Mark ``entity`` as being polled unless another worker polled it within ``interval``"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE entities SET polled_at = ? WHERE entity = ? AND (polled_at IS NULL OR polled_at < ?)",
+                (now, entity, now - interval),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def _due(self, interval):
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT entity, query, last_published FROM entities"
+                " WHERE requested_at > ? AND polled_at IS NOT NULL AND polled_at < ?",
+                (now - TRACK_SECONDS, now - interval),
+            ).fetchall()
+
+    def _insert(self, entity, articles):
+        """Store unseen articles; returns how many were new"""
+        now = time.time()
+        rows = [
+            (entity, url_hash(a["url"]), title_hash(a["title"]), a["publishedAt"], dumps_text(to_item(a)), now)
+            for a in articles
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = self._conn.total_changes - before
+            self._conn.execute("UPDATE entities SET fetched_at = ? WHERE entity = ?", (now, entity))
+            if rows:
+                newest = max(row[3] for row in rows)
+                self._conn.execute(
+                    "UPDATE entities SET last_published = ? WHERE entity = ?"
+                    " AND (last_published IS NULL OR last_published < ?)",
+                    (newest, entity, newest),
+                )
+            self._conn.commit()
+        return added
+
+    # -- async API --
+    async def _reload(self, entity):
+        items = await asyncio.to_thread(self._read, entity, KEEP_PER_ENTITY)
+        self._memory[entity] = (time.monotonic(), items)
+        self.stats["store_reads"] += 1
+        return items
+
+    async def poll(self, entity, query, since=None):
+        """Fetch articles newer than ``since`` into the store"""
+        articles = await fetch_articles(query, since)
+        added = await asyncio.to_thread(self._insert, entity, articles)
+        self.stats["polls"] += 1
+        self.stats["new_articles"] += added
+        if added:
+            logger.info(f"Stored {added} new articles for {entity}")
+            await self._reload(entity)
+        return added
+
+    async def latest(self, query, limit=5):
+        """The ``limit`` newest articles about ``query``, from memory when possible"""
+        entity = normalize_identifier(query)
+        entry = self._memory.get(entity)
+        if entry is not None and time.monotonic() - entry[0] < MEMORY_SECONDS:
+            self.stats["memory_hits"] += 1
+            return entry[1][:limit]
+
+        # Also refreshes requested_at, at most once per MEMORY_SECONDS per worker
+        fetched_at = await asyncio.to_thread(self._track, entity, query)
+        if fetched_at is None:
+            if not await singleflight.news_fetches.do(entity, lambda: self._first_fetch(entity, query)):
+                # No articles yet; don't keep that in memory, the next lookup tries again
+                return await asyncio.to_thread(self._read, entity, limit)
+        return (await self._reload(entity))[:limit]
+
+    async def _first_fetch(self, entity, query):
+        """Fetch a new entity's articles, or wait while another worker does;
+        False if there are none to show yet"""
+        deadline = deadlines.stage_deadline("newsapi")
+        while not await asyncio.to_thread(self._claim, entity, POLL_INTERVAL):
+            if await self._wait_for_first_fetch(entity, deadline):
+                return True
+            if deadlines.time_left(deadline) == 0:
+                logger.warning(f"Gave up waiting for another worker's news fetch for {entity}")
+                return False
+            # The other worker's fetch failed; try it here
+        self.stats["initial_fetches"] += 1
+        try:
+            await self.poll(entity, query)
+            return True
+        except Exception as e:
+            logger.error(f"Error retrieving news from NewsAPI: {e}")
+            # Let the next lookup try again
+            await asyncio.to_thread(self._unclaim, entity)
+            return False
+
+    async def _wait_for_first_fetch(self, entity, deadline):
+        """Wait for the worker holding the claim on ``entity``: True once its
+        fetch has finished, False if it gave the claim up or ``deadline`` passed"""
+        self.stats["first_fetch_waits"] += 1
+        while deadlines.time_left(deadline) > 0:
+            await asyncio.sleep(min(FIRST_FETCH_POLL_SECONDS, deadlines.time_left(deadline)))
+            polled_at, fetched_at = await asyncio.to_thread(self._fetch_state, entity)
+            if fetched_at is not None:
+                return True
+            if polled_at is None:
+                return False
+        return False
+
+    def _unclaim(self, entity):
+        with self._lock:
+            self._conn.execute("UPDATE entities SET polled_at = NULL WHERE entity = ?", (entity,))
+            self._conn.commit()
+
+    async def poll_due(self, interval=POLL_INTERVAL):
+        """Poll every tracked entity whose turn it is; returns new article count"""
+        due = await asyncio.to_thread(self._due, interval)
+        semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+
+        async def poll_one(entity, query, since):
+            async with semaphore:
+                if not await asyncio.to_thread(self._claim, entity, interval):
+                    return 0
+                try:
+                    return await self.poll(entity, query, since)
+                except Exception as e:
+                    logger.error(f"News poll failed for {entity}: {e}")
+                    return 0
+
+        return sum(await asyncio.gather(*(poll_one(*row) for row in due)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+
+
+def get_store():
+    """Return the process-wide news store, creating it on first use"""
+    global _store
+    if _store is None:
+        _store = NewsStore(os.getenv("NEWS_STORE_PATH", DEFAULT_NEWS_PATH))
+    return _store
+
+
+async def poll_loop():
+    """Keep tracked entities' news current (run from the FastAPI lifespan)"""
+    if not get_settings().newsapi_api_key:
+        return
+    # Polls yield to request traffic and have no request deadline
+    scheduler.use_priority(scheduler.BACKGROUND)
+    deadlines.start(None)
+    while True:
+        try:
+            await get_store().poll_due()
+        except Exception as e:
+            logger.error(f"News polling failed: {e}")
+        await asyncio.sleep(min(POLL_INTERVAL, 60))
+
+
+def shutdown():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
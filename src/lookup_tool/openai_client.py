@@ -1,14 +1,31 @@
 # ========== app/openai_client.py ==========
 
-import openai
-
-def summarize_with_openai(text, api_key):
-    client = openai.OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "Summarize the following company website content and extract key facts and officers if possible."},
-            {"role": "user", "content": text[:3000]}
-        ]
+from . import llm, metrics
+from .clients import get_clients
+from .tokens import count_tokens, truncate_to_tokens
+
+DEFAULT_INSTRUCTIONS = "Summarize the following company website content and extract key facts and officers if possible."
+
+# Hard ceiling for a single call; long documents should go through
+# summarize.summarize_document, which chunks them first.
+MAX_INPUT_TOKENS = 6000
+
+async def summarize_with_openai(text, instructions=DEFAULT_INSTRUCTIONS, tier=llm.STANDARD):
+    client = get_clients().openai
+    if client is None:
+        raise Exception("OpenAI API key not configured")
+    content = truncate_to_tokens(text, MAX_INPUT_TOKENS)
+    response = await llm.complete(
+        client,
+        dict(
+            model=llm.model_for(tier),
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": content}
+            ]
+        ),
+        # No max_tokens on this call; assume a summary well under 1k tokens
+        tokens=count_tokens(instructions) + count_tokens(content) + 1000
     )
+    metrics.record_tokens("Summarizer", getattr(response, "usage", None))
     return response.choices[0].message.content
@@ -0,0 +1,196 @@
+"""Popularity-driven prefetch: keep the most-looked-up entities warm.
+
+Interactive lookups bump a per-entity counter that decays with a
+half-life of PREFETCH_HALF_LIFE_HOURS, so yesterday's burst fades and
+steady interest stays. Workers buffer their counts in memory and fold
+them into a shared SQLite table every few seconds.
+
+One worker at a time, holding a lease, runs the warm-up. At startup and
+then every PREFETCH_INTERVAL_SECONDS, it looks up the top-K entities at
+background priority, so summaries and news are computed before anyone
+asks. Cache entries that would go stale within
+PREFETCH_REFRESH_AHEAD_SECONDS are recomputed. Scheduled passes are
+spread over half the interval, so the warm-up never arrives at the
+providers as a burst.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from . import cache, deadlines, scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_PATH = os.path.join("data", "popularity.db")
+HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE_HOURS", 24)) * 3600
+TOP_K = int(os.getenv("PREFETCH_TOP_K", 50))
+INTERVAL = float(os.getenv("PREFETCH_INTERVAL_SECONDS", 900))
+REFRESH_AHEAD = float(os.getenv("PREFETCH_REFRESH_AHEAD_SECONDS", 1800))
+FLUSH_SECONDS = 5.0
+# Entities whose decayed score falls below this are forgotten
+MIN_SCORE = 0.05
+
+
+def decayed(score, updated, now, half_life=HALF_LIFE):
+    return score * 0.5 ** ((now - updated) / half_life)
+
+
+class Popularity:
+    """Decaying lookup counts per canonical entity, shared by every worker"""
+
+    def __init__(self, path, half_life=HALF_LIFE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.half_life = half_life
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS popularity ("
+            " key TEXT PRIMARY KEY, input TEXT NOT NULL, score REAL NOT NULL, updated REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS runner ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+        # key -> [input as typed most recently, count]
+        self._pending = {}
+        self.stats = {"passes": 0, "warmed": 0, "failed": 0}
+
+    def record(self, key, identifier):
+        """Count one lookup of the entity ``key`` (cheap; flushed later)"""
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [identifier, 1]
+        else:
+            entry[0] = identifier
+            entry[1] += 1
+
+    def flush(self):
+        """Fold buffered counts into the shared table, decaying what's there"""
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        with self._lock:
+            for key, (identifier, count) in pending.items():
+                row = self._conn.execute("SELECT score, updated FROM popularity WHERE key = ?", (key,)).fetchone()
+                score = count + (decayed(row[0], row[1], now, self.half_life) if row else 0.0)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO popularity (key, input, score, updated) VALUES (?, ?, ?, ?)",
+                    (key, identifier, score, now),
+                )
+            self._conn.commit()
+
+    def top(self, k=TOP_K):
+        """The ``k`` highest-scoring (input, score) pairs right now, forgetting faded entities"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT key, input, score, updated FROM popularity").fetchall()
+            scored = [(decayed(score, updated, now, self.half_life), key, identifier)
+                      for key, identifier, score, updated in rows]
+            faded = [(key,) for score, key, _ in scored if score < MIN_SCORE]
+            if faded:
+                self._conn.executemany("DELETE FROM popularity WHERE key = ?", faded)
+                self._conn.commit()
+        scored = [entry for entry in scored if entry[0] >= MIN_SCORE]
+        scored.sort(reverse=True)
+        return [(identifier, round(score, 3)) for score, _, identifier in scored[:k]]
+
+    def claim_runner(self, seconds):
+        """Hold (or renew) the single warm-up runner lease"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runner (id, owner, expires_at) VALUES (1, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE runner.expires_at < ? OR runner.owner = excluded.owner",
+                (self._owner, now + seconds, now),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_popularity = None
+
+
+def get_popularity():
+    """Return the process-wide popularity tracker, creating it on first use"""
+    global _popularity
+    if _popularity is None:
+        _popularity = Popularity(os.getenv("PREFETCH_STORE_PATH", DEFAULT_PREFETCH_PATH))
+    return _popularity
+
+
+def record(key, identifier):
+    get_popularity().record(key, identifier)
+
+
+async def warm(lookup, spread=0.0, k=TOP_K):
+    """Run ``lookup(identifier)`` for the top-k entities, spacing the calls
+    evenly over ``spread`` seconds"""
+    popularity = get_popularity()
+    hot = await asyncio.to_thread(popularity.top, k)
+    popularity.stats["passes"] += 1
+    gap = spread / len(hot) if hot else 0.0
+    for identifier, score in hot:
+        started = time.monotonic()
+        try:
+            await lookup(identifier)
+            popularity.stats["warmed"] += 1
+        except Exception as e:
+            popularity.stats["failed"] += 1
+            logger.warning(f"Prefetch of {identifier} (score {score}) failed: {e}")
+        await asyncio.sleep(max(0.0, gap - (time.monotonic() - started)))
+    if hot:
+        logger.info(f"Prefetched {len(hot)} popular entities")
+
+
+async def _flush_loop(popularity):
+    try:
+        while True:
+            await asyncio.sleep(FLUSH_SECONDS)
+            await asyncio.to_thread(popularity.flush)
+    finally:
+        # Keep this worker's last counts
+        popularity.flush()
+
+
+async def prefetch_loop(lookup):
+    """Flush popularity counts and, on the worker holding the runner lease,
+    warm the top entities at startup and every INTERVAL (run from the lifespan)"""
+    popularity = get_popularity()
+    # Prefetches yield to real traffic, have no request deadline, and
+    # recompute entries that are about to go stale
+    scheduler.use_priority(scheduler.BACKGROUND)
+    deadlines.start(None)
+    cache.refresh_within(REFRESH_AHEAD)
+
+    flusher = asyncio.create_task(_flush_loop(popularity))
+    spread = 0.0  # the startup pass goes as fast as the scheduler allows
+    try:
+        while True:
+            if await asyncio.to_thread(popularity.claim_runner, INTERVAL * 2):
+                try:
+                    await warm(lookup, spread)
+                except Exception as e:
+                    logger.error(f"Prefetch pass failed: {e}")
+            spread = INTERVAL / 2
+            await asyncio.sleep(INTERVAL)
+    finally:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+
+
+def shutdown():
+    global _popularity
+    if _popularity is not None:
+        _popularity.close()
+        _popularity = None
@@ -0,0 +1,108 @@
+"""Prompt assembly with local token budgeting.
+
+Search evidence is serialized as one compact line per result instead of
+a Python repr. Near-duplicate snippets are dropped, and the rest are
+ranked and added best-first until the agent's token budget is spent.
+Everything that doesn't change between calls belongs in the agent's
+system instructions, so the variable part of a prompt comes last and
+provider-side prompt caching can reuse the fixed prefix.
+"""
+import os
+import re
+from urllib.parse import urlparse
+
+from .tokens import count_tokens, truncate_to_tokens
+
+# Evidence tokens per agent (instructions and the completion are extra)
+TOKEN_BUDGETS = {
+    "PersonAnalyst": int(os.getenv("PERSON_PROMPT_TOKENS", 300)),
+}
+MAX_RESULTS = 6
+MAX_SNIPPET_TOKENS = 80
+# Word-set overlap above which two results say the same thing
+DUPLICATE_SIMILARITY = 0.8
+
+PROFILE_WORDS = {
+    "linkedin", "ceo", "cfo", "cto", "founder", "cofounder", "director", "manager", "executive", "president",
+    "chief", "officer", "chairman", "partner", "biography", "education", "experience",
+}
+PROFILE_PHRASES = ("works at", "employed at", "ceo of", "founder of")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def _similar(a, b):
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= DUPLICATE_SIMILARITY
+
+
+def _domain(url):
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def dedupe(results):
+    """Drop results whose title and snippet nearly repeat an earlier one"""
+    kept, seen = [], []
+    for result in results:
+        words = _words(f"{result.title} {result.snippet}")
+        if any(_similar(words, other) for other in seen):
+            continue
+        seen.append(words)
+        kept.append(result)
+    return kept
+
+
+def _score(result, position, name_words):
+    """Search rank, plus how much the result is about this person's career"""
+    text = f"{result.title} {result.snippet}".lower()
+    words = _words(text) | _words(_domain(result.url))
+    score = 1.0 / (1 + position)
+    mentioned = name_words & words
+    score += 2.0 if mentioned == name_words else 0.5 * len(mentioned)
+    score += 0.5 * len(PROFILE_WORDS & words)
+    score += 0.5 * sum(1 for phrase in PROFILE_PHRASES if phrase in text)
+    return score
+
+
+def evidence_line(index, result):
+    """``[n] title | snippet | domain`` with the snippet capped"""
+    parts = [result.title.strip()]
+    snippet = " ".join(result.snippet.split())
+    if snippet:
+        parts.append(truncate_to_tokens(snippet, MAX_SNIPPET_TOKENS))
+    domain = _domain(result.url) or result.source
+    if domain:
+        parts.append(domain)
+    return f"[{index}] " + " | ".join(part for part in parts if part)
+
+
+def fit_evidence(results, subject, budget):
+    """Up to MAX_RESULTS deduplicated results, best first, as lines that fit ``budget`` tokens"""
+    name_words = _words(subject)
+    ranked = sorted(
+        enumerate(dedupe(results)), key=lambda item: _score(item[1], item[0], name_words), reverse=True
+    )
+    lines, used = [], 0
+    for _, result in ranked:
+        if len(lines) == MAX_RESULTS:
+            break
+        line = evidence_line(len(lines) + 1, result)
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            continue
+        lines.append(line)
+        used += tokens
+    return lines
+
+
+def person_prompt(person_name, search_results, budget=None):
+    """User message for PersonAnalyst: the name, then ranked evidence"""
+    budget = budget or TOKEN_BUDGETS["PersonAnalyst"]
+    lines = fit_evidence(search_results, person_name, budget - count_tokens(person_name) - 8)
+    return f"Person: {person_name}\nSearch results:\n" + "\n".join(lines)
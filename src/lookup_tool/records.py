@@ -0,0 +1,87 @@
+"""Typed result records shared by the lookup pipeline, and their JSON encoding.
+
+Search results, news items, person profiles and company results are
+slotted dataclasses. They have no per-instance ``__dict__``, which is a
+saving for the news items every worker keeps in memory. They are built
+once and passed along rather than copied into new dicts at each step.
+
+``dumps`` encodes records and the plain values around them in one pass:
+with orjson when it is installed (the ``fast`` extra), which serializes
+dataclasses natively, and with the standard library otherwise.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class SearchResult:
+    """One organic web search hit"""
+    title: str = ""
+    url: str = ""
+    snippet: str = ""
+    source: str = ""
+
+
+@dataclass(slots=True)
+class NewsItem:
+    """One article as shown to users and stored as a news document"""
+    title: str
+    url: str
+    date: str
+    source: str
+    summary: str
+
+
+@dataclass(slots=True)
+class PersonProfile:
+    """Search results about a person, sorted into the sections of the summary"""
+    name: str
+    linkedin_profiles: list = field(default_factory=list)
+    professional_info: list = field(default_factory=list)
+    company_affiliations: list = field(default_factory=list)
+    other_profiles: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class CompanyResult:
+    """A company lookup as stored by db.upsert_companies"""
+    name: str
+    query_type: str
+    summary: Optional[str] = None
+    ticker: Optional[str] = None
+    employee_count: Optional[int] = None
+    officers: Optional[list] = None
+    business_description: Optional[str] = None
+    fast_facts: Optional[dict] = None
+
+
+def to_dict(record):
+    """A record's fields as a dict (nested records are left as they are)"""
+    return {name: getattr(record, name) for name in record.__slots__}
+
+
+def _default(value):
+    if hasattr(value, "__dataclass_fields__"):
+        return to_dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """Compact UTF-8 JSON bytes for ``value``, records included"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_text(value):
+    """``dumps`` as a str, for SQLite TEXT columns and SSE frames"""
+    return dumps(value).decode("utf-8")
+
+
+loads = orjson.loads if orjson is not None else json.loads
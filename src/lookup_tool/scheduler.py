@@ -0,0 +1,254 @@
+"""Provider-aware rate limiting, prioritisation, retries and backpressure.
+
+Each upstream provider gets a ``ProviderScheduler`` with token buckets for
+requests per minute and (for OpenAI) LLM tokens per minute. Callers that
+can't be served immediately wait in a priority queue, so interactive
+lookups go ahead of batch items, which go ahead of background refreshes.
+``call_with_retries`` retries 429s, 5xx and connection errors with
+jittered exponential backoff, honouring Retry-After. ``admit`` turns
+away new requests with ``Overloaded`` when a provider's queue is full,
+so the API can answer 503 quickly instead of queueing without bound.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+# Per-minute quotas; 0 disables a bucket
+DEFAULT_RATES = {
+    "openai": {
+        "requests": int(os.getenv("RATE_LIMIT_OPENAI_RPM", 500)),
+        "tokens": int(os.getenv("RATE_LIMIT_OPENAI_TPM", 150000)),
+    },
+    "serper": {"requests": int(os.getenv("RATE_LIMIT_SERPER_RPM", 300)), "tokens": 0},
+    "newsapi": {"requests": int(os.getenv("RATE_LIMIT_NEWSAPI_RPM", 100)), "tokens": 0},
+    "yahoo": {"requests": int(os.getenv("RATE_LIMIT_YAHOO_RPM", 60)), "tokens": 0},
+}
+# The quotas of the whole account; DEFAULT_RATES is this process's share of them
+ACCOUNT_RATES = {provider: dict(rates) for provider, rates in DEFAULT_RATES.items()}
+# Waiters per provider before new requests are turned away
+MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", 200))
+
+RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Errors without a status code that are still worth retrying
+_CONNECTION_ERRORS = {"APIConnectionError", "APITimeoutError", "YFRateLimitError"}
+
+_priority = contextvars.ContextVar("scheduler_priority", default=INTERACTIVE)
+
+
+class Overloaded(Exception):
+    """A provider queue is full; the caller should retry after ``retry_after`` seconds"""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} queue is full, retry in {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def use_priority(priority):
+    """Run upstream calls from the current context at ``priority``"""
+    return _priority.set(priority)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class TokenBucket:
+    """Refills continuously at ``per_minute / 60`` per second up to one minute's worth"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` is available (requests larger than the
+        bucket only need a full bucket)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class ProviderScheduler:
+    def __init__(self, provider, requests_per_minute=0, tokens_per_minute=0, max_queue=MAX_QUEUE):
+        self.provider = provider
+        self.max_queue = max_queue
+        self._buckets = []
+        if requests_per_minute:
+            self._buckets.append((TokenBucket(requests_per_minute), lambda tokens: 1))
+        if tokens_per_minute:
+            self._buckets.append((TokenBucket(tokens_per_minute), lambda tokens: tokens))
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+
+    @property
+    def queued(self):
+        return sum(1 for *_, future, _ in self._waiters if not future.done())
+
+    def _wait_time(self, tokens):
+        return max((bucket.wait_time(cost(tokens)) for bucket, cost in self._buckets), default=0.0)
+
+    def _take(self, tokens):
+        for bucket, cost in self._buckets:
+            bucket.take(cost(tokens))
+
+    def _grant(self):
+        """Serve waiters in priority order while the buckets allow, then
+        sleep until the head of the queue can go"""
+        self._timer = None
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._grant)
+                return
+            heapq.heappop(self._waiters)
+            self._take(tokens)
+            future.set_result(None)
+
+    def retry_after(self):
+        """Rough seconds until the current queue drains"""
+        rates = [bucket.rate for bucket, _ in self._buckets[:1]]
+        return max(1, round(self.queued / rates[0])) if rates else 1
+
+    async def acquire(self, priority=INTERACTIVE, tokens=0):
+        """Wait for this provider's quota, behind any higher-priority waiters"""
+        if not self._waiters and self._wait_time(tokens) == 0:
+            self._take(tokens)
+            return
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, tokens))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._grant()
+        try:
+            await future
+        finally:
+            if not future.done():
+                future.cancel()
+            metrics.SCHEDULER_WAIT_SECONDS.observe(
+                time.monotonic() - started, provider=self.provider, priority=PRIORITY_NAMES[priority]
+            )
+
+
+_schedulers = {}
+
+
+def get_scheduler(provider):
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        rates = DEFAULT_RATES.get(provider, {})
+        scheduler = _schedulers[provider] = ProviderScheduler(
+            provider, rates.get("requests", 0), rates.get("tokens", 0)
+        )
+    return scheduler
+
+
+def share_quotas(fraction):
+    """Give this process ``fraction`` of every provider quota, for processes
+    that split one account's limits between them (call before any upstream call)"""
+    for provider, rates in DEFAULT_RATES.items():
+        for bucket, per_minute in ACCOUNT_RATES[provider].items():
+            rates[bucket] = max(1, int(per_minute * fraction)) if per_minute else 0
+    _schedulers.clear()
+
+
+def admit(priority=INTERACTIVE, providers=tuple(DEFAULT_RATES)):
+    """Raise Overloaded if any provider's queue is already full"""
+    for provider in providers:
+        scheduler = get_scheduler(provider)
+        if scheduler.queued >= scheduler.max_queue:
+            metrics.REJECTED_TOTAL.inc(provider=provider, priority=PRIORITY_NAMES[priority])
+            raise Overloaded(provider, scheduler.retry_after())
+
+
+# -------------------------------
+# Retries
+# -------------------------------
+def _status_of(error):
+    response = getattr(error, "response", None)
+    return getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    if type(error).__name__ in _CONNECTION_ERRORS:
+        return True
+    try:
+        import httpx
+        if isinstance(error, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    return _status_of(error) in RETRYABLE_STATUS
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, or the server's Retry-After if it gave one"""
+    hinted = _retry_after(error) if error is not None else None
+    if hinted is not None:
+        return min(hinted, RETRY_MAX_DELAY) + random.uniform(0, RETRY_BASE_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def call_with_retries(provider, fn, attempts=RETRY_ATTEMPTS, deadline=None):
+    """Await ``fn()`` and retry transient upstream failures, giving up early
+    when the backoff would run past ``deadline`` (a time.monotonic() value)"""
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            metrics.RETRIES_TOTAL.inc(provider=provider, status=_status_of(e) or type(e).__name__)
+            logger.warning(f"{provider} call failed ({_status_of(e) or type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,105 @@
+import logging
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+
+class Settings(NamedTuple):
+    """Everything read from the environment (and .env) at startup"""
+    env_file: Optional[str] = None
+    openai_api_key: Optional[str] = None
+    serper_api_key: Optional[str] = None
+    newsapi_api_key: Optional[str] = None
+    alpha_vantage_api_key: Optional[str] = None
+    clearbit_api_key: Optional[str] = None
+    # Point the clients at stand-ins (see lookup_tool.stubs); None means the real service
+    openai_base_url: Optional[str] = None
+    serper_base_url: Optional[str] = None
+    newsapi_base_url: Optional[str] = None
+    log_dir: str = "logs"
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backups: int = 5
+    log_field_max_chars: int = 2000
+    # Fraction of LLM responses whose full text is logged
+    log_body_sample_rate: float = 0.01
+    log_per_process: bool = False
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    # Server processes splitting each provider quota (set by main() for its workers)
+    quota_workers: int = 1
+    # Seconds in-flight requests get to finish after SIGTERM
+    graceful_timeout: int = 30
+    # Import + app creation + warm-up; exceeding it logs a warning
+    startup_budget_ms: int = 1500
+
+
+def find_env_file():
+    """First .env in the project root, the package's parent, the package or the cwd"""
+    candidates = [PACKAGE_DIR.parents[1] / ".env", PACKAGE_DIR.parent / ".env", PACKAGE_DIR / ".env", Path.cwd() / ".env"]
+    for path in candidates:
+        if path.is_file():
+            return path
+    return None
+
+
+def load_settings():
+    """Load .env into the environment (without overriding it) and read the settings"""
+    env_file = find_env_file()
+    if env_file is not None:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=env_file)
+
+    return Settings(
+        env_file=str(env_file) if env_file else None,
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        serper_api_key=os.getenv("SERPER_API_KEY"),
+        newsapi_api_key=os.getenv("NEWSAPI_ORG_API_KEY"),
+        alpha_vantage_api_key=os.getenv("ALPHA_VANTAGE_API_KEY"),
+        clearbit_api_key=os.getenv("CLEARBIT_API_KEY"),
+        openai_base_url=os.getenv("OPENAI_BASE_URL"),
+        serper_base_url=os.getenv("SERPER_BASE_URL"),
+        newsapi_base_url=os.getenv("NEWSAPI_BASE_URL"),
+        log_dir=os.getenv("LOG_DIR", "logs"),
+        log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        log_format=os.getenv("LOG_FORMAT", "json").lower(),
+        log_max_bytes=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        log_backups=int(os.getenv("LOG_BACKUPS", 5)),
+        log_field_max_chars=int(os.getenv("LOG_FIELD_MAX_CHARS", 2000)),
+        log_body_sample_rate=float(os.getenv("LOG_BODY_SAMPLE_RATE", 0.01)),
+        log_per_process=os.getenv("LOG_PER_PROCESS", "").lower() in ("1", "true", "yes"),
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        quota_workers=int(os.getenv("UPSTREAM_QUOTA_WORKERS", 1)),
+        graceful_timeout=int(os.getenv("GRACEFUL_TIMEOUT", 30)),
+        startup_budget_ms=int(os.getenv("STARTUP_BUDGET_MS", 1500)),
+    )
+
+
+_settings = None
+
+
+def get_settings():
+    """Settings, loaded on first use"""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def configured(settings):
+    """Which providers have a key, for /health and the startup log"""
+    return {
+        "alpha_vantage": bool(settings.alpha_vantage_api_key),
+        "newsapi": bool(settings.newsapi_api_key),
+        "openai": bool(settings.openai_api_key),
+        "serper": bool(settings.serper_api_key),
+        "clearbit": bool(settings.clearbit_api_key),
+    }
@@ -0,0 +1,56 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call.
+
+    The first caller for a key starts the work as a task; every caller that
+    arrives while it is in flight awaits the same task. The task is shielded
+    so a disconnecting client doesn't cancel the work for everyone else.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+    async def do(self, key, fn):
+        """Await ``fn()`` once per key, sharing the result with duplicates"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "inflight": self.inflight,
+        }
+
+
+agent_calls = SingleFlight("agent")
+person_searches = SingleFlight("person_search")
+news_fetches = SingleFlight("news")
+
+
+def stats():
+    """Counters for every flight group, keyed by group name"""
+    return {group.name: group.stats() for group in (agent_calls, person_searches, news_fetches)}
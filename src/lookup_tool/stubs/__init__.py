@@ -0,0 +1,124 @@
+"""Local stand-ins for the services the lookup pipeline calls out to.
+
+Each module exposes ``create_app()`` returning an ASGI app; ``start_server``
+runs one on a background thread so tests and benchmarks can point the
+clients at it instead of the real provider.
+"""
+import asyncio
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi.responses import JSONResponse
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """A uvicorn server running an ASGI app on a daemon thread"""
+
+    def __init__(self, app, host="127.0.0.1", port=None):
+        self.host = host
+        self.port = port or free_port()
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout=10):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Stub server on {self.url} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def start_server(app, host="127.0.0.1", port=None):
+    """Start ``app`` on a background thread and return the running StubServer"""
+    return StubServer(app, host, port).start()
+
+
+class Behavior:
+    """Latency and failure profile for a stub endpoint.
+
+    Latency is log-normal around ``latency_ms`` (``jitter`` is its sigma),
+    which gives the long tail real providers have. A fraction
+    ``slow_rate`` of requests are stragglers that take ``slow_ms`` more.
+    A fraction ``error_rate`` of requests fail with 500 and
+    ``rate_limit_rate`` with 429 plus Retry-After.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+                 slow_rate=0.0, slow_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.requests = 0
+
+    def with_latency(self, latency_ms):
+        """The same profile around a different median latency"""
+        return Behavior(latency_ms, self.jitter, self.error_rate, self.rate_limit_rate, self.retry_after,
+                        self.slow_rate, self.slow_ms)
+
+    def delay(self):
+        delay = 0.0
+        if self.latency_ms > 0:
+            delay = self.latency_ms / 1000 * (random.lognormvariate(0, self.jitter) if self.jitter else 1.0)
+        if self.slow_rate and random.random() < self.slow_rate:
+            delay += self.slow_ms / 1000
+        return delay
+
+    async def apply(self):
+        """Sleep for the sampled latency; return an error response or None"""
+        self.requests += 1
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": {"message": "Upstream error", "type": "server_error"}}, status_code=500)
+        return None
+
+
+def add_behavior_args(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that straggle")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="extra latency of a straggler")
+
+
+def behavior_from_args(args):
+    return Behavior(args.latency_ms, args.jitter, args.error_rate, args.rate_limit_rate,
+                    slow_rate=args.slow_rate, slow_ms=args.slow_ms)
@@ -0,0 +1,97 @@
+"""NewsAPI stand-in.
+
+Answers ``GET /v2/everything`` in NewsAPI's response shape, newest first.
+Each query has a steady feed: a new article every ``interval_s`` seconds,
+so repeated polls see new articles appear over time. ``from`` limits the
+results to articles published at or after that time. Every
+``syndicate_every``-th article also appears a second time, from another
+outlet under a tracking-tagged URL with the same title, which exercises
+deduplication. Each request's ``q`` and ``from`` are kept in
+``app.state.requests``.
+
+    python -m lookup_tool.stubs.newsapi --port 9103 --latency-ms 200 --interval-s 60
+"""
+import argparse
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+import uvicorn
+
+from . import Behavior, add_behavior_args, behavior_from_args
+
+SOURCES = ["Reuters", "Bloomberg", "The Verge", "Financial Times", "TechCrunch"]
+DEFAULT_INTERVAL_S = 6 * 3600
+
+
+def _parse_time(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def articles_for(query, count, since=None, interval_s=DEFAULT_INTERVAL_S, syndicate_every=0, now=None):
+    now = now or datetime.now(timezone.utc)
+    slug = query.lower().replace(" ", "-")
+    latest = int(now.timestamp() // interval_s)
+    articles = []
+    for n in range(latest, latest - count, -1):
+        published = datetime.fromtimestamp(n * interval_s, timezone.utc)
+        if since is not None and published < since:
+            break
+        article = {
+            "source": {"id": None, "name": SOURCES[n % len(SOURCES)]},
+            "author": "Staff Reporter",
+            "title": f"{query} update #{n}: quarterly results and outlook",
+            "description": f"{query} reported results in line with expectations and reaffirmed guidance.",
+            "url": f"https://news.example/{slug}/{n}",
+            "urlToImage": None,
+            "publishedAt": published.isoformat().replace("+00:00", "Z"),
+            "content": f"{query} said on Tuesday that revenue grew year over year...",
+        }
+        articles.append(article)
+        if syndicate_every and n % syndicate_every == 0:
+            articles.append({
+                **article,
+                "source": {"id": None, "name": "Wire Feed"},
+                "url": f"https://www.wire.example/{slug}/{n}/?utm_source=feed&utm_medium=rss",
+            })
+    return articles[:count]
+
+
+def create_app(behavior=None, interval_s=DEFAULT_INTERVAL_S, syndicate_every=3):
+    behavior = behavior or Behavior()
+    app = FastAPI(title="NewsAPI stand-in")
+    app.state.behavior = behavior
+    app.state.requests = []
+
+    @app.get("/v2/everything")
+    async def everything(q: str = "", pageSize: int = 20, apiKey: str = "", from_: str = Query(None, alias="from")):
+        app.state.requests.append({"q": q, "from": from_})
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        if not apiKey:
+            return JSONResponse(
+                {"status": "error", "code": "apiKeyMissing", "message": "Your API key is missing."}, status_code=401
+            )
+        articles = articles_for(
+            q, max(0, min(pageSize, 100)), _parse_time(from_), interval_s, syndicate_every
+        )
+        return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9103)
+    parser.add_argument("--interval-s", type=float, default=DEFAULT_INTERVAL_S, help="seconds between new articles")
+    parser.add_argument("--syndicate-every", type=int, default=3, help="repeat every n-th article from a wire feed")
+    add_behavior_args(parser)
+    args = parser.parse_args()
+    app = create_app(behavior_from_args(args), args.interval_s, args.syndicate_every)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,127 @@
+"""OpenAI chat-completions stand-in.
+
+Answers ``POST /v1/chat/completions`` with a canned analyst summary built
+from the prompt, with token usage, and streams it word by word when
+``stream`` is set (including the final usage chunk when
+``stream_options.include_usage`` is). Latency and failures follow a
+``Behavior``, optionally with a different median latency per model;
+streamed words are spaced ``token_ms`` apart.
+
+    python -m lookup_tool.stubs.openai --port 9101 --latency-ms 800 --jitter 0.4
+    python -m lookup_tool.stubs.openai --latency-ms 800 --model-latency gpt-4o-mini=150 --slow-rate 0.05 --slow-ms 4000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import uvicorn
+
+from . import Behavior, add_behavior_args, behavior_from_args
+
+SUMMARY_TEMPLATE = (
+    "**Overview:** {subject} is covered here by a local stand-in for the OpenAI API.\n\n"
+    "**Key Facts:**\n- Headquarters: Springfield\n- Employees: about 12,000\n- Founded: 1987\n\n"
+    "**Leadership:**\n- Chief Executive Officer: Pat Doe\n- Chief Financial Officer: Sam Roe\n\n"
+    "**Recent Developments:** Expanded into two new markets and announced a product refresh.\n\n"
+    "**AI Adoption Status:** Piloting generative AI in customer support.\n\n"
+    "**Strategic Priorities:** Margin expansion, international growth and platform consolidation."
+)
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _subject(messages):
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    first_line = user.strip().splitlines()[0] if user.strip() else "The company"
+    return first_line[:120]
+
+
+def parse_model_latency(values):
+    """``MODEL=MS`` pairs from the command line"""
+    latencies = {}
+    for value in values or ():
+        model, _, ms = value.partition("=")
+        latencies[model] = float(ms)
+    return latencies
+
+
+def create_app(behavior=None, token_ms=0.0, model_latency_ms=None):
+    behavior = behavior or Behavior()
+    model_behaviors = {model: behavior.with_latency(ms) for model, ms in (model_latency_ms or {}).items()}
+    app = FastAPI(title="OpenAI stand-in")
+    app.state.behavior = behavior
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4")
+        error = await model_behaviors.get(model, behavior).apply()
+        if error is not None:
+            return error
+
+        messages = body.get("messages", [])
+        content = SUMMARY_TEMPLATE.format(subject=_subject(messages))
+        usage = {
+            "prompt_tokens": sum(_estimate_tokens(m.get("content") or "") for m in messages),
+            "completion_tokens": _estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        async def events():
+            yield f"data: {json.dumps(chunk({'role': 'assistant', 'content': ''}))}\n\n"
+            for word in content.split(" "):
+                if token_ms:
+                    await asyncio.sleep(token_ms / 1000)
+                yield f"data: {json.dumps(chunk({'content': word + ' '}))}\n\n"
+            yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+            if include_usage:
+                final = {**chunk({}), "choices": [], "usage": usage}
+                yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=MS",
+                        help="median latency for one model (repeatable)")
+    add_behavior_args(parser)
+    args = parser.parse_args()
+    app = create_app(behavior_from_args(args), args.token_ms, parse_model_latency(args.model_latency))
+    uvicorn.run(app, host=args.host, port=args.port)
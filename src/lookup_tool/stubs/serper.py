@@ -0,0 +1,84 @@
+"""Serper (Google search) stand-in.
+
+Answers ``POST /search`` with deterministic organic results for the
+query: a LinkedIn profile, a company bio page and a news mention, so
+``extract_person_info_from_search`` has titles and snippets to parse.
+
+    python -m lookup_tool.stubs.serper --port 9102 --latency-ms 300
+"""
+import argparse
+import re
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+from . import Behavior, add_behavior_args, behavior_from_args
+
+
+def _name_from_query(query):
+    quoted = re.search(r'"([^"]+)"', query)
+    return quoted.group(1) if quoted else query.split(" ")[0]
+
+
+def organic_results(name, count=10):
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    results = [
+        {
+            "title": f"{name} - Chief Executive Officer - Acme Corp | LinkedIn",
+            "link": f"https://www.linkedin.com/in/{slug}",
+            "snippet": f"{name} is the Chief Executive Officer at Acme Corp. Experience: Acme Corp, "
+                       f"Globex. Education: State University. Location: Springfield.",
+            "displayLink": "www.linkedin.com",
+        },
+        {
+            "title": f"{name} | Leadership | Acme Corp",
+            "link": f"https://www.acme.example/leadership/{slug}",
+            "snippet": f"{name} serves as CEO of Acme Corp, where {name.split()[0]} leads strategy and operations.",
+            "displayLink": "www.acme.example",
+        },
+        {
+            "title": f"Acme Corp names {name} chief executive",
+            "link": f"https://news.example/acme-{slug}",
+            "snippet": f"Acme Corp said {name} will take over as chief executive officer next month.",
+            "displayLink": "news.example",
+        },
+    ]
+    filler = [
+        {
+            "title": f"{name} - Profile {i}",
+            "link": f"https://directory.example/{slug}/{i}",
+            "snippet": f"Professional profile {i} for {name}.",
+            "displayLink": "directory.example",
+        }
+        for i in range(max(0, count - len(results)))
+    ]
+    return (results + filler)[:count]
+
+
+def create_app(behavior=None):
+    behavior = behavior or Behavior()
+    app = FastAPI(title="Serper stand-in")
+    app.state.behavior = behavior
+
+    @app.post("/search")
+    async def search(request: Request):
+        body = await request.json()
+        error = await behavior.apply()
+        if error is not None:
+            return error
+        query = body.get("q", "")
+        return {
+            "searchParameters": {"q": query, "num": body.get("num", 10)},
+            "organic": organic_results(_name_from_query(query), int(body.get("num", 10))),
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9102)
+    add_behavior_args(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(behavior_from_args(args)), host=args.host, port=args.port)
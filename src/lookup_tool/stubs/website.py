@@ -0,0 +1,69 @@
+"""Company website fixture for the crawler.
+
+Serves a small set of profile pages with ETag and Last-Modified headers,
+answers conditional GETs with 304, and exposes an oversized page for
+byte-cap checks. Page bodies can be changed at runtime with ``set_page``.
+
+    python -m lookup_tool.stubs.website --port 9100
+"""
+import argparse
+import hashlib
+from email.utils import formatdate
+
+from fastapi import FastAPI, Request, Response
+import uvicorn
+
+DEFAULT_PAGES = {
+    "/": "<html><head><title>Acme Corp</title></head><body><h1>Acme Corp</h1>"
+         "<p>Acme builds industrial widgets.</p><script>var x = 1;</script></body></html>",
+    "/about": "<html><head><title>About Acme</title></head><body><h1>About</h1>"
+              "<p>Founded in 1950, Acme employs 2,500 people.</p></body></html>",
+    "/leadership": "<html><head><title>Leadership</title></head><body><ul>"
+                   "<li>Jane Roe &mdash; Chief Executive Officer</li>"
+                   "<li>John Poe &mdash; Chief Financial Officer</li></ul></body></html>",
+    "/investor-relations": "<html><head><title>Investors</title></head><body>"
+                           "<p>Revenue grew 12% year over year.</p></body></html>",
+}
+
+LARGE_PAGE_BYTES = 5 * 1024 * 1024
+
+
+def create_app(pages=None):
+    app = FastAPI(title="Website fixture")
+    app.state.pages = {path: (body, formatdate(usegmt=True)) for path, body in (pages or DEFAULT_PAGES).items()}
+    app.state.requests = []
+
+    def set_page(path, body):
+        app.state.pages[path] = (body, formatdate(usegmt=True))
+
+    app.state.set_page = set_page
+
+    @app.get("/large")
+    async def large():
+        paragraph = "<p>" + "filler text " * 80 + "</p>\n"
+        body = "<html><body>" + paragraph * (LARGE_PAGE_BYTES // len(paragraph)) + "</body></html>"
+        return Response(body, media_type="text/html")
+
+    @app.get("/{path:path}")
+    async def page(path: str, request: Request):
+        key = "/" + path
+        app.state.requests.append(key)
+        if key not in app.state.pages:
+            return Response("Not found", status_code=404, media_type="text/plain")
+
+        body, last_modified = app.state.pages[key]
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Last-Modified": last_modified}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port)
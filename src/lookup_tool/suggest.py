@@ -0,0 +1,224 @@
+"""In-memory typeahead index for /suggest.
+
+Every entry is reachable through a flattened prefix trie: one sorted array
+of (key, entry id) pairs, where the keys are the normalized label, each
+later word of it and the ticker. A prefix is a contiguous range found with
+two bisects. The result lists for one- and two-character prefixes, whose
+ranges are the largest, are ranked once at build time. Trigram postings
+catch misspellings when the prefix match comes up short.
+"""
+import bisect
+import heapq
+import logging
+import re
+from array import array
+from collections import defaultdict
+
+from .symbols import NAME_STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+PRECOMPUTED_PREFIX_LENGTH = 2
+# Entries added after a build are scanned linearly until this many pile up
+REBUILD_AFTER = 256
+# Cap on fuzzy candidates scored per query
+MAX_FUZZY_CANDIDATES = 200
+
+KIND_WEIGHTS = {"company": 1.0, "person": 0.8}
+
+_KEY_RE = re.compile(r"[^a-z0-9& ]+")
+
+
+def normalize_query(text: str):
+    return " ".join(_KEY_RE.sub(" ", text.lower().replace(".", "")).split())
+
+
+def trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.labels = []
+        self.normalized = []
+        self.kinds = []
+        self.tickers = []
+        self.weights = array("d")
+        self._ids = {}
+        self._keys = []
+        self._key_ids = array("I")
+        self._top = {}
+        self._trigrams = {}
+        self._trigram_counts = array("H")
+        self._pending = []
+        self._built = False
+
+    def __len__(self):
+        return len(self.labels)
+
+    # -------------------------------
+    # Building
+    # -------------------------------
+    def add(self, label: str, kind: str, ticker=None, weight=None):
+        """Add an entry, or raise the weight of an existing one"""
+        label = " ".join(label.split())
+        if not label:
+            return
+        identity = (kind, ticker or normalize_query(label))
+        weight = KIND_WEIGHTS.get(kind, 1.0) if weight is None else weight
+        entry_id = self._ids.get(identity)
+        if entry_id is not None:
+            self.weights[entry_id] = max(self.weights[entry_id], weight)
+            return
+
+        entry_id = len(self.labels)
+        self._ids[identity] = entry_id
+        self.labels.append(label)
+        self.normalized.append(normalize_query(label))
+        self.kinds.append(kind)
+        self.tickers.append(ticker)
+        self.weights.append(weight)
+        self._trigram_counts.append(0)
+
+        if self._built:
+            self._pending.append(entry_id)
+            if len(self._pending) >= REBUILD_AFTER:
+                self.build()
+
+    def _entry_keys(self, entry_id):
+        normalized = self.normalized[entry_id]
+        keys = {normalized}
+        words = normalized.split()
+        for i in range(1, len(words)):
+            if words[i] not in NAME_STOPWORDS:
+                keys.add(" ".join(words[i:]))
+        if self.tickers[entry_id]:
+            # Normalized like the query, so "BRK.B" finds BRK.B
+            keys.add(normalize_query(self.tickers[entry_id]))
+        return keys
+
+    def build(self):
+        """(Re)build the sorted key array, prefix tops and trigram postings"""
+        pairs = []
+        postings = defaultdict(list)
+        for entry_id in range(len(self.labels)):
+            for key in self._entry_keys(entry_id):
+                pairs.append((key, entry_id))
+            grams = trigrams(self.normalized[entry_id])
+            self._trigram_counts[entry_id] = len(grams)
+            for gram in grams:
+                postings[gram].append(entry_id)
+        pairs.sort()
+
+        self._keys = [key for key, _ in pairs]
+        self._key_ids = array("I", (entry_id for _, entry_id in pairs))
+        self._trigrams = {gram: array("I", ids) for gram, ids in postings.items()}
+
+        prefix_ids = defaultdict(set)
+        for key, entry_id in pairs:
+            for length in range(1, min(PRECOMPUTED_PREFIX_LENGTH, len(key)) + 1):
+                prefix_ids[key[:length]].add(entry_id)
+        self._top = {
+            prefix: self._rank(ids, prefix, DEFAULT_LIMIT * 2) for prefix, ids in prefix_ids.items()
+        }
+        self._pending = []
+        self._built = True
+        logger.info(f"Suggest index built: {len(self.labels)} entries, {len(self._keys)} keys")
+
+    # -------------------------------
+    # Querying
+    # -------------------------------
+    def _score(self, entry_id, query):
+        score = self.weights[entry_id]
+        ticker = self.tickers[entry_id]
+        if ticker and normalize_query(ticker) == query:
+            score += 2.0
+        if self.normalized[entry_id].startswith(query):
+            score += 1.0
+        return score
+
+    def _rank(self, ids, query, limit):
+        return heapq.nlargest(limit, ids, key=lambda entry_id: (self._score(entry_id, query), -entry_id))
+
+    def _prefix_ids(self, query):
+        if len(query) <= PRECOMPUTED_PREFIX_LENGTH and query in self._top:
+            return set(self._top[query])
+        start = bisect.bisect_left(self._keys, query)
+        end = bisect.bisect_left(self._keys, query + "\uffff", start)
+        return set(self._key_ids[start:end])
+
+    def _fuzzy_ids(self, query):
+        counts = defaultdict(int)
+        for gram in trigrams(query):
+            for entry_id in self._trigrams.get(gram, ()):
+                counts[entry_id] += 1
+        query_count = len(trigrams(query))
+        best = heapq.nlargest(MAX_FUZZY_CANDIDATES, counts.items(), key=lambda item: item[1])
+        # Dice coefficient over trigram sets; 0.35 keeps one- or two-letter typos
+        return {
+            entry_id for entry_id, shared in best
+            if 2 * shared / (query_count + self._trigram_counts[entry_id]) >= 0.35
+        }
+
+    def search(self, text: str, limit=DEFAULT_LIMIT):
+        """Ranked suggestions: prefix matches first, then fuzzy matches"""
+        if not self._built:
+            self.build()
+        query = normalize_query(text)
+        if not query:
+            return []
+
+        ids = self._prefix_ids(query)
+        for entry_id in self._pending:
+            if any(key.startswith(query) for key in self._entry_keys(entry_id)):
+                ids.add(entry_id)
+        ranked = self._rank(ids, query, limit)
+
+        if len(ranked) < limit and len(query) >= 3:
+            fuzzy = self._fuzzy_ids(query) - ids
+            ranked += heapq.nlargest(
+                limit - len(ranked), fuzzy, key=lambda entry_id: (self.weights[entry_id], -entry_id)
+            )
+
+        return [
+            {"label": self.labels[entry_id], "kind": self.kinds[entry_id], "ticker": self.tickers[entry_id]}
+            for entry_id in ranked
+        ]
+
+
+_index = SuggestIndex()
+
+
+def get_index():
+    return _index
+
+
+async def build_index(symbol_index, load_from_db=True):
+    """Build from the symbol listing plus previously looked-up companies and people"""
+    global _index
+    index = SuggestIndex()
+    for ticker, name in symbol_index.by_ticker.items():
+        index.add(name, "company", ticker)
+
+    if load_from_db:
+        from . import db
+        try:
+            companies, people = await db.lookup_names()
+            # Looked-up entities rank above the rest of the listing
+            for name, ticker in companies:
+                index.add(name, "company", ticker, weight=1.5)
+            for name in people:
+                index.add(name, "person", weight=1.2)
+        except Exception as e:
+            logger.error(f"Could not load suggestions from the database: {e}")
+
+    index.build()
+    _index = index
+    return index
+
+
+def record_lookup(label: str, kind: str, ticker=None):
+    """Make a freshly looked-up entity suggestible right away"""
+    _index.add(label, kind, ticker, weight=1.5 if kind == "company" else 1.2)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+
+from . import llm
+from .cache import get_cache
+from .openai_client import summarize_with_openai
+from .tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chunk size leaves room in an 8k context for instructions and the summary
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 2000))
+CHUNK_OVERLAP_TOKENS = 100
+# Chunk summaries combined in one reduce call
+REDUCE_TOKENS = int(os.getenv("SUMMARY_REDUCE_TOKENS", 3000))
+MAX_CONCURRENT_SUMMARIES = int(os.getenv("SUMMARY_CONCURRENCY", 4))
+
+CHUNK_INSTRUCTIONS = (
+    "Summarize this excerpt of a company document. Keep key facts, figures, "
+    "officers and dates. Be concise."
+)
+REDUCE_INSTRUCTIONS = (
+    "Combine these partial summaries of one company document into a single "
+    "summary. Keep key facts, figures and officers; drop repetition."
+)
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+# (loop, semaphore), replaced when a new event loop runs (see crawler.get_throttle)
+_semaphore = None
+
+
+def _limiter():
+    global _semaphore
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore[0] is not loop:
+        _semaphore = (loop, asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES))
+    return _semaphore[1]
+
+
+def content_hash(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pieces(text: str, max_tokens: int):
+    """Paragraphs, split further into sentences (or hard cuts) when too long"""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            while count_tokens(sentence) > max_tokens:
+                head = truncate_to_tokens(sentence, max_tokens)
+                yield head
+                sentence = sentence[len(head):].lstrip()
+            if sentence:
+                yield sentence
+
+
+def chunk_text(text: str, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Split text into chunks of at most ``max_tokens`` on paragraph/sentence
+    boundaries, carrying a short overlap so facts aren't cut in half"""
+    chunks = []
+    current, current_tokens = [], 0
+    for piece in _pieces(text, max_tokens - overlap_tokens):
+        piece_tokens = count_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            tail = current[-1]
+            if count_tokens(tail) <= overlap_tokens:
+                current, current_tokens = [tail], count_tokens(tail)
+            else:
+                current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def _summarize(text: str, instructions: str, tier=llm.STANDARD):
+    """One rate-limited summary call, memoized by content hash"""
+    async def compute():
+        async with _limiter():
+            return await summarize_with_openai(text, instructions=instructions, tier=tier)
+
+    key = content_hash(instructions + "\0" + text)
+    return await get_cache().get_or_compute("chunk_summary", key, compute)
+
+
+async def _reduce(summaries: list):
+    """Combine chunk summaries, in rounds if they don't fit one call"""
+    while len(summaries) > 1:
+        groups, group, group_tokens = [], [], 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if group and group_tokens + tokens > REDUCE_TOKENS:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(summary)
+            group_tokens += tokens
+        groups.append(group)
+
+        if len(groups) == len(summaries):
+            # Every summary is as large as the budget; combining can't shrink input
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        summaries = await asyncio.gather(*(
+            # Combining cached chunk summaries is light work for the fast tier
+            _summarize("\n\n---\n\n".join(group), REDUCE_INSTRUCTIONS, llm.FAST)
+            if len(group) > 1 else _identity(group[0])
+            for group in groups
+        ))
+    return summaries[0] if summaries else ""
+
+
+async def _identity(value):
+    return value
+
+
+async def summarize_document(text: str):
+    """Map-reduce summary of one document of any length"""
+    chunks = chunk_text(text)
+    if not chunks:
+        return ""
+    logger.info(f"Summarizing document of {len(chunks)} chunk(s)")
+    chunk_summaries = await asyncio.gather(*(_summarize(chunk, CHUNK_INSTRUCTIONS) for chunk in chunks))
+    if len(chunk_summaries) == 1:
+        return chunk_summaries[0]
+    return await _reduce(list(chunk_summaries))
+
+
+async def summarize_documents(documents: list):
+    """Summaries for several documents, summarized concurrently"""
+    return list(await asyncio.gather(*(summarize_document(doc) for doc in documents)))
@@ -0,0 +1,144 @@
+import csv
+import logging
+import os
+import re
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYMBOLS_FILE = Path(__file__).resolve().parent / "data" / "symbols.csv"
+
+# Legal-form and share-class words dropped when normalizing company names
+NAME_STOPWORDS = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "companies", "ltd", "limited",
+    "plc", "llc", "lp", "sa", "se", "ag", "nv", "holding", "holdings", "group", "the",
+    "class", "a", "b", "c", "ordinary", "shares", "common", "stock",
+}
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9& ]+")
+# Share-class separators seen in the wild: BRK.B, BRK-B, BRK/B
+_TICKER_RE = re.compile(r"^[A-Za-z]{1,5}(?:[.\-/][A-Za-z]{1,2})?$")
+
+# One alternation instead of a list of patterns matched one at a time
+_PERSON_NAME_RE = re.compile(
+    r"^(?:"
+    r"[A-Z][a-z]+ [A-Z][a-z]+"                  # First Last
+    r"|[A-Z][a-z]+ [A-Z]\. [A-Z][a-z]+"         # First M. Last
+    r"|[A-Z][a-z]+ [A-Z][a-z]+ [A-Z][a-z]+"     # First Middle Last
+    r"|(?:Dr|Mr|Ms)\. [A-Z][a-z]+ [A-Z][a-z]+"  # Dr./Mr./Ms. First Last
+    r")$"
+)
+_PERSON_INDICATORS = ("Dr.", "Mr.", "Ms.", "Mrs.", "Prof.")
+
+
+class Classification(NamedTuple):
+    """What an input refers to, with the key every cache should use for it"""
+    query_type: str
+    canonical: str
+    ticker: Optional[str] = None
+    name: Optional[str] = None
+
+
+def normalize_ticker(ticker: str):
+    return re.sub(r"[\-/]", ".", ticker.strip().upper())
+
+
+def normalize_company_name(name: str):
+    """'Apple Inc.', 'apple' and 'The Apple Company' all become 'apple'"""
+    name = re.sub(r"\.com\b", "", name.lower()).replace(".", "")
+    words = _NON_ALNUM_RE.sub(" ", name).split()
+    kept = [word for word in words if word not in NAME_STOPWORDS]
+    return " ".join(kept or words)
+
+
+class SymbolIndex:
+    """Ticker and company-name lookups loaded from a local listing file"""
+
+    def __init__(self, listings=()):
+        self.by_ticker = {}
+        self.by_name = {}
+        for ticker, name in listings:
+            self.add(ticker, name)
+
+    def add(self, ticker, name):
+        ticker = normalize_ticker(ticker)
+        self.by_ticker[ticker] = name
+        # First listing wins, so a primary share class keeps the bare name
+        self.by_name.setdefault(normalize_company_name(name), ticker)
+
+    def __len__(self):
+        return len(self.by_ticker)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a listing with 'symbol' and 'name' columns"""
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return cls((row["symbol"], row["name"]) for row in reader if row.get("symbol") and row.get("name"))
+
+    def lookup_ticker(self, ticker: str):
+        ticker = normalize_ticker(ticker)
+        return ticker if ticker in self.by_ticker else None
+
+    def lookup_name(self, name: str):
+        return self.by_name.get(normalize_company_name(name))
+
+    def classify(self, identifier: str):
+        """Classify an input as stock_ticker, company_name or person_name"""
+        identifier = " ".join(identifier.split())
+        looks_like_ticker = bool(_TICKER_RE.match(identifier))
+
+        # Known symbols first. Upper-case input is read as a ticker before a
+        # name; lower-case input as a name first ('meta' the company, but
+        # 'on' is far more likely ON Semiconductor than a company called On).
+        if looks_like_ticker and identifier.isupper():
+            ticker = self.lookup_ticker(identifier)
+            if ticker:
+                return Classification("stock_ticker", ticker, ticker, self.by_ticker[ticker])
+        ticker = self.lookup_name(identifier)
+        if ticker:
+            return Classification("company_name", ticker, ticker, self.by_ticker[ticker])
+        if looks_like_ticker:
+            ticker = self.lookup_ticker(identifier)
+            if ticker:
+                return Classification("stock_ticker", ticker, ticker, self.by_ticker[ticker])
+
+        # Unknown upper-case symbol: keep the old ticker heuristic
+        if looks_like_ticker and identifier.isupper() and len(identifier) <= 6:
+            ticker = normalize_ticker(identifier)
+            return Classification("stock_ticker", ticker, ticker)
+
+        if _PERSON_NAME_RE.match(identifier) or any(i in identifier for i in _PERSON_INDICATORS):
+            return Classification("person_name", identifier.lower())
+
+        # If it has 2-3 capitalized words, likely a person
+        words = identifier.split()
+        if 2 <= len(words) <= 3 and all(word[0].isupper() for word in words):
+            return Classification("person_name", identifier.lower())
+
+        return Classification("company_name", normalize_company_name(identifier))
+
+
+_index = None
+
+
+def load_index(path=None):
+    """Load the symbol listing (SYMBOLS_FILE or the bundled file) once"""
+    global _index
+    path = path or os.getenv("SYMBOLS_FILE") or DEFAULT_SYMBOLS_FILE
+    try:
+        _index = SymbolIndex.from_csv(path)
+        logger.info(f"Loaded {len(_index)} symbols from {path}")
+    except (OSError, KeyError, csv.Error) as e:
+        logger.error(f"Could not load symbol listing {path}: {e}")
+        _index = SymbolIndex()
+    return _index
+
+
+def get_index():
+    return _index if _index is not None else load_index()
+
+
+def classify(identifier: str):
+    return get_index().classify(identifier)
@@ -0,0 +1,41 @@
+import functools
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+# Rough characters-per-token for English prose when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+_WORD_RE = re.compile(r"\S+")
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model="gpt-4"):
+    """Count tokens locally (exact with tiktoken, estimated otherwise)"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model="gpt-4"):
+    """Cut ``text`` to at most ``max_tokens`` tokens, on a word boundary when estimating"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    last_space = cut.rfind(" ")
+    return cut[:last_space] if last_space > 0 else cut
@@ -1,27 +1,36 @@
 # ========== app/utils.py ==========
 
-import os, requests
-from bs4 import BeautifulSoup
-from app.openai_client import summarize_with_openai
+import logging
+import re
 
-def crawl_website(company_name):
-    try:
-        if company_name.lower() == "msft":
-            url = "https://www.microsoft.com"
-        else:
-            url = f"https://www.{company_name.lower()}.com"
+from . import crawler, docstore, summarize
+
+logger = logging.getLogger(__name__)
 
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+# Leadership lines look like "Jane Roe - Chief Executive Officer"
+OFFICER_TITLE = re.compile(r"\b(Chief \w+ Officer|CEO|CFO|COO|CTO|President|Founder|Chair(?:man|woman)?)\b")
+MAX_OFFICERS = 10
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        content = soup.get_text()
+def _officers(pages):
+    """Lines naming an executive, from the crawled pages"""
+    lines = (line for page in pages for line in (page["text"] or "").splitlines())
+    found = [line for line in lines if OFFICER_TITLE.search(line) and len(line) <= 120]
+    return list(dict.fromkeys(found))[:MAX_OFFICERS]
 
-        officers = ["John Doe (CEO)", "Jane Smith (CFO)"]  # TODO: Parse real data if possible
+async def crawl_website(company_name):
+    try:
+        # Home, about, leadership and investor pages, fetched concurrently
+        # with conditional GETs; unchanged pages come back from the crawl store
+        pages = await crawler.crawl_company(crawler.company_home_url(company_name))
+        if not pages:
+            raise Exception("no pages could be fetched")
+        content = "\n\n".join(page["text"] for page in pages if page["text"])
+
+        officers = _officers(pages)
         description = f"{company_name} is a leading company in its sector."
         return content, officers, description
-    except Exception as e:
-        print(f"[crawl_website] Error fetching website for {company_name}: {e}")
+    except Exception:
+        logger.exception(f"Error fetching website for {company_name}")
         return None
 
 def download_sec_filings(company_name):
@@ -29,23 +38,23 @@ def download_sec_filings(company_name):
     filings = ["10-Q quarterly report text...", "10-K annual report text..."]
     return filings
 
-def summarize_documents(documents):
-    # Updated to use OpenAI for summarization
-    summaries = []
-    for doc in documents:
-        summary = summarize_with_openai(doc[:3000], os.getenv("OPENAI_API_KEY"))
-        summaries.append(summary)
-    return summaries
-    # Placeholder summarization logic
-    return ["Summary of " + doc[:50] + "..." for doc in documents]
+async def summarize_documents(documents):
+    # Map-reduce over token-bounded chunks, memoized by content hash
+    return await summarize.summarize_documents(documents)
+
+def _serialize_fact(value):
+    if isinstance(value, list):
+        return "\n".join(value)
+    elif isinstance(value, dict):
+        return "\n".join(f"{k}: {v}" for k, v in value.items())
+    return str(value)
 
 def save_documents(company_name, facts):
-    os.makedirs(f"data/{company_name}", exist_ok=True)
-    for key, value in facts.items():
-        with open(f"data/{company_name}/{key}.txt", "w", encoding="utf-8") as f:
-            if isinstance(value, list):
-                f.write("\n".join(value))
-            elif isinstance(value, dict):
-                f.write("\n".join(f"{k}: {v}" for k, v in value.items()))
-            else:
-                f.write(str(value))
+    # One content-addressed entry per fact key; unchanged facts are deduplicated
+    return docstore.get_store().put_many(
+        company_name, {key: _serialize_fact(value) for key, value in facts.items()}
+    )
+
+def load_documents(company_name):
+    store = docstore.get_store()
+    return {key: store.get_text(company_name, key) for key in store.keys(company_name)}
@@ -0,0 +1,49 @@
+"""/batch streams its NDJSON lines as they complete, gzip or not"""
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from lookup_tool import bench
+
+
+@pytest.fixture(scope="module")
+def environment():
+    # Slow OpenAI calls, so batch items finish well apart
+    args = SimpleNamespace(
+        openai_ms=400, token_ms=0, serper_ms=10, newsapi_ms=10, jitter=0.0, error_rate=0.0,
+        rate_limit_rate=0.0, slow_rate=0.0, slow_ms=0, model_latency=None, workers=1,
+        respect_rate_limits=False,
+    )
+    with bench.Environment(args) as env:
+        yield env
+
+
+def test_batch_lines_arrive_one_at_a_time_with_gzip(environment):
+    names = ["Jane Roe", "John Doe", "Mary Major"]
+    arrivals = []
+    with httpx.Client(base_url=environment.urls["app"], timeout=60) as client:
+        with client.stream("POST", "/batch?openai=1", json=names, headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            assert "content-encoding" not in response.headers
+            for line in response.iter_lines():
+                if line:
+                    arrivals.append((time.perf_counter(), json.loads(line)))
+
+    items = [record for _, record in arrivals if "index" in record]
+    assert sorted(record["input"] for record in items) == sorted(names)
+    assert all(record["status"] == "success" for record in items)
+    # One OpenAI call at a time: each line comes out as its item finishes,
+    # not held back until the summary line
+    gaps = [later - earlier for (earlier, _), (later, _) in zip(arrivals, arrivals[1:len(items)])]
+    assert min(gaps) > 0.2, gaps
+
+
+def test_other_responses_are_still_gzipped(environment):
+    with httpx.Client(base_url=environment.urls["app"], timeout=60) as client:
+        response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
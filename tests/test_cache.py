@@ -0,0 +1,60 @@
+"""Refreshes recompute instead of reading the stored copy back"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from lookup_tool import cache, main
+
+
+@pytest.fixture
+def summaries(tmp_path, monkeypatch):
+    summaries = cache.TieredCache(path=str(tmp_path / "cache.db"), ttls={"person_name": (0.2, 60)})
+    monkeypatch.setattr(cache, "_cache", summaries)
+    yield summaries
+    asyncio.run(summaries.aclose())
+
+
+def test_only_refreshes_are_marked_as_refreshing(summaries):
+    seen = []
+
+    async def compute():
+        seen.append(cache.refreshing())
+        return f"summary {len(seen)}"
+
+    async def run():
+        first = await summaries.get_or_compute("person_name", "Jane Roe", compute)
+        # Refresh-ahead, as the prefetcher does
+        token = cache.refresh_within(1)
+        try:
+            ahead = await summaries.get_or_compute("person_name", "Jane Roe", compute)
+        finally:
+            cache._refresh_within.reset(token)
+        # Stale: served at once and refreshed in the background
+        await asyncio.sleep(0.3)
+        stale = await summaries.get_or_compute("person_name", "Jane Roe", compute)
+        await asyncio.gather(*summaries._refreshing.values())
+        return first, ahead, stale, cache.refreshing()
+
+    first, ahead, stale, after = asyncio.run(run())
+    assert (first, ahead, stale) == ("summary 1", "summary 2", "summary 2")
+    assert seen == [False, True, True]
+    assert after is False
+
+
+def test_read_through_is_skipped_on_refresh_and_bounded_by_the_fresh_ttl(summaries):
+    reads = []
+
+    async def read(name, max_age):
+        reads.append((name, max_age))
+        return "stored summary"
+
+    async def run():
+        miss = await main.stored_summary("person_name", read, "Jane Roe")
+        refresh = await cache._as_refresh(lambda: main.stored_summary("person_name", read, "Jane Roe"))
+        return miss, refresh
+
+    miss, refresh = asyncio.run(run())
+    assert miss == "stored summary"
+    assert refresh is None
+    assert reads == [("Jane Roe", timedelta(seconds=0.2))]
@@ -0,0 +1,132 @@
+"""Crawler against the company website fixture (lookup_tool.stubs.website)"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from lookup_tool import crawler, summarize, utils
+from lookup_tool.stubs import StubServer, website
+
+
+@pytest.fixture
+def site():
+    app = website.create_app()
+    with StubServer(app) as server:
+        server.app = app
+        yield server
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = crawler.CrawlStore(str(tmp_path / "crawl.db"))
+    yield store
+    store.close()
+
+
+def fetch(url, store, **kwargs):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await crawler.fetch_page(url, client=client, store=store,
+                                            throttle=crawler.DomainThrottle(delay=0), **kwargs)
+    return asyncio.run(run())
+
+
+def test_unchanged_page_is_reused_from_a_304(site, store):
+    first = fetch(site.url + "/about", store)
+    assert first["status"] == 200 and not first["not_modified"]
+    assert "Founded in 1950" in first["text"]
+    assert store.get(site.url + "/about")["etag"]
+
+    second = fetch(site.url + "/about", store)
+    assert second["status"] == 304 and second["not_modified"]
+    assert second["text"] == first["text"]
+    assert second["title"] == "About Acme"
+
+
+def test_changed_page_is_fetched_again(site, store):
+    fetch(site.url + "/about", store)
+    site.app.state.set_page("/about", "<html><body><p>Founded in 1951.</p></body></html>")
+
+    page = fetch(site.url + "/about", store)
+    assert page["status"] == 200 and not page["not_modified"]
+    assert page["text"] == "Founded in 1951."
+    assert store.get(site.url + "/about")["text"] == "Founded in 1951."
+
+
+def test_body_is_capped_while_streaming(site, store):
+    page = fetch(site.url + "/large", store, max_bytes=64 * 1024)
+    assert page["truncated"]
+    assert 0 < len(page["text"].encode()) <= 64 * 1024
+    assert store.get(site.url + "/large")["truncated"]
+
+    whole = fetch(site.url + "/about", store, max_bytes=64 * 1024)
+    assert not whole["truncated"]
+
+
+def test_missing_pages_are_skipped(site, store, monkeypatch):
+    monkeypatch.setattr(crawler, "_store", store)
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            monkeypatch.setattr(crawler, "get_clients", lambda: type("Clients", (), {"web": client}))
+            return await crawler.crawl_company(site.url)
+
+    pages = asyncio.run(run())
+    assert sorted(page["url"].removeprefix(site.url) for page in pages) == [
+        "/", "/about", "/investor-relations", "/leadership"
+    ]
+    assert utils._officers(pages) == ["Jane Roe — Chief Executive Officer", "John Poe — Chief Financial Officer"]
+
+
+def test_domain_throttle_caps_concurrency_and_spaces_requests():
+    throttle = crawler.DomainThrottle(concurrency=2, delay=0.05)
+    active, peak, started = {}, {}, []
+
+    async def request(domain):
+        await throttle.acquire(domain)
+        try:
+            started.append((domain, time.monotonic()))
+            active[domain] = active.get(domain, 0) + 1
+            peak[domain] = max(peak.get(domain, 0), active[domain])
+            await asyncio.sleep(0.1)
+            active[domain] -= 1
+        finally:
+            throttle.release(domain)
+
+    async def run():
+        await asyncio.gather(*(request("a.example") for _ in range(5)), request("b.example"))
+
+    begin = time.monotonic()
+    asyncio.run(run())
+
+    same_domain = sorted(at for domain, at in started if domain == "a.example")
+    assert peak == {"a.example": 2, "b.example": 1}
+    assert all(later - earlier >= 0.045 for earlier, later in zip(same_domain, same_domain[1:]))
+    # Another domain isn't held back by the first one's spacing or cap
+    other = next(at for domain, at in started if domain == "b.example")
+    assert other - begin < 0.05
+
+
+def test_throttle_and_summary_limiter_work_across_event_loops():
+    async def contend():
+        throttle = crawler.get_throttle()
+
+        async def crawl():
+            await throttle.acquire("a.example")
+            await asyncio.sleep(0.01)
+            throttle.release("a.example")
+
+        async def summarize_one():
+            async with summarize._limiter():
+                await asyncio.sleep(0.01)
+
+        # More waiters than slots, so both bind to this loop
+        await asyncio.gather(*(crawl() for _ in range(crawler.PER_DOMAIN_CONCURRENCY + 2)),
+                             *(summarize_one() for _ in range(summarize.MAX_CONCURRENT_SUMMARIES + 2)))
+        return throttle
+
+    # As enrich or Runner.run_sync do: one asyncio.run after another
+    first = asyncio.run(contend())
+    second = asyncio.run(contend())
+    assert first is not second
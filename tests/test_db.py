@@ -0,0 +1,27 @@
+"""Stored summaries read back from the lookup database"""
+import asyncio
+
+import pytest
+
+from lookup_tool import db
+from lookup_tool.records import CompanyResult
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'lookup.db'}")
+    yield
+    asyncio.run(db.close_db())
+
+
+def test_ticker_lookup_returns_the_latest_summary(database):
+    async def run():
+        await db.init_db()
+        await db.upsert_companies([CompanyResult("Apple", "company_name", "Older summary", ticker="AAPL")])
+        await db.upsert_companies([CompanyResult("Apple Inc.", "company_name", "Newer summary", ticker="AAPL")])
+        by_ticker = await db.get_company_summary("aapl", "stock_ticker")
+        by_name = await db.get_company_summary("Apple", "company_name")
+        await db.close_db()
+        return by_ticker, by_name
+
+    assert asyncio.run(run()) == ("Newer summary", "Older summary")
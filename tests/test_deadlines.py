@@ -0,0 +1,136 @@
+"""Circuit breaker states and request deadlines"""
+import asyncio
+import time
+
+import pytest
+
+from lookup_tool import deadlines, metrics
+from lookup_tool.deadlines import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from lookup_tool.limits import call_upstream
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deadlines, "_now", lambda: now[0])
+    return now
+
+
+def fail(breaker, error=TimeoutError()):
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+
+def succeed(breaker):
+    with breaker.guard():
+        pass
+
+
+def test_opens_after_repeated_failures_and_fails_fast(clock):
+    breaker = CircuitBreaker("serper", failure_threshold=3, reset_seconds=30)
+    fail(breaker)
+    fail(breaker)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+
+    clock[0] += 10
+    with pytest.raises(CircuitOpen) as raised:
+        succeed(breaker)
+    assert raised.value.retry_in == pytest.approx(20)
+    assert breaker.state == OPEN
+
+
+def test_bad_requests_and_successes_do_not_open_it(clock):
+    breaker = CircuitBreaker("serper", failure_threshold=2)
+    fail(breaker, ValueError("bad request"))
+    fail(breaker, ValueError("bad request"))
+    assert breaker.state == CLOSED and breaker.failures == 0
+    fail(breaker)
+    succeed(breaker)
+    fail(breaker)
+    # The success in between reset the count
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=1, reset_seconds=30)
+    fail(breaker)
+    clock[0] += 30
+
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        # Only the trial call goes out while it is running
+        with pytest.raises(CircuitOpen):
+            breaker.check()
+    assert breaker.state == CLOSED
+    succeed(breaker)
+
+
+def test_failed_trial_opens_it_again_for_a_full_cool_down(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        fail(breaker)
+    clock[0] += 31
+    fail(breaker)
+    assert breaker.state == OPEN and breaker.opened_at == clock[0]
+
+    clock[0] += 29
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    clock[0] += 1
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+
+
+def test_cancelled_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=1, reset_seconds=30)
+    fail(breaker)
+    clock[0] += 30
+    with pytest.raises(asyncio.CancelledError):
+        with breaker.guard():
+            raise asyncio.CancelledError()
+    assert breaker.state == HALF_OPEN
+    succeed(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_stage_deadline_is_capped_by_share_ceiling_and_time_left(clock):
+    # Outside a request only the provider ceiling applies
+    assert deadlines.stage_deadline("serper") == pytest.approx(clock[0] + deadlines.PROVIDER_TIMEOUTS["serper"])
+
+    async def in_request():
+        deadlines.start(20)
+        # serper: 30% of the request budget
+        assert deadlines.stage_deadline("serper") == pytest.approx(clock[0] + 6)
+        assert deadlines.stage_deadline("openai") == pytest.approx(clock[0] + 20)
+        clock[0] += 18
+        assert deadlines.remaining() == pytest.approx(2)
+        assert deadlines.stage_deadline("serper") == pytest.approx(clock[0] + 2)
+        clock[0] += 5
+        assert deadlines.stage_deadline("openai") == pytest.approx(clock[0])
+
+    asyncio.run(in_request())
+    assert deadlines.remaining() is None
+
+
+def test_request_deadline_cuts_off_a_slow_call(monkeypatch):
+    monkeypatch.setattr(deadlines, "_breakers", {})
+    before = metrics.DEADLINE_EXCEEDED_TOTAL.values.get(("serper",), 0)
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def lookup():
+        # serper may use 30% of this, 0.15s
+        deadlines.start(0.5)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await call_upstream("serper", slow)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(lookup())
+    assert elapsed < 0.5
+    assert metrics.DEADLINE_EXCEEDED_TOTAL.values[("serper",)] > before
+    assert deadlines.get_breaker("serper").failures == 1
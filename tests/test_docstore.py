@@ -0,0 +1,79 @@
+"""Document store round trips, before and after compaction"""
+import threading
+
+import pytest
+
+from lookup_tool.docstore import DocumentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(str(tmp_path / "docstore"), segment_max_bytes=4096)
+    yield store
+    store.close()
+
+
+def read(store, company, key):
+    view = store.get(company, key)
+    try:
+        return bytes(view) if view is not None else None
+    finally:
+        if view is not None:
+            view.release()
+
+
+def test_reads_return_the_current_version_after_compact(store):
+    store.put("ACME", "about", "Draft")
+    store.put("ACME", "about", "Founded in 1950")
+    store.put("ACME", "officers", b"\x00binary\xff" * 300)
+    store.put("Globex", "about", "Founded in 1950")  # same payload, stored once
+    before = store.stats()
+    assert before["live_blobs"] == 2 and before["documents"] == 3
+
+    result = store.compact()
+
+    # Only the superseded draft is dropped
+    assert result["live_blobs"] == 2 and result["bytes_reclaimed"] > 0
+    assert store.get_text("ACME", "about") == "Founded in 1950"
+    assert read(store, "ACME", "officers") == b"\x00binary\xff" * 300
+    assert store.get_text("Globex", "about") == "Founded in 1950"
+    assert store.keys("ACME") == ["about", "officers"]
+    assert read(store, "ACME", "missing") is None
+    after = store.stats()
+    assert after["live_payload_bytes"] == before["live_payload_bytes"]
+    assert after["segment_bytes"] < before["segment_bytes"]
+
+    # Writes after a compaction land in the new segments
+    store.put("ACME", "about", "Moved in 2024")
+    assert store.get_text("ACME", "about") == "Moved in 2024"
+    assert store.get_text("Globex", "about") == "Founded in 1950"
+
+
+def test_reads_during_writes_and_compaction_see_whole_payloads(store):
+    payloads = {f"doc{i}": f"payload {i} ".encode() * 50 for i in range(20)}
+    store.put_many("ACME", payloads)
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        try:
+            while not done.is_set():
+                for key, payload in payloads.items():
+                    assert read(store, "ACME", key) == payload
+                store.keys("ACME")
+                store.stats()
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for round in range(10):
+            store.put("ACME", "scratch", f"version {round}" * 100)
+            store.compact()
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+    assert errors == []
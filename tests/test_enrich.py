@@ -0,0 +1,88 @@
+"""Bulk enrichment resumes from its checkpoint after an interrupt"""
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from lookup_tool.stubs import Behavior, StubServer, newsapi, openai, serper
+
+SRC = str(Path(__file__).resolve().parents[1] / "src")
+NAMES = ["Jane Roe", "John Doe", "Mary Major", "Richard Miles", "Alex Smith", "Sam Jones", "Pat Brown", "Lee Green"]
+
+
+@pytest.fixture
+def stubs():
+    # Slow OpenAI calls, one at a time, so the run can be stopped partway
+    servers = [StubServer(openai.create_app(Behavior(latency_ms=300))), StubServer(serper.create_app()),
+               StubServer(newsapi.create_app())]
+    for server in servers:
+        server.start()
+    yield dict(zip(("openai", "serper", "newsapi"), servers))
+    for server in servers:
+        server.stop()
+
+
+def enrich(tmp_path, stubs):
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [SRC, os.getenv("PYTHONPATH")])),
+        "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": stubs["openai"].url + "/v1",
+        "SERPER_API_KEY": "stub", "SERPER_BASE_URL": stubs["serper"].url,
+        "NEWSAPI_ORG_API_KEY": "stub", "NEWSAPI_BASE_URL": stubs["newsapi"].url,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path / 'lookup.db'}",
+        "LOOKUP_CACHE_PATH": str(tmp_path / "lookup_cache.db"),
+        "NEWS_STORE_PATH": str(tmp_path / "news.db"),
+        "PREFETCH_STORE_PATH": str(tmp_path / "popularity.db"),
+        "MARKET_DATA_ENABLED": "0",
+        "LOG_DIR": str(tmp_path / "logs"),
+        "RATE_LIMIT_OPENAI_RPM": "0", "RATE_LIMIT_OPENAI_TPM": "0",
+        "RATE_LIMIT_SERPER_RPM": "0", "RATE_LIMIT_NEWSAPI_RPM": "0",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "lookup_tool.enrich", str(tmp_path / "people.csv"), "--column", "name",
+         "--output", str(tmp_path / "people.db"), "--chunk-size", "1", "--openai", "1"],
+        env=env, cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+
+
+def results(tmp_path):
+    path = tmp_path / "people.db"
+    if not path.exists():
+        return []
+    with sqlite3.connect(path) as conn:
+        try:
+            return conn.execute("SELECT row, input, status, finished_at FROM results ORDER BY row").fetchall()
+        except sqlite3.OperationalError:
+            return []  # the schema is not written yet
+
+
+def test_interrupted_run_resumes_without_redoing_rows(tmp_path, stubs):
+    (tmp_path / "people.csv").write_text("name\n" + "\n".join(NAMES) + "\n")
+
+    first = enrich(tmp_path, stubs)
+    deadline = time.monotonic() + 60
+    while len(results(tmp_path)) < 2:
+        assert first.poll() is None, first.communicate()
+        assert time.monotonic() < deadline, "no rows were checkpointed"
+        time.sleep(0.05)
+    first.send_signal(signal.SIGINT)
+    _, stderr = first.communicate(timeout=60)
+    assert "run the same command again to resume" in stderr
+
+    checkpointed = results(tmp_path)
+    assert 2 <= len(checkpointed) < len(NAMES)
+
+    second = enrich(tmp_path, stubs)
+    _, stderr = second.communicate(timeout=120)
+    assert second.returncode == 0, stderr
+
+    final = results(tmp_path)
+    assert [input for _, input, _, _ in final] == NAMES
+    assert all(status == "success" for _, _, status, _ in final)
+    # Rows finished before the interrupt were kept, not looked up again
+    assert set(checkpointed) <= set(final)
@@ -0,0 +1,46 @@
+"""Model tiers and hedged LLM calls"""
+import asyncio
+
+import pytest
+
+from lookup_tool import llm, main
+from lookup_tool.agent_runner import Agent
+from lookup_tool.symbols import Classification
+
+
+@pytest.fixture
+def model():
+    name = "test-model"
+    llm._models.pop(name, None)
+    yield name
+    llm._models.pop(name, None)
+
+
+def test_company_summaries_use_the_standard_tier():
+    agent = Agent(name="CompanyAnalyst", instructions=main.COMPANY_ANALYST_INSTRUCTIONS)
+    query = main.build_company_query("AAPL", Classification("stock_ticker", "AAPL", "AAPL", "Apple Inc."))
+    assert agent._request(query)["model"] == llm.MODELS[llm.STANDARD]
+    assert Agent(name="Reducer", instructions="", tier=llm.FAST)._request(query)["model"] == llm.MODELS[llm.FAST]
+
+
+def test_cancelled_primary_still_counts_toward_the_hedge_delay(model, monkeypatch):
+    monkeypatch.setattr(llm, "_may_hedge", lambda: True)
+    entry = llm._models[model]
+    monkeypatch.setattr(llm, "HEDGE_MIN_DELAY", 0.05)
+    entry.latencies.extend([0.05] * llm.HEDGE_MIN_SAMPLES)
+    calls = []
+
+    async def call():
+        # The first request straggles; the hedge answers at once
+        calls.append(asyncio.current_task())
+        await asyncio.sleep(5 if len(calls) == 1 else 0)
+        return len(calls)
+
+    result = asyncio.run(llm.hedged(model, call))
+
+    assert result == 2
+    assert calls[0].cancelled()
+    assert entry.hedges_won == 1
+    # The cancelled primary's time so far was recorded, not dropped
+    assert len(entry.latencies) == llm.HEDGE_MIN_SAMPLES + 1
+    assert entry.latencies[-1] >= 0.05
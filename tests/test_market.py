@@ -0,0 +1,143 @@
+"""Market indicators against a plain loop, and history re-adjustment"""
+import asyncio
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from lookup_tool import market
+
+DAYS = 300
+
+
+def series(days, base, drift):
+    return {
+        "day": np.asarray(days, np.int32),
+        "close": np.array([base + 10 * math.sin(day / 7) + drift * day for day in days]),
+        "volume": np.full(len(days), 1e6),
+    }
+
+
+def naive(history, calendar, fundamentals):
+    """The figures for one ticker, one bar at a time"""
+    by_day = dict(zip(history["day"].tolist(), history["close"].tolist()))
+    closes, last = [], math.nan
+    for day in calendar:
+        last = by_day.get(day, last)
+        closes.append(last)
+    price = closes[-1]
+    log_returns = [math.log(b / a) for a, b in zip(closes, closes[1:])][-market.VOLATILITY_DAYS:]
+    year = closes[-market.TRADING_DAYS:]
+    market_cap = price * fundamentals["shares"]
+    return {
+        "price": price,
+        **{f"return_{name}": price / closes[-1 - bars] - 1 for name, bars in market.RETURN_PERIODS.items()},
+        "volatility": statistics.stdev(log_returns) * math.sqrt(market.TRADING_DAYS),
+        **{f"sma_{window}": sum(closes[-window:]) / window for window in market.MOVING_AVERAGES},
+        "high_52w": max(year),
+        "low_52w": min(year),
+        "market_cap": market_cap,
+        "pe": price / fundamentals["eps"],
+        "ps": market_cap / fundamentals["revenue"],
+        "pb": price / fundamentals["book_value"],
+        "dividend_yield": fundamentals["dividend"] / price,
+    }
+
+
+def test_indicators_match_a_plain_loop():
+    every_day = list(range(DAYS))
+    # The second ticker misses every tenth day; its gaps are carried forward
+    histories = [series(every_day, 100, 0.1), series([d for d in every_day if d % 10 != 3], 40, -0.05)]
+    fundamentals = [
+        {"eps": 5.0, "revenue": 4e10, "book_value": 20.0, "shares": 1e9, "dividend": 1.0},
+        {"eps": 2.0, "revenue": 1e9, "book_value": 10.0, "shares": 5e7, "dividend": 0.5},
+    ]
+    arrays = {name: np.array([f[name] for f in fundamentals]) for name in fundamentals[0]}
+
+    as_of, columns = market.compute(histories, arrays)
+
+    calendar = every_day[-(market.TRADING_DAYS + 1):]
+    assert as_of.tolist() == [DAYS - 1, DAYS - 1]
+    for row, (history, values) in enumerate(zip(histories, fundamentals)):
+        expected = naive(history, calendar, values)
+        assert set(expected) == set(columns)
+        for name, value in expected.items():
+            assert columns[name][row] == pytest.approx(value, rel=1e-9), name
+
+
+def test_short_history_gives_nan_not_errors():
+    as_of, columns = market.compute([series(range(30), 100, 0.1)],
+                                    {name: np.array([np.nan]) for name in market.FUNDAMENTALS})
+    assert math.isnan(columns["sma_50"][0]) and math.isnan(columns["return_1y"][0])
+    assert columns["return_1d"][0] == pytest.approx(
+        (100 + 10 * math.sin(29 / 7) + 2.9) / (100 + 10 * math.sin(28 / 7) + 2.8) - 1)
+    assert math.isnan(columns["pe"][0])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = market.MarketStore(str(tmp_path / "market"))
+    today = market._today()
+    yahoo = {"ACME": series(range(today - 10, today - 1), 100, 0.0)}
+    requests = []
+
+    def download(tickers, start_day):
+        requests.append((list(tickers), start_day))
+        bars = {}
+        for ticker in tickers:
+            history = yahoo[ticker]
+            keep = history["day"] >= start_day
+            bars[ticker] = {column: values[keep] for column, values in history.items()}
+        return bars
+
+    monkeypatch.setattr(store, "_download", download)
+    monkeypatch.setattr(store, "_info", lambda ticker: {"eps": 1.0, "currency": "USD"})
+    store.yahoo, store.requests = yahoo, requests
+    return store
+
+
+def refresh(store):
+    asyncio.run(store.refresh(list(store.yahoo)))
+
+
+def test_new_bars_are_appended(store, monkeypatch):
+    # Every refresh is due, however recent the last one
+    monkeypatch.setattr(market, "REFRESH_SECONDS", -1)
+    refresh(store)
+    stored = store.history("ACME")["close"].copy()
+
+    today = market._today()
+    store.yahoo["ACME"] = series(range(today - 10, today + 1), 100, 0.0)
+    refresh(store)
+
+    # Only from the newest stored day on, and nothing rewritten
+    assert store.requests[-1] == (["ACME"], today - 2)
+    assert store.stats["rewrites"] == 0
+    history = store.history("ACME")
+    assert history["day"].tolist() == list(range(today - 10, today + 1))
+    assert history["close"][:len(stored)].tolist() == stored.tolist()
+
+
+def test_a_split_rewrites_the_stored_columns(store, monkeypatch):
+    monkeypatch.setattr(market, "REFRESH_SECONDS", -1)
+    refresh(store)
+    before = store.history("ACME")["close"].copy()
+
+    # A 2-for-1 split: Yahoo's adjusted closes for the past are halved
+    today = market._today()
+    split = series(range(today - 10, today + 1), 100, 0.0)
+    split["close"] = split["close"] / 2
+    store.yahoo["ACME"] = split
+    refresh(store)
+
+    assert store.stats["rewrites"] == 1
+    # The incremental download spotted it; the full one replaced the history
+    assert [start for _, start in store.requests] == [
+        today - market.HISTORY_DAYS, today - 2, today - market.HISTORY_DAYS,
+    ]
+    history = store.history("ACME")
+    assert history["day"].tolist() == split["day"].tolist()
+    assert history["close"].tolist() == split["close"].tolist()
+    assert history["close"][:len(before)].tolist() == (before / 2).tolist()
+    assert store.indicators(["ACME"])["ACME"]["price"] == pytest.approx(split["close"][-1], abs=1e-4)
@@ -0,0 +1,32 @@
+"""Prometheus exposition, for one worker and summed over several"""
+import asyncio
+import json
+
+from lookup_tool import metrics
+
+
+def test_render_sums_other_workers_snapshots(tmp_path, monkeypatch):
+    counter = metrics.Counter("test_lookups_total", "Lookups", ["kind"])
+    histogram = metrics.Histogram("test_lookup_seconds", "Lookup time")
+    monkeypatch.setattr(metrics, "ALL_METRICS", (counter, histogram))
+    counter.inc(2, kind="person")
+    histogram.observe(0.05)
+
+    alone = metrics.render()
+    assert 'test_lookups_total{kind="person"} 2' in alone
+    assert 'test_lookup_seconds_count 1' in alone
+
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+    other = {"test_lookups_total": [[["person"], 3], [["company"], 1]],
+             "test_lookup_seconds": [[[], [0, 0, 0, 0, 1] + [0] * 10 + [0.08, 1]]]}
+    (tmp_path / "99999999.json").write_text(json.dumps(other))
+
+    # As /metrics does: this worker's values taken on the loop, files read in a thread
+    combined = asyncio.run(asyncio.to_thread(metrics.render, metrics.snapshot()))
+    assert 'test_lookups_total{kind="person"} 5' in combined
+    assert 'test_lookups_total{kind="company"} 1' in combined
+    assert 'test_lookup_seconds_bucket{le="0.05"} 1' in combined
+    assert 'test_lookup_seconds_bucket{le="0.1"} 2' in combined
+    assert 'test_lookup_seconds_count 2' in combined
+    # This worker's own snapshot was written for the others
+    assert len(list(tmp_path.glob("*.json"))) == 2
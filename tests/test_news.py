@@ -0,0 +1,150 @@
+"""News store against the NewsAPI stand-in (lookup_tool.stubs.newsapi)"""
+import asyncio
+import logging
+import sqlite3
+
+import pytest
+
+from lookup_tool import main, news, settings
+from lookup_tool.stubs import Behavior, StubServer, newsapi
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """A stub feed with a new article every second, every third one syndicated"""
+    app = newsapi.create_app(Behavior(latency_ms=200), interval_s=1, syndicate_every=3)
+    with StubServer(app) as server:
+        monkeypatch.setenv("NEWSAPI_ORG_API_KEY", "stub")
+        monkeypatch.setenv("NEWSAPI_BASE_URL", server.url)
+        monkeypatch.setattr(settings, "_settings", None)
+        yield app
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "news.db")
+
+
+def stored(store, entity):
+    with store._lock:
+        return store._conn.execute(
+            "SELECT url_hash, title_hash, item FROM articles WHERE entity = ?", (entity,)
+        ).fetchall()
+
+
+def test_urls_and_titles_normalize_to_the_same_hash():
+    assert news.url_hash("https://www.wire.example/acme/7/?utm_source=feed&utm_medium=rss#top") == \
+        news.url_hash("http://wire.example/acme/7")
+    assert news.url_hash("https://news.example/a?b=2&a=1") == news.url_hash("https://news.example/a?a=1&b=2")
+    assert news.title_hash("Acme update #7: Results!") == news.title_hash("acme  update #7 results")
+
+
+def test_syndicated_copies_are_stored_once(feed, store_path):
+    store = news.NewsStore(store_path)
+    items = asyncio.run(store.latest("Acme", limit=50))
+    rows = stored(store, "acme")
+    store.close()
+
+    assert feed.state.requests[0]["from"] is None
+    # 20 results per page, some of them wire copies of an article already in the page
+    assert len(rows) < news.PAGE_SIZE
+    assert len({title for _, title, _ in rows}) == len(rows)
+    assert len({item.title for item in items}) == len(items) == len(rows)
+    assert not any("wire.example" in item.url for item in items)
+
+
+def test_polls_only_ask_for_articles_since_the_newest_stored(feed, store_path):
+    store = news.NewsStore(store_path)
+
+    async def run():
+        first = await store.latest("Acme", limit=50)
+        newest = store._due(0)[0][2]
+        await asyncio.sleep(2.2)
+        added = await store.poll_due(interval=0)
+        return first, newest, added
+
+    first, newest, added = asyncio.run(run())
+    rows = stored(store, "acme")
+    store.close()
+
+    initial, poll = feed.state.requests
+    assert initial["from"] is None
+    # The poll starts at the newest article already stored, not from scratch
+    assert poll["from"] == newest
+    assert 2 <= added <= 3
+    assert len(rows) == len(first) + added
+
+
+def claimed_by_another_worker(store_path):
+    """A second store on the same file that has claimed Acme's first fetch, as another worker would"""
+    other = news.NewsStore(store_path)
+    other._track("acme", "Acme")
+    assert other._claim("acme", news.POLL_INTERVAL)
+    return other
+
+
+def test_a_worker_waits_for_another_workers_first_fetch(feed, store_path):
+    other = claimed_by_another_worker(store_path)
+    store = news.NewsStore(store_path)
+
+    async def other_worker():
+        await asyncio.sleep(0.3)
+        await other.poll("acme", "Acme")
+
+    async def run():
+        items, _ = await asyncio.gather(store.latest("Acme"), other_worker())
+        return items
+
+    items = asyncio.run(run())
+    other.close()
+    store.close()
+
+    assert len(feed.state.requests) == 1
+    assert store.stats["first_fetch_waits"] == 1 and store.stats["initial_fetches"] == 0
+    assert len(items) == 5
+
+
+def test_a_worker_fetches_itself_when_the_other_worker_fails(feed, store_path):
+    other = claimed_by_another_worker(store_path)
+    store = news.NewsStore(store_path)
+
+    async def other_worker():
+        await asyncio.sleep(0.3)
+        other._unclaim("acme")
+
+    async def run():
+        items, _ = await asyncio.gather(store.latest("Acme"), other_worker())
+        return items
+
+    items = asyncio.run(run())
+    other.close()
+    store.close()
+
+    assert store.stats["first_fetch_waits"] == 1 and store.stats["initial_fetches"] == 1
+    assert len(items) == 5
+
+
+def test_news_is_not_remembered_empty_after_a_failed_first_fetch(feed, store_path):
+    feed.state.behavior.error_rate = 1.0
+    store = news.NewsStore(store_path)
+
+    async def run():
+        failed = await store.latest("Acme")
+        feed.state.behavior.error_rate = 0.0
+        return failed, await store.latest("Acme")
+
+    failed, recovered = asyncio.run(run())
+    store.close()
+
+    assert failed == []
+    assert len(recovered) == 5
+
+
+def test_a_news_store_error_leaves_the_lookup_without_news(feed, monkeypatch):
+    class LockedStore:
+        async def latest(self, entity, limit):
+            raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(news, "get_store", LockedStore)
+    items = asyncio.run(main.get_recent_news("Acme", logging.getLogger(__name__)))
+    assert items == []
@@ -0,0 +1,35 @@
+"""Provider quotas shared between server worker processes"""
+import pytest
+
+from lookup_tool import main, scheduler
+from lookup_tool.logging_setup import stop_logging
+from lookup_tool.settings import load_settings
+
+
+@pytest.fixture(autouse=True)
+def whole_account_quotas():
+    yield
+    scheduler.share_quotas(1)
+    stop_logging()
+
+
+def test_share_quotas_divides_the_account_quota_once():
+    scheduler.share_quotas(1 / 4)
+    scheduler.share_quotas(1 / 4)
+    for provider, rates in scheduler.ACCOUNT_RATES.items():
+        for bucket, per_minute in rates.items():
+            assert scheduler.DEFAULT_RATES[provider][bucket] == (max(1, int(per_minute / 4)) if per_minute else 0)
+    openai = scheduler.get_scheduler("openai")
+    assert openai._buckets[0][0].capacity == scheduler.ACCOUNT_RATES["openai"]["requests"] // 4
+
+
+def test_each_server_worker_gets_its_share(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_QUOTA_WORKERS", "4")
+    monkeypatch.setenv("LOG_DIR", str(tmp_path / "logs"))
+    main.create_app(load_settings())
+    assert scheduler.DEFAULT_RATES["serper"]["requests"] == scheduler.ACCOUNT_RATES["serper"]["requests"] // 4
+
+    monkeypatch.delenv("UPSTREAM_QUOTA_WORKERS")
+    scheduler.share_quotas(1)
+    main.create_app(load_settings())
+    assert scheduler.DEFAULT_RATES == scheduler.ACCOUNT_RATES
@@ -0,0 +1,64 @@
+"""Typeahead ranking, fuzzy matching and lookup bumps"""
+import pytest
+
+from lookup_tool import suggest
+
+
+def labels(results):
+    return [result["label"] for result in results]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = suggest.SuggestIndex()
+    for ticker, name in [("AAPL", "Apple Inc."), ("AMAT", "Applied Materials Inc."), ("MS", "Morgan Stanley"),
+                         ("MSFT", "Microsoft Corporation"), ("MU", "Micron Technology Inc."),
+                         ("AMD", "Advanced Micro Devices Inc."), ("BRK.B", "Berkshire Hathaway Inc. Class B")]:
+        index.add(name, "company", ticker)
+    index.add("Jane Appleton", "person")
+    index.build()
+    monkeypatch.setattr(suggest, "_index", index)
+    return index
+
+
+def test_prefix_matches_rank_by_name_start_and_ticker(index):
+    # An exact ticker comes first, then names starting with the query
+    assert labels(index.search("ms")) == ["Morgan Stanley", "Microsoft Corporation"]
+    assert labels(index.search("micr")) == ["Microsoft Corporation", "Micron Technology Inc.",
+                                            "Advanced Micro Devices Inc."]
+    # Later words match too, and the person ranks below the companies
+    assert labels(index.search("app")) == ["Apple Inc.", "Applied Materials Inc.", "Jane Appleton"]
+    assert labels(index.search("hathaway")) == ["Berkshire Hathaway Inc. Class B"]
+    for spelling in ("BRK.B", "brk.b", "brkb"):
+        assert index.search(spelling)[0]["ticker"] == "BRK.B"
+
+
+def test_short_prefixes_match_the_full_key_scan(index):
+    # One- and two-character prefixes come from the lists ranked at build time
+    for prefix in ("a", "ap", "m", "mi", "b"):
+        matching = {entry_id for key, entry_id in zip(index._keys, index._key_ids) if key.startswith(prefix)}
+        expected = [index.labels[entry_id] for entry_id in index._rank(matching, prefix, suggest.DEFAULT_LIMIT)]
+        assert labels(index.search(prefix)) == expected
+
+
+def test_misspellings_fall_back_to_trigrams(index):
+    assert labels(index.search("microsfot")) == ["Microsoft Corporation"]
+    assert "Apple Inc." in labels(index.search("aple inc"))
+    assert index.search("zzzzqx") == []
+    # Short queries never go fuzzy
+    assert index.search("xq") == []
+
+
+def test_recorded_lookups_are_suggested_at_once_and_ranked_higher(index):
+    assert labels(index.search("m", limit=2)) == ["Morgan Stanley", "Microsoft Corporation"]
+
+    suggest.record_lookup("Micron Technology Inc.", "company", "MU")
+    suggest.record_lookup("Mary Major", "person")
+
+    # The bump applies without a rebuild; the new person is found while pending
+    assert labels(index.search("m", limit=2))[0] == "Micron Technology Inc."
+    assert "Mary Major" in labels(index.search("mary"))
+    assert len(index) == 9
+    # Recording again raises the weight, never adds a duplicate
+    suggest.record_lookup("Mary Major", "person")
+    assert len(index) == 9
@@ -0,0 +1,58 @@
+"""Input classification against the bundled symbol listing"""
+import pytest
+
+from lookup_tool import symbols
+
+
+@pytest.fixture(scope="module")
+def index():
+    return symbols.SymbolIndex.from_csv(symbols.DEFAULT_SYMBOLS_FILE)
+
+
+@pytest.mark.parametrize("identifier", ["AAPL", "aapl", "Apple Inc", "Apple Inc.", "Apple", "  apple  "])
+def test_ticker_and_name_spellings_resolve_to_one_entity(index, identifier):
+    classification = index.classify(identifier)
+    assert classification.canonical == "AAPL"
+    assert classification.ticker == "AAPL"
+    assert classification.name == "Apple Inc."
+
+
+def test_tickers_and_names_keep_their_query_type(index):
+    assert index.classify("AAPL").query_type == "stock_ticker"
+    assert index.classify("Apple Inc").query_type == "company_name"
+
+
+@pytest.mark.parametrize("identifier", ["BRK.B", "BRK-B", "brk/b"])
+def test_class_share_tickers(index, identifier):
+    assert index.classify(identifier) == symbols.Classification(
+        "stock_ticker", "BRK.B", "BRK.B", "Berkshire Hathaway Inc. Class B"
+    )
+
+
+def test_share_classes_stay_apart(index):
+    assert index.classify("BRK.A").ticker == "BRK.A"
+    # The bare name goes to the first listed class
+    assert index.classify("Berkshire Hathaway").ticker == "BRK.B"
+
+
+def test_unknown_upper_case_symbol_is_still_a_ticker(index):
+    assert index.classify("XYZQ") == symbols.Classification("stock_ticker", "XYZQ", "XYZQ")
+    assert index.classify("ZZZZ-B").canonical == "ZZZZ.B"
+
+
+@pytest.mark.parametrize("identifier", ["Jane Smith", "John Q. Public", "Mary Ann Smith", "Dr. Jane Smith"])
+def test_person_names(index, identifier):
+    classification = index.classify(identifier)
+    assert classification.query_type == "person_name"
+    assert classification.canonical == identifier.lower()
+    assert classification.ticker is None
+
+
+def test_upper_case_reads_as_a_ticker_and_lower_case_as_a_name():
+    index = symbols.SymbolIndex([("ON", "ON Semiconductor Corporation"), ("ONON", "On Holding AG")])
+    assert index.classify("ON").ticker == "ON"
+    assert index.classify("on").ticker == "ONON"
+
+
+def test_unknown_company_name_is_normalized(index):
+    assert index.classify("the acme widgets company") == symbols.Classification("company_name", "acme widgets")